@@ -0,0 +1,64 @@
+# benchmarks/app_under_test.py
+
+"""
+ASGI entry point used by the load test: src.routes:app with Gemini replaced
+by an HTTP client for the fake Gemini server and rate limiting disabled.
+
+The Gemini SDK's async client only speaks gRPC to Google's endpoint, so it
+cannot be pointed at a local stand-in; FakeGeminiModel implements the small
+part of GenerativeModel that src/services.py uses, over plain HTTP.
+
+    BENCH_GEMINI_URL=http://127.0.0.1:9101 DAD_JOKE_API_URL=http://127.0.0.1:9102/ \
+        uvicorn benchmarks.app_under_test:app
+"""
+
+import json
+import os
+
+import httpx
+
+from src.routes import app, rate_limiter
+from src.utils import clients
+
+
+class _FakeResponse:
+    """Shape of the SDK response attributes read by the services."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.prompt_feedback = None
+
+
+class _FakeStream:
+    def __init__(self, client: httpx.AsyncClient, url: str, prompt: str):
+        self._client = client
+        self._url = url
+        self._prompt = prompt
+        self.prompt_feedback = None
+
+    async def __aiter__(self):
+        async with self._client.stream("POST", self._url, json={"prompt": self._prompt, "stream": True}) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line:
+                    yield _FakeResponse(json.loads(line)["text"])
+
+
+class FakeGeminiModel:
+    """GenerativeModel stand-in backed by benchmarks.fake_upstreams."""
+
+    def __init__(self, base_url: str):
+        self._url = base_url.rstrip("/") + "/generate"
+        self._client = httpx.AsyncClient(timeout=30.0, limits=httpx.Limits(max_connections=200))
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs):
+        if stream:
+            return _FakeStream(self._client, self._url, prompt)
+        response = await self._client.post(self._url, json={"prompt": prompt, "stream": False})
+        response.raise_for_status()
+        return _FakeResponse(response.json()["text"])
+
+
+clients.set_gemini_model(FakeGeminiModel(os.getenv("BENCH_GEMINI_URL", "http://127.0.0.1:9101")))
+# Load tests drive many requests from one address; measure the app, not the limiter.
+rate_limiter.enabled = os.getenv("BENCH_RATE_LIMITS", "false").lower() in ("true", "1")
@@ -0,0 +1,127 @@
+# benchmarks/fake_upstreams.py
+
+"""
+Local stand-ins for Gemini and icanhazdadjoke.com with configurable latency
+and error injection.
+
+    python -m benchmarks.fake_upstreams --gemini-port 9101 --joke-port 9102 \
+        --latency-ms 150 --jitter-ms 50 --error-rate 0.02
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import re
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+_YODA_LINES = (
+    "Strong with the Force, this one is.",
+    "Do or do not. There is no try.",
+    "Patience you must have, young Padawan.",
+    "Much to learn, you still have. Hmm.",
+)
+# Combined prompts from src/gemini_batcher.py ask for a JSON array of N answers
+_BATCH_PATTERN = re.compile(r"JSON array of exactly (\d+) strings")
+
+
+class Injection:
+    """Latency and failure behaviour shared by the fake endpoints."""
+
+    def __init__(self, latency_ms: float, jitter_ms: float, error_rate: float):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+
+    async def delay(self, fraction: float = 1.0):
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        await asyncio.sleep(max(latency, 0.0) * fraction / 1000)
+
+    def should_fail(self) -> bool:
+        return random.random() < self.error_rate
+
+
+def create_fake_gemini_app(injection: Injection) -> Starlette:
+    """
+    POST /generate {"prompt": str, "stream": bool}
+    Returns {"text": ...} (a JSON array of answers for batched prompts), or
+    newline-delimited {"text": chunk} objects when streaming; fails with
+    HTTP 503 at the configured error rate.
+    """
+
+    async def generate(request: Request):
+        body = await request.json()
+        if injection.should_fail():
+            await injection.delay()
+            return JSONResponse({"error": "injected failure"}, status_code=503)
+        batch = _BATCH_PATTERN.search(body.get("prompt", ""))
+        if batch:
+            text = json.dumps([random.choice(_YODA_LINES) for _ in range(int(batch.group(1)))])
+        else:
+            text = random.choice(_YODA_LINES)
+        if not body.get("stream"):
+            await injection.delay()
+            return JSONResponse({"text": text})
+
+        words = text.split(" ")
+        async def chunks():
+            for index, word in enumerate(words):
+                # Spread the latency over the stream: first token after half of it
+                await injection.delay(0.5 if index == 0 else 0.5 / max(len(words) - 1, 1))
+                yield json.dumps({"text": word + (" " if index < len(words) - 1 else "")}) + "\n"
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    return Starlette(routes=[Route("/generate", generate, methods=["POST"])])
+
+
+def create_fake_joke_app(injection: Injection) -> Starlette:
+    """GET / returns {"joke": ...} like icanhazdadjoke.com; 503 at the error rate."""
+    counter = itertools.count()
+
+    async def joke(request: Request):
+        await injection.delay()
+        if injection.should_fail():
+            return JSONResponse({"error": "injected failure"}, status_code=503)
+        number = next(counter)
+        return JSONResponse({"id": str(number), "joke": f"Fake dad joke number {number}.", "status": 200})
+
+    return Starlette(routes=[Route("/", joke, methods=["GET"])])
+
+
+async def serve(gemini_port: int, joke_port: int, injection: Injection, joke_injection: Injection):
+    servers = [
+        uvicorn.Server(uvicorn.Config(create_fake_gemini_app(injection), host="127.0.0.1", port=gemini_port, log_level="warning")),
+        uvicorn.Server(uvicorn.Config(create_fake_joke_app(joke_injection), host="127.0.0.1", port=joke_port, log_level="warning")),
+    ]
+    logging.info(f"Fake Gemini on :{gemini_port}, fake dad-joke API on :{joke_port}")
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gemini-port", type=int, default=9101)
+    parser.add_argument("--joke-port", type=int, default=9102)
+    parser.add_argument("--latency-ms", type=float, default=150.0, help="Mean Gemini latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of Gemini calls that fail")
+    parser.add_argument("--joke-latency-ms", type=float, default=80.0)
+    parser.add_argument("--joke-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(
+        args.gemini_port,
+        args.joke_port,
+        Injection(args.latency_ms, args.jitter_ms, args.error_rate),
+        Injection(args.joke_latency_ms, args.jitter_ms, args.joke_error_rate),
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# benchmarks/index_render.py
+
+"""
+Cost of serving the index page: the previous per-request Jinja2 render
+(compressed by GZipMiddleware) against src.page_cache.PageCache, with and
+without a matching If-None-Match. Minimal FastAPI apps are called
+directly through ASGI, so HTTP parsing is not included.
+
+    python -m benchmarks.index_render --requests 5000 --players 100
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+from starlette.middleware.gzip import GZipMiddleware
+
+from src.image_pipeline import load_image_manifest
+from src.page_cache import PageCache
+
+from .common import summarize_latencies, write_results
+
+
+def _templates() -> Jinja2Templates:
+    templates = Jinja2Templates(directory="templates")
+    templates.env.globals["image_manifest"] = load_image_manifest()["images"]
+    return templates
+
+def _score(request: Request, players: int) -> Tuple[int, int, int]:
+    # A spread of scores, so the cached path also builds and compresses new bodies
+    player = int(request.headers.get("x-player", "0")) % players
+    return (player % 7, player % 5, player % 3)
+
+def _base_app() -> FastAPI:
+    app = FastAPI()
+    app.mount("/static", StaticFiles(directory="static"), name="static") # For url_for in the templates
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+    return app
+
+def _uncached_app(players: int) -> FastAPI:
+    app = _base_app()
+    templates = _templates()
+
+    @app.get("/")
+    async def index(request: Request):
+        wins, losses, ties = _score(request, players)
+        return templates.TemplateResponse(request, "index.html", {"score": {"wins": wins, "losses": losses, "ties": ties}})
+
+    return app
+
+def _cached_app(players: int) -> FastAPI:
+    app = _base_app()
+    cache = PageCache(_templates(), "index.html")
+
+    @app.get("/")
+    async def index(request: Request):
+        return cache.response(request, _score(request, players))
+
+    return app
+
+
+async def _drive(app: FastAPI, requests: int, players: int, revalidate: bool) -> Tuple[List[float], Dict[int, int]]:
+    """Calls GET / `requests` times over ASGI; with `revalidate`, sends each player's last ETag."""
+    etags: Dict[int, bytes] = {}
+    statuses: Dict[int, int] = {}
+    latencies = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    for index in range(requests):
+        player = index % players
+        headers = [(b"host", b"bench"), (b"accept-encoding", b"gzip, deflate, br"), (b"x-player", str(player).encode())]
+        if revalidate and player in etags:
+            headers.append((b"if-none-match", etags[player]))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/",
+            "raw_path": b"/",
+            "root_path": "",
+            "query_string": b"",
+            "headers": headers,
+            "client": ("10.0.0.1", 50000),
+            "server": ("bench", 80),
+        }
+
+        async def send(message, player=player):
+            if message["type"] == "http.response.start":
+                statuses[message["status"]] = statuses.get(message["status"], 0) + 1
+                for name, value in message["headers"]:
+                    if name == b"etag":
+                        etags[player] = value
+
+        start = time.perf_counter()
+        await app(scope, receive, send)
+        latencies.append(time.perf_counter() - start)
+    return latencies, statuses
+
+
+async def run(requests: int, players: int, warmup: int) -> List[dict]:
+    variants = (
+        ("uncached_render", _uncached_app, False),
+        ("page_cache", _cached_app, False),
+        ("page_cache_revalidated", _cached_app, True),
+    )
+    results = []
+    for name, factory, revalidate in variants:
+        app = factory(players)
+        await _drive(app, warmup, players, revalidate)
+        latencies, statuses = await _drive(app, requests, players, revalidate)
+        summary = summarize_latencies(latencies)
+        results.append({"variant": name, "statuses": statuses, **summary})
+        logging.info(f"{name}: mean {summary['mean_ms']} ms/request, statuses {statuses}")
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--players", type=int, default=100, help="Distinct players (scores) to rotate through")
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--output", default=os.path.join("bench-results", "index_render.json"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", force=True)
+
+    results = asyncio.run(run(args.requests, args.players, args.warmup))
+    parameters = {"requests": args.requests, "players": args.players, "warmup": args.warmup}
+    write_results(args.output, "index_render", parameters, results)
+
+
+if __name__ == "__main__":
+    main()
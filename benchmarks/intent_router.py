@@ -0,0 +1,118 @@
+# benchmarks/intent_router.py
+
+"""
+Throughput and routing quality of src.intent_router.IntentRouter against the
+previous substring keyword scan, on labelled messages that are not in the
+router's training examples. Reports the cost per message, the routing
+accuracy, and the share of messages that still reach Gemini.
+
+    python -m benchmarks.intent_router --number 200000 --output bench-results/intent_router.json
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import time
+from typing import Callable, List, Optional, Tuple
+
+from src.intent_router import CHAT, JOKE, IntentRouter
+
+from .common import write_results
+
+# (message, expected intent); deliberately different from TRAINING_EXAMPLES
+LABELLED_MESSAGES: Tuple[Tuple[str, str], ...] = (
+    ("Joke time!", JOKE), ("joke please yoda", JOKE), ("Can you tell me a joke?", JOKE),
+    ("I could use a good laugh", JOKE), ("tell me a jokke", JOKE), ("got a funny one for me?", JOKE),
+    ("make me giggle", JOKE), ("Jokes, do you know any?", JOKE), ("say something hilarious", JOKE),
+    ("Hello!", "greeting"), ("hey yoda", "greeting"), ("Good morning master Yoda", "greeting"),
+    ("hi there", "greeting"), ("heya", "greeting"), ("hello, how are you?", "greeting"),
+    ("Thanks!", "thanks"), ("thank u", "thanks"), ("thanks yoda", "thanks"), ("thanks a bunch", "thanks"),
+    ("bye!", "farewell"), ("see you soon", "farewell"), ("i gotta go now", "farewell"), ("Goodbye, Master.", "farewell"),
+    ("Who are you?", "identity"), ("what's your name", "identity"), ("are you a bot?", "identity"),
+    ("what are the rules?", "rules"), ("what beats lizard", "rules"), ("does spock beat rock", "rules"),
+    ("How do I play this?", "rules"),
+    ("What is the Force?", CHAT), ("Hello Yoda, what is the meaning of the force?", CHAT),
+    ("tell me a story about dagobah", CHAT), ("Who is Darth Vader?", CHAT), ("what should I eat for dinner", CHAT),
+    ("I am sad", CHAT), ("how do i defeat the sith", CHAT), ("what are you afraid of", CHAT),
+    ("how do you feel today", CHAT), ("is the dark side stronger", CHAT), ("teach me patience", CHAT),
+    ("tell me a secret about the jedi council", CHAT), ("Why do you live in a swamp?", CHAT),
+    ("What do you think about Anakin?", CHAT), ("My exam is tomorrow and I am nervous", CHAT),
+    # Questions sharing words with a canned intent
+    ("how old is luke", CHAT), ("what are you doing", CHAT), ("are you okay", CHAT),
+    ("later today I will fight", CHAT), ("who rules the galaxy", CHAT), ("the sith rules of two", CHAT),
+    ("why do you talk funny", CHAT), ("is the dark side no joke", CHAT),
+)
+
+
+def legacy_is_joke_request(user_message: str) -> bool:
+    """The substring scan that services.py used before the intent router."""
+    user_message_lower = user_message.lower()
+    joke_keywords = [" joke", " funny", " laugh", " humor", " tell me a"]
+    return any(keyword in user_message_lower for keyword in joke_keywords)
+
+def _legacy_intent(message: str) -> str:
+    return JOKE if legacy_is_joke_request(message) else CHAT
+
+
+def _quality(classify: Callable[[str], str]) -> dict:
+    correct = sum(classify(message) == expected for message, expected in LABELLED_MESSAGES)
+    to_gemini = sum(classify(message) == CHAT for message, _ in LABELLED_MESSAGES)
+    jokes = [classify(message) == JOKE for message, expected in LABELLED_MESSAGES if expected == JOKE]
+    false_jokes = sum(classify(message) == JOKE for message, expected in LABELLED_MESSAGES if expected != JOKE)
+    return {
+        "accuracy": round(correct / len(LABELLED_MESSAGES), 3),
+        "joke_recall": round(sum(jokes) / len(jokes), 3),
+        "false_jokes": false_jokes,
+        "share_sent_to_gemini": round(to_gemini / len(LABELLED_MESSAGES), 3),
+    }
+
+def _throughput(classify: Callable[[str], object], number: int) -> dict:
+    messages = itertools.cycle([message for message, _ in LABELLED_MESSAGES])
+    batch = [next(messages) for _ in range(number)]
+    start = time.perf_counter()
+    for message in batch:
+        classify(message)
+    elapsed = time.perf_counter() - start
+    return {
+        "number": number,
+        "us_per_message": round(elapsed / number * 1e6, 3),
+        "messages_per_second": round(number / elapsed),
+    }
+
+
+def run(number: int) -> List[dict]:
+    build_start = time.perf_counter()
+    router = IntentRouter()
+    build_ms = round((time.perf_counter() - build_start) * 1000, 1)
+
+    variants = (
+        ("legacy_keyword_scan", _legacy_intent, legacy_is_joke_request, None),
+        ("intent_router", lambda message: router.classify(message).intent, router.classify, build_ms),
+    )
+    results = []
+    for name, intent_of, classify, build in variants:
+        result = {"variant": name, **_quality(intent_of), **_throughput(classify, number)}
+        if build is not None:
+            result["build_ms"] = build
+        results.append(result)
+        logging.info(
+            f"{name}: {result['us_per_message']} us/message, accuracy {result['accuracy']}, "
+            f"joke recall {result['joke_recall']}, {result['share_sent_to_gemini']:.0%} sent to Gemini"
+        )
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=200000, help="Messages classified per variant")
+    parser.add_argument("--output", default=os.path.join("bench-results", "intent_router.json"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", force=True)
+
+    results = run(args.number)
+    write_results(args.output, "intent_router", {"number": args.number, "messages": len(LABELLED_MESSAGES)}, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# benchmarks/load_test.py
+
+"""
+Load test for src.routes:app against local fake upstreams.
+
+Boots benchmarks.fake_upstreams and the app (via benchmarks.app_under_test)
+as subprocesses, drives each scenario at a fixed concurrency for a fixed
+duration, and writes throughput and latency percentiles as JSON.
+
+    python -m benchmarks.load_test --concurrency 64 --duration 15 \
+        --latency-ms 200 --error-rate 0.05 --output bench-results/load.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from .common import summarize_latencies, write_results
+
+MOVES = ("rock", "paper", "scissors", "lizard", "spock")
+# Popular messages repeat (cache/coalescing paths); the rest are unique.
+POPULAR_MESSAGES = ("hello", "who are you", "hi yoda", "what is the force", "how are you")
+
+
+# --- Scenarios ---
+
+def _play(client: httpx.AsyncClient, player_id: str, counter):
+    return client.post(f"/api/v1/play/{random.choice(MOVES)}", headers={"X-Player-Id": player_id})
+
+def _score(client: httpx.AsyncClient, player_id: str, counter):
+    return client.get("/api/v1/score", headers={"X-Player-Id": player_id})
+
+def _chat(client: httpx.AsyncClient, player_id: str, counter):
+    if random.random() < 0.5:
+        message = random.choice(POPULAR_MESSAGES)
+    else:
+        message = f"question number {next(counter)}"
+    return client.post("/api/v1/chat", json={"user_message": message})
+
+def _index(client: httpx.AsyncClient, player_id: str, counter):
+    return client.get("/", headers={"X-Player-Id": player_id, "Accept-Encoding": "gzip, br"})
+
+SCENARIOS: Dict[str, Callable] = {
+    "play": _play,
+    "score": _score,
+    "chat": _chat,
+    "index": _index,
+}
+
+
+async def run_scenario(base_url: str, name: str, concurrency: int, duration: float, warmup: float) -> dict:
+    """Runs one scenario with `concurrency` virtual users for `duration` seconds."""
+    make_request = SCENARIOS[name]
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    errors = 0
+    counter = itertools.count()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0, limits=limits) as client:
+        async def user(deadline: float, record: bool):
+            nonlocal errors
+            player_id = uuid.uuid4().hex
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await make_request(client, player_id, counter)
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = "exception"
+                if not record:
+                    continue
+                latencies.append(time.perf_counter() - start)
+                statuses[str(status)] += 1
+                if status == "exception" or status >= 400:
+                    errors += 1
+
+        if warmup > 0:
+            deadline = time.perf_counter() + warmup
+            await asyncio.gather(*(user(deadline, record=False) for _ in range(concurrency)))
+
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(user(deadline, record=True) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    result = {
+        "scenario": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "status_counts": dict(statuses),
+    }
+    result.update(summarize_latencies(latencies))
+    logging.info(
+        f"{name}: {result['throughput_rps']} req/s, p50 {result['p50_ms']} ms, "
+        f"p95 {result['p95_ms']} ms, p99 {result['p99_ms']} ms, errors {errors}"
+    )
+    return result
+
+
+# --- Process Management ---
+
+def _wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+def start_stack(args) -> Tuple[List[subprocess.Popen], str]:
+    """Starts the fake upstreams and the app; returns the processes and base URL."""
+    fakes = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_upstreams",
+        "--gemini-port", str(args.gemini_port), "--joke-port", str(args.joke_port),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--error-rate", str(args.error_rate),
+        "--joke-latency-ms", str(args.joke_latency_ms), "--joke-error-rate", str(args.joke_error_rate),
+    ])
+    _wait_for_port(args.gemini_port)
+    _wait_for_port(args.joke_port)
+
+    env = dict(os.environ)
+    env.update({
+        "BENCH_GEMINI_URL": f"http://127.0.0.1:{args.gemini_port}",
+        "DAD_JOKE_API_URL": f"http://127.0.0.1:{args.joke_port}/",
+        "BENCH_RATE_LIMITS": "true" if args.rate_limits else "false",
+    })
+    # A fresh game history per run, so stats queries don't grow across runs
+    env.setdefault("GAME_HISTORY_PATH", os.path.join(tempfile.mkdtemp(prefix="bench-history-"), "game_history.db"))
+    app = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "benchmarks.app_under_test:app",
+        "--host", "127.0.0.1", "--port", str(args.port),
+        "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+    ], env=env)
+    _wait_for_port(args.port, timeout=120.0)
+    return [app, fakes], f"http://127.0.0.1:{args.port}"
+
+def stop_stack(processes: List[subprocess.Popen]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# --- Entry Point ---
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default="play,score,chat,index", help="Comma-separated: " + ",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds measured per scenario")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Unmeasured seconds before each scenario")
+    parser.add_argument("--base-url", help="Benchmark an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8801)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--rate-limits", action="store_true", help="Keep the app's rate limits enabled")
+    parser.add_argument("--gemini-port", type=int, default=9101)
+    parser.add_argument("--joke-port", type=int, default=9102)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--joke-latency-ms", type=float, default=80.0)
+    parser.add_argument("--joke-error-rate", type=float, default=0.0)
+    parser.add_argument("--output", default=os.path.join("bench-results", "load.json"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", force=True)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    processes: List[subprocess.Popen] = []
+    base_url = args.base_url
+    try:
+        if base_url is None:
+            processes, base_url = start_stack(args)
+        results = [
+            asyncio.run(run_scenario(base_url, name, args.concurrency, args.duration, args.warmup))
+            for name in scenarios
+        ]
+    finally:
+        stop_stack(processes)
+
+    parameters = {key: value for key, value in vars(args).items() if key != "output"}
+    write_results(args.output, "load_test", parameters, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# benchmarks/logging_pipeline.py
+
+"""
+Request cost of logging through src.structured_logging's queue pipeline
+against the stdlib setup it replaced (a StreamHandler on the root logger
+formatting and writing on the calling thread), driving src.routes.app
+directly over ASGI with a mix of /api/v1/score, /api/v1/play and
+canned-intent /api/v1/chat requests, plus one access-log line per request
+as uvicorn would write.
+
+Records go to a temporary file; --sink-delay-us adds a pause to every write
+to stand in for a collector that reads stderr slower than we write it.
+
+    python -m benchmarks.logging_pipeline --requests 5000 --sink-delay-us 200
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import tempfile
+import time
+from typing import Callable, List, Optional, TextIO, Tuple
+
+os.environ.setdefault("COMMENTARY_POOL_DEPTH", "0")
+os.environ.setdefault("JOKE_BUFFER_SIZE", "0")
+
+from src.structured_logging import TEXT_FORMAT, AsyncQueueHandler, JsonFormatter, SamplingFilter # noqa: E402
+
+from .common import summarize_latencies, write_results # noqa: E402
+
+# (method, path, body); chat messages the intent router answers without Gemini
+REQUESTS: Tuple[Tuple[str, str, bytes], ...] = (
+    ("GET", "/api/v1/score", b""),
+    ("POST", "/api/v1/play/rock", b""),
+    ("POST", "/api/v1/chat", json.dumps({"user_message": "hello yoda"}).encode()),
+    ("POST", "/api/v1/play/spock", b""),
+    ("POST", "/api/v1/chat", json.dumps({"user_message": "what are the rules?"}).encode()),
+)
+
+
+class _SlowStream:
+    """A file whose writes take at least `delay` seconds, like a backed-up pipe."""
+
+    def __init__(self, stream: TextIO, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text: str):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def _sync_text(sink) -> Tuple[logging.Handler, Callable[[], None]]:
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    return handler, lambda: None
+
+def _queue(sink, sample_every: int) -> Tuple[logging.Handler, Callable[[], None]]:
+    output = logging.StreamHandler(sink)
+    output.setFormatter(JsonFormatter())
+    handler = AsyncQueueHandler(queue.Queue(maxsize=10000))
+    if sample_every > 1:
+        handler.addFilter(SamplingFilter(sample_every))
+    listener = logging.handlers.QueueListener(handler.queue, output)
+    listener.start()
+    return handler, listener.stop # stop() drains the queue before returning
+
+VARIANTS = {
+    "sync_text": _sync_text,
+    "queue_json": lambda sink: _queue(sink, 1),
+    "queue_json_sampled_10": lambda sink: _queue(sink, 10),
+}
+
+
+async def _drive(app, requests: int) -> Tuple[List[float], int]:
+    """Calls the app `requests` times over ASGI; returns the latencies and the number of non-200 answers."""
+    access_log = logging.getLogger("uvicorn.access")
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    latencies = []
+    for index in range(requests):
+        method, path, body = REQUESTS[index % len(REQUESTS)]
+
+        async def receive(body=body):
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"bench"), (b"content-type", b"application/json")],
+            "client": ("10.0.0.1", 50000),
+            "server": ("bench", 80),
+        }
+        start = time.perf_counter()
+        await app(scope, receive, send)
+        access_log.info('%s - "%s %s HTTP/%s" %d', "10.0.0.1:50000", method, path, "1.1", statuses[-1])
+        latencies.append(time.perf_counter() - start)
+    return latencies, sum(1 for status in statuses if status != 200)
+
+
+async def run(requests: int, warmup: int, sink_delay: float, directory: str) -> List[dict]:
+    from src.routes import app, rate_limiter
+
+    rate_limiter.enabled = False # Measure logging, not 429s
+    root = logging.getLogger()
+    previous_handlers = list(root.handlers)
+    results = []
+    for name, factory in VARIANTS.items():
+        path = os.path.join(directory, f"{name}.log")
+        with open(path, "w") as f:
+            handler, stop = factory(_SlowStream(f, sink_delay))
+            root.handlers = [handler]
+            try:
+                await _drive(app, warmup)
+                start = time.perf_counter()
+                latencies, failed = await _drive(app, requests)
+                elapsed = time.perf_counter() - start
+                stop()
+                drained = time.perf_counter() - start
+            finally:
+                root.handlers = previous_handlers
+        if failed:
+            logging.warning(f"{name}: {failed} requests were not answered with 200.")
+        with open(path) as f:
+            lines = sum(1 for _ in f)
+        summary = summarize_latencies(latencies)
+        result = {
+            "variant": name,
+            **summary,
+            "requests_per_second": round(requests / elapsed),
+            "until_written_s": round(drained, 3),
+            "lines_written": lines,
+        }
+        results.append(result)
+        logging.info(
+            f"{name}: {result['requests_per_second']} requests/s, p50 {summary['p50_ms']} ms, "
+            f"p99 {summary['p99_ms']} ms, {lines} lines written"
+        )
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--sink-delay-us", type=float, default=0.0, help="Pause added to every log write")
+    parser.add_argument("--output", default=os.path.join("bench-results", "logging_pipeline.json"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", force=True)
+
+    with tempfile.TemporaryDirectory(prefix="rls-bench-") as directory:
+        results = asyncio.run(run(args.requests, args.warmup, args.sink_delay_us / 1e6, directory))
+    parameters = {"requests": args.requests, "warmup": args.warmup, "sink_delay_us": args.sink_delay_us}
+    write_results(args.output, "logging_pipeline", parameters, results)
+
+
+if __name__ == "__main__":
+    main()
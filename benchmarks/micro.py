@@ -0,0 +1,79 @@
+# benchmarks/micro.py
+
+"""
+Micro-benchmarks for the per-round hot path: move selection, winner
+resolution and response model construction.
+
+    python -m benchmarks.micro --number 200000 --output bench-results/micro.json
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import random
+import timeit
+from typing import List, Optional
+
+from src import game_engine, services
+from src.models import PlayResponse, Score
+
+from .common import write_results
+
+
+def _cases():
+    moves = services.MOVES
+    pairs = [(random.choice(moves), random.choice(moves)) for _ in range(1024)]
+    pair_cycle = itertools.cycle(pairs)
+
+    def determine_winner():
+        player_move, computer_move = next(pair_cycle)
+        services.determine_winner(player_move, computer_move)
+
+    def play_response():
+        PlayResponse(
+            wins=3, losses=2, ties=1,
+            player_move="rock", computer_move="spock",
+            result="You lose.", commentary="Much to learn, you still have.",
+        )
+
+    return {
+        "pick_computer_move": services.pick_computer_move,
+        "determine_winner": determine_winner,
+        "engine_resolve": lambda: game_engine.resolve(0, 4),
+        "score_model": lambda: Score(wins=3, losses=2, ties=1),
+        "play_response_model": play_response,
+    }
+
+
+def run(number: int, repeat: int) -> List[dict]:
+    results = []
+    for name, func in _cases().items():
+        timings = timeit.repeat(func, number=number, repeat=repeat)
+        best = min(timings) / number
+        results.append({
+            "case": name,
+            "number": number,
+            "repeat": repeat,
+            "best_ns_per_call": round(best * 1e9, 1),
+            "median_ns_per_call": round(sorted(timings)[len(timings) // 2] / number * 1e9, 1),
+            "calls_per_second": round(1 / best) if best else 0,
+        })
+        logging.info(f"{name}: {results[-1]['best_ns_per_call']} ns/call")
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=100000, help="Calls per timing run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=os.path.join("bench-results", "micro.json"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", force=True)
+
+    results = run(args.number, args.repeat)
+    write_results(args.output, "micro", {"number": args.number, "repeat": args.repeat}, results)
+
+
+if __name__ == "__main__":
+    main()
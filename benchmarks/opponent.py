@@ -0,0 +1,136 @@
+# benchmarks/opponent.py
+
+"""
+Cost and strength of the adaptive opponent (src/opponent.py):
+
+- per-round cost of pick + observe with many interleaved players,
+- memory per player model (tracemalloc),
+- computer win/loss/tie rates of the random and adaptive opponents against
+  a few scripted player strategies.
+
+    python -m benchmarks.opponent --players 10000 --rounds 200000
+"""
+
+import argparse
+import gc
+import logging
+import os
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from src import game_engine
+from src.opponent import AdaptiveOpponent
+
+from .common import write_results
+
+_SIZE = len(game_engine.MOVES)
+
+
+def measure_round_cost(players: int, rounds: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    opponent = AdaptiveOpponent(max_players=players, rng=random.Random(seed))
+    player_ids = [f"player-{index}" for index in range(players)]
+    schedule = [(rng.choice(player_ids), rng.randrange(_SIZE)) for _ in range(rounds)]
+    for player_id in player_ids: # Every player has history, so pick() always predicts
+        for _ in range(3):
+            opponent.observe(player_id, rng.randrange(_SIZE))
+
+    start = time.perf_counter()
+    for player_id, move in schedule:
+        opponent.pick(player_id)
+        opponent.observe(player_id, move)
+    elapsed = time.perf_counter() - start
+    return {
+        "players": players,
+        "rounds": rounds,
+        "ns_per_round": round(elapsed / rounds * 1e9, 1),
+        "rounds_per_second": round(rounds / elapsed),
+    }
+
+
+def measure_memory(players: int) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    opponent = AdaptiveOpponent(max_players=players)
+    for index in range(players):
+        player_id = f"player-{index}"
+        for move in (0, 1, 2):
+            opponent.observe(player_id, move)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {"players": players, "bytes_per_player": round((after - before) / players, 1)}
+
+
+# --- Strength ---
+# Each strategy returns the player's next move from (round number, rng, the computer's last move).
+Strategy = Callable[[int, random.Random, Optional[int]], int]
+
+def _beats(move: int) -> int:
+    """A move that beats `move`."""
+    return next(player for player in range(_SIZE) if game_engine.OUTCOME_TABLE[player][move] == game_engine.WIN)
+
+STRATEGIES: Dict[str, Strategy] = {
+    "uniform": lambda round_number, rng, _: rng.randrange(_SIZE),
+    "cycle": lambda round_number, rng, _: round_number % _SIZE,
+    "favourite_rock_50pct": lambda round_number, rng, _: 0 if rng.random() < 0.5 else rng.randrange(_SIZE),
+    "repeat_pairs": lambda round_number, rng, _: (round_number // 2) % _SIZE,
+    "beat_last_computer_move": lambda round_number, rng, last: rng.randrange(_SIZE) if last is None else _beats(last),
+}
+
+
+def measure_strength(rounds: int, seed: int) -> List[dict]:
+    results = []
+    for name, strategy in STRATEGIES.items():
+        for mode in ("random", "adaptive"):
+            rng = random.Random(seed)
+            opponent = AdaptiveOpponent(rng=random.Random(seed))
+            counts = [0, 0, 0]
+            last_computer = None
+            for round_number in range(rounds):
+                player_move = strategy(round_number, rng, last_computer)
+                computer_move = opponent.pick("bench") if mode == "adaptive" else rng.randrange(_SIZE)
+                opponent.observe("bench", player_move)
+                counts[game_engine.resolve(player_move, computer_move)] += 1
+                last_computer = computer_move
+            results.append({
+                "strategy": name,
+                "opponent": mode,
+                "computer_win_rate": round(counts[game_engine.LOSE] / rounds, 3),
+                "computer_loss_rate": round(counts[game_engine.WIN] / rounds, 3),
+                "tie_rate": round(counts[game_engine.TIE] / rounds, 3),
+            })
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=200000)
+    parser.add_argument("--strength-rounds", type=int, default=5000, help="Rounds per strategy and opponent")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=os.path.join("bench-results", "opponent.json"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", force=True)
+
+    cost = measure_round_cost(args.players, args.rounds, args.seed)
+    logging.info(f"pick + observe: {cost['ns_per_round']} ns/round with {args.players} players")
+    memory = measure_memory(args.players)
+    logging.info(f"Memory: {memory['bytes_per_player']} bytes per player")
+    strength = measure_strength(args.strength_rounds, args.seed)
+    for row in strength:
+        logging.info(
+            f"{row['strategy']:>24} vs {row['opponent']:<8}: computer wins {row['computer_win_rate']:.1%}, "
+            f"loses {row['computer_loss_rate']:.1%}"
+        )
+
+    parameters = {"players": args.players, "rounds": args.rounds, "strength_rounds": args.strength_rounds, "seed": args.seed}
+    results = [{"case": "round_cost", **cost}, {"case": "memory", **memory}]
+    results += [{"case": "strength", **row} for row in strength]
+    write_results(args.output, "opponent", parameters, results)
+
+
+if __name__ == "__main__":
+    main()
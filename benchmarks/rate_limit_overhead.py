@@ -0,0 +1,141 @@
+# benchmarks/rate_limit_overhead.py
+
+"""
+Per-request overhead of src.rate_limit.RateLimitMiddleware compared with
+the slowapi decorator it replaced (memory:// storage), measured by calling
+minimal FastAPI apps directly through ASGI so HTTP parsing is not included.
+
+    python -m benchmarks.rate_limit_overhead --requests 20000 --clients 1000
+
+slowapi is no longer a dependency of the app; install it to include it in
+the comparison (it is skipped otherwise).
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+
+from src.rate_limit import RateLimitMiddleware, RateLimitRule, RateLimiter
+
+from .common import summarize_latencies, write_results
+
+# High enough that nothing is rejected: we measure the bookkeeping, not 429s.
+_RATE = "1000000000/minute"
+
+
+def _plain_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/api/v1/play/{player_move}")
+    async def play(player_move: str, request: Request):
+        return {"player_move": player_move}
+
+    return app
+
+def _token_bucket_app() -> FastAPI:
+    app = _plain_app()
+    limiter = RateLimiter([RateLimitRule("POST", "/api/v1/play/", _RATE, prefix=True)])
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    return app
+
+def _slowapi_app() -> Optional[FastAPI]:
+    try:
+        from slowapi import Limiter, _rate_limit_exceeded_handler
+        from slowapi.errors import RateLimitExceeded
+        from slowapi.util import get_remote_address
+    except ImportError:
+        logging.warning("slowapi is not installed; skipping it in the comparison.")
+        return None
+    limiter = Limiter(key_func=get_remote_address, storage_uri="memory://")
+    app = FastAPI()
+    app.state.limiter = limiter
+    app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+    @app.post("/api/v1/play/{player_move}")
+    @limiter.limit(_RATE)
+    async def play(player_move: str, request: Request):
+        return {"player_move": player_move}
+
+    return app
+
+VARIANTS: Dict[str, Callable[[], Optional[FastAPI]]] = {
+    "no_limiter": _plain_app,
+    "token_bucket_middleware": _token_bucket_app,
+    "slowapi": _slowapi_app,
+}
+
+
+async def _drive(app: FastAPI, requests: int, clients: int) -> List[float]:
+    """Calls the app `requests` times over ASGI, rotating client addresses."""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    latencies = []
+    for index in range(requests):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": "/api/v1/play/rock",
+            "raw_path": b"/api/v1/play/rock",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"bench")],
+            "client": (f"10.0.{index % clients // 256}.{index % clients % 256}", 50000),
+            "server": ("bench", 80),
+        }
+        start = time.perf_counter()
+        await app(scope, receive, send)
+        latencies.append(time.perf_counter() - start)
+    rejected = sum(1 for status in statuses if status != 200)
+    if rejected:
+        logging.warning(f"{rejected} requests were not answered with 200.")
+    return latencies
+
+
+async def run(requests: int, clients: int, warmup: int) -> List[dict]:
+    results = []
+    baseline_mean = None
+    for name, factory in VARIANTS.items():
+        app = factory()
+        if app is None:
+            continue
+        await _drive(app, warmup, clients)
+        summary = summarize_latencies(await _drive(app, requests, clients))
+        if baseline_mean is None:
+            baseline_mean = summary["mean_ms"]
+        summary["overhead_us"] = round((summary["mean_ms"] - baseline_mean) * 1000, 2)
+        results.append({"variant": name, **summary})
+        logging.info(f"{name}: mean {summary['mean_ms']} ms/request, overhead {summary['overhead_us']} us")
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=1000, help="Distinct client addresses to rotate through")
+    parser.add_argument("--warmup", type=int, default=1000)
+    parser.add_argument("--output", default=os.path.join("bench-results", "rate_limit_overhead.json"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", force=True)
+
+    results = asyncio.run(run(args.requests, args.clients, args.warmup))
+    parameters = {"requests": args.requests, "clients": args.clients, "warmup": args.warmup}
+    write_results(args.output, "rate_limit_overhead", parameters, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/startup.py
+
+"""
+Startup-time benchmark: how long a fresh process takes to import the app
+and to serve its first game request (the cold-start path on Cloud Run).
+
+    python -m benchmarks.startup --runs 5 --output bench-results/startup.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+import httpx
+
+from .common import summarize_latencies, write_results
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import src.routes
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "gemini_sdk_imported": "google.generativeai" in sys.modules,
+}))
+"""
+
+
+def measure_import() -> dict:
+    """Imports src.routes in a fresh interpreter and reports how long it took."""
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def measure_first_response(port: int, timeout: float) -> float:
+    """Seconds from spawning uvicorn until POST /api/v1/play/rock succeeds."""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.routes:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = start + timeout
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            while time.perf_counter() < deadline:
+                try:
+                    if client.post("/api/v1/play/rock").status_code == 200:
+                        return time.perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+        raise RuntimeError(f"App did not answer within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8802)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", default=os.path.join("bench-results", "startup.json"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", force=True)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    imports = [measure_import() for _ in range(args.runs)]
+    first_responses = [measure_first_response(args.port, args.timeout) for _ in range(args.runs)]
+
+    results = {
+        "import_src_routes": summarize_latencies([run["seconds"] for run in imports]),
+        "gemini_sdk_imported_eagerly": any(run["gemini_sdk_imported"] for run in imports),
+        "first_play_response": summarize_latencies(first_responses),
+    }
+    logging.info(
+        f"import src.routes p50 {results['import_src_routes']['p50_ms']} ms, "
+        f"first /play response p50 {results['first_play_response']['p50_ms']} ms"
+    )
+    write_results(args.output, "startup", {"runs": args.runs}, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# benchmarks/supervisor.py
+
+"""
+Worker memory and restart cost of main.py with uvicorn's own workers
+(SUPERVISOR=false) against the pre-forking supervisor (SUPERVISOR=true).
+
+For each mode the server is started with N workers and measured for:
+time to the first response, memory per worker (RSS, PSS and private/USS
+from /proc/<pid>/smaps_rollup, so Linux only), and a restart under
+continuous requests - stop and start for uvicorn, SIGHUP for the
+supervisor - reporting its duration and the requests that failed.
+
+    python -m benchmarks.supervisor --workers 4 --output bench-results/supervisor.json
+"""
+
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+import httpx
+
+from .common import write_results
+
+MODES = ("uvicorn_workers", "supervisor")
+
+
+def _children(pid: int) -> Set[int]:
+    """Worker processes of `pid` (multiprocessing's resource tracker excluded)."""
+    children = set()
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except (OSError, ValueError, IndexError):
+            continue
+        if parent == pid and b"resource_tracker" not in cmdline:
+            children.add(int(entry))
+    return children
+
+def _memory_kb(pid: int) -> Dict[str, int]:
+    fields = {"Rss:": "rss", "Pss:": "pss", "Private_Clean:": "uss", "Private_Dirty:": "uss"}
+    memory = {"rss": 0, "pss": 0, "uss": 0}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name = line.split(maxsplit=1)[0]
+            if name in fields:
+                memory[fields[name]] += int(line.split()[1])
+    return memory
+
+
+class _Traffic:
+    """Background GET /api/v1/score loop counting answered and failed requests."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.answered = 0
+        self.failed = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        with httpx.Client(base_url=self.base_url, timeout=5.0) as client:
+            while not self._stop.is_set():
+                try:
+                    # 429s count as answered: the limiter rejecting is the app serving
+                    if client.get("/api/v1/score").status_code < 500:
+                        self.answered += 1
+                    else:
+                        self.failed += 1
+                except httpx.TransportError:
+                    self.failed += 1
+                    time.sleep(0.01)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _start(mode: str, workers: int, port: int, data_dir: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        SUPERVISOR="true" if mode == "supervisor" else "false",
+        WORKERS=str(workers),
+        PORT=str(port),
+        HOST="127.0.0.1",
+        COMMENTARY_POOL_DEPTH="0",
+        JOKE_BUFFER_SIZE="0",
+        GAME_HISTORY_PATH=os.path.join(data_dir, f"{mode}.db"),
+    )
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    env.setdefault("GOOGLE_API_KEY", "benchmark-placeholder") # Loads the SDK like production; no calls are made
+    return subprocess.Popen([sys.executable, "main.py"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def _wait_until_serving(base_url: str, timeout: float) -> float:
+    start = time.perf_counter()
+    with httpx.Client(base_url=base_url, timeout=1.0) as client:
+        while time.perf_counter() - start < timeout:
+            try:
+                if client.get("/api/v1/score").status_code < 500:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            time.sleep(0.005)
+    raise RuntimeError(f"Server did not answer within {timeout}s")
+
+def _stop(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def measure(mode: str, workers: int, port: int, settle: float, timeout: float, data_dir: str) -> dict:
+    base_url = f"http://127.0.0.1:{port}"
+    process = _start(mode, workers, port, data_dir)
+    try:
+        first_response = _wait_until_serving(base_url, timeout)
+        time.sleep(settle) # Let every worker finish startup and warm-up
+        worker_pids = _children(process.pid)
+        memory = [_memory_kb(pid) for pid in worker_pids]
+        result = {
+            "mode": mode,
+            "first_response_s": round(first_response, 3),
+            "workers": len(worker_pids),
+            "master_rss_mb": round(_memory_kb(process.pid)["rss"] / 1024, 1),
+            **{
+                f"worker_{kind}_mb": round(sum(m[kind] for m in memory) / len(memory) / 1024, 1)
+                for kind in ("rss", "pss", "uss")
+            },
+            "total_pss_mb": round((sum(m["pss"] for m in memory) + _memory_kb(process.pid)["pss"]) / 1024, 1),
+        }
+
+        with _Traffic(base_url) as traffic:
+            time.sleep(1.0)
+            restart_start = time.perf_counter()
+            if mode == "supervisor":
+                process.send_signal(signal.SIGHUP)
+                # Done when every original worker is gone and a full set replaced them
+                while time.perf_counter() - restart_start < timeout:
+                    current = _children(process.pid)
+                    if not current & worker_pids and len(current) == workers:
+                        break
+                    time.sleep(0.02)
+            else:
+                _stop(process)
+                process = _start(mode, workers, port, data_dir)
+                _wait_until_serving(base_url, timeout)
+            result["restart_s"] = round(time.perf_counter() - restart_start, 3)
+            time.sleep(1.0)
+        result["restart_requests_answered"] = traffic.answered
+        result["restart_requests_failed"] = traffic.failed
+        logging.info(
+            f"{mode}: first response {result['first_response_s']}s, worker USS {result['worker_uss_mb']} MB, "
+            f"PSS {result['worker_pss_mb']} MB, restart {result['restart_s']}s with "
+            f"{traffic.failed} failed / {traffic.answered} answered requests"
+        )
+        return result
+    finally:
+        _stop(process)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8803)
+    parser.add_argument("--settle", type=float, default=5.0, help="Seconds to wait before measuring memory")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", default=os.path.join("bench-results", "supervisor.json"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", force=True)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix="rls-bench-") as data_dir:
+        results = [measure(mode, args.workers, args.port, args.settle, args.timeout, data_dir) for mode in MODES]
+    parameters = {"workers": args.workers, "settle": args.settle}
+    write_results(args.output, "supervisor", parameters, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,15 @@
 import uvicorn
 import os
 import logging
+import shutil
+import tempfile
 
-# Configure logging for the runner script itself (optional)
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+from src.structured_logging import configure_logging
+from src.supervisor import LISTEN_FD_ENV, create_supervisor, resolve_worker_count
+
+# Configure logging for the runner script itself: the app's structured,
+# queue-based pipeline (LOG_FORMAT=text for the plain format)
+configure_logging()
 log = logging.getLogger(__name__)
 
 if __name__ == "__main__":
@@ -29,15 +35,56 @@ if __name__ == "__main__":
 
     # Number of worker processes
     # Useful for production, typically set based on CPU cores
-    # Set WORKERS=4 in your environment for 4 workers, defaults to 1
+    # Set WORKERS=4 in your environment for 4 workers, WORKERS=auto for one
+    # per CPU available to the container, defaults to 1
     try:
-        workers = int(os.getenv("WORKERS", "1"))
-        if workers < 1:
-            workers = 1
+        workers = resolve_worker_count(os.getenv("WORKERS", "1"))
     except ValueError:
         log.warning("Invalid WORKERS environment variable. Using default 1.")
         workers = 1
 
+    # Supervisor mode (production): the app is imported once and workers are
+    # forked from it, recycled by MAX_REQUESTS / WORKER_MAX_MEMORY_MB and
+    # replaced one at a time on SIGHUP (`kill -HUP <pid>`) without dropping
+    # connections. See src/supervisor.py.
+    supervise = os.getenv("SUPERVISOR", "false").lower() in ("true", "1", "t") and not reload
+    # A supervisor that re-executed itself for a reload still has workers running
+    reexecuted = LISTEN_FD_ENV in os.environ
+
+    # Metrics from all workers are aggregated through a shared directory
+    # (prometheus_client multiprocess mode). It must be set before workers
+    # start and emptied on every launch. Supervised workers always use it, so
+    # counters survive worker recycling.
+    if workers > 1 or supervise:
+        metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+        if metrics_dir and not reexecuted:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+            os.makedirs(metrics_dir, exist_ok=True)
+        elif not metrics_dir:
+            metrics_dir = tempfile.mkdtemp(prefix="rocklizardspock-metrics-")
+            os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+        log.info(f"  Metrics directory: {metrics_dir}")
+
+    # Scores and rate limits live in each worker's memory with the "local"
+    # state backend, so several workers (or recycled ones) need a shared
+    # one. Default to the host-local shared-memory backend; set
+    # STATE_BACKEND=redis to share across hosts. See src/state_backend.py.
+    if workers > 1 or supervise:
+        state_backend = os.getenv("STATE_BACKEND")
+        if state_backend is None:
+            os.environ["STATE_BACKEND"] = "shm"
+            log.info("  State backend: shm (STATE_BACKEND not set)")
+        elif state_backend.lower() == "local":
+            log.warning(
+                f"STATE_BACKEND=local with {workers} workers: scores and rate limits are kept per worker. "
+                "Use STATE_BACKEND=shm or redis to share them."
+            )
+
+    if supervise:
+        log.info(f"Starting supervisor for src.routes:app on {host}:{port} with {workers} workers")
+        create_supervisor("src.routes:app", host, port, workers).run()
+        raise SystemExit(0)
+
     log.info(f"Starting Uvicorn server:")
     log.info(f"  Host: {host}")
     log.info(f"  Port: {port}")
@@ -51,7 +98,8 @@ if __name__ == "__main__":
         host=host,
         port=port,
         reload=reload,    # Enable auto-reload if reload is True
-        workers=workers   # Set the number of worker processes
+        workers=workers,  # Set the number of worker processes
+        log_config=None,  # Keep uvicorn's records in the structured logging pipeline
         # You can add other uvicorn options here if needed, e.g., log_level
         # log_level="info" # Uvicorn's logging level
     )
\ No newline at end of file
@@ -0,0 +1,123 @@
+# src/chat_cache.py
+
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .metrics import record_cache
+
+# --- Message Normalization ---
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " \t\n.,!?;:'\"`~-"
+
+def normalize_message(message: str) -> str:
+    """
+    Normalizes a chat message into a cache key: case-folded, whitespace
+    collapsed, and surrounding punctuation removed, so "Hello!" and
+    "  hello " share one entry.
+    """
+    return _WHITESPACE_RE.sub(" ", message.casefold()).strip(_EDGE_PUNCTUATION)
+
+
+# --- Cache ---
+
+class ChatResponseCache:
+    """
+    Size-bounded LRU of chat responses with a TTL, plus single-flight
+    coalescing: while a response for a key is being generated, later callers
+    with the same key await that same upstream call instead of starting
+    their own.
+
+    Only non-None results are cached, so failures (which the caller turns
+    into fallback strings) are retried on the next request. Callers that
+    can't use get_or_compute (streamed responses) count their own lookups
+    with record_hit()/record_miss(); they are not coalesced.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: str):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def record_hit(self):
+        self.hits += 1
+        record_cache("chat", "hit")
+
+    def record_miss(self):
+        self.misses += 1
+        record_cache("chat", "miss")
+
+    async def get_or_compute(self, message: str, compute: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """
+        Returns the cached response for `message`, or awaits `compute()` once
+        for all concurrent callers with the same normalized message.
+        """
+        key = normalize_message(message)
+        cached = self.get(key)
+        if cached is not None:
+            self.record_hit()
+            return cached
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            record_cache("chat", "coalesced")
+        else:
+            self.record_miss()
+            task = asyncio.ensure_future(self._compute_and_store(key, compute))
+            self._inflight[key] = task
+        # Shield so a cancelled caller does not cancel the shared upstream call.
+        return await asyncio.shield(task)
+
+    async def _compute_and_store(self, key: str, compute: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        try:
+            value = await compute()
+            if value is not None:
+                self.put(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def create_chat_response_cache() -> ChatResponseCache:
+    """Builds the chat cache sized by CHAT_CACHE_SIZE and CHAT_CACHE_TTL."""
+    try:
+        max_entries = int(os.getenv("CHAT_CACHE_SIZE", "1024"))
+        ttl_seconds = float(os.getenv("CHAT_CACHE_TTL", "300"))
+    except ValueError:
+        logging.warning("Invalid CHAT_CACHE_SIZE/CHAT_CACHE_TTL environment variables. Using defaults.")
+        max_entries, ttl_seconds = 1024, 300.0
+    logging.info(f"Initialized chat response cache (size={max_entries}, ttl={ttl_seconds}s).")
+    return ChatResponseCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
@@ -0,0 +1,113 @@
+# src/commentary_pool.py
+
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, Optional, Tuple
+
+from .metrics import record_cache
+
+MovePair = Tuple[str, str] # (player_move, computer_move)
+CommentaryGenerator = Callable[[str, str], Awaitable[Optional[str]]]
+
+
+class CommentaryPool:
+    """
+    Pre-generated Yoda commentaries, one small queue per winning move pair.
+
+    `take` is O(1) and never awaits, so the play endpoint no longer waits on
+    Gemini. A single background task keeps every queue topped up to `depth`
+    with at most `concurrency` generations in flight, and backs off while
+    the generator keeps failing.
+    """
+
+    def __init__(
+        self,
+        generate: CommentaryGenerator,
+        pairs: Iterable[MovePair],
+        depth: int = 3,
+        concurrency: int = 2,
+        max_backoff_seconds: float = 60.0,
+    ):
+        self.generate = generate
+        self.depth = depth
+        self.concurrency = max(1, concurrency)
+        self.max_backoff_seconds = max_backoff_seconds
+        self._pools: Dict[MovePair, Deque[str]] = {pair: deque(maxlen=max(depth, 1)) for pair in pairs}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def take(self, player_move: str, computer_move: str) -> Optional[str]:
+        """Pops a commentary for the pair, or returns None if its queue is empty."""
+        pool = self._pools.get((player_move, computer_move))
+        commentary = pool.popleft() if pool else None
+        record_cache("commentary_pool", "hit" if commentary is not None else "miss")
+        self._wake.set() # Ask the refill task to top up
+        return commentary
+
+    def size(self, player_move: str, computer_move: str) -> int:
+        pool = self._pools.get((player_move, computer_move))
+        return len(pool) if pool is not None else 0
+
+    def _deficits(self) -> Iterable[MovePair]:
+        for pair, pool in self._pools.items():
+            for _ in range(self.depth - len(pool)):
+                yield pair
+
+    async def _fill_one(self, pair: MovePair, semaphore: asyncio.Semaphore) -> bool:
+        async with semaphore:
+            commentary = await self.generate(*pair)
+        if commentary:
+            self._pools[pair].append(commentary)
+            return True
+        return False
+
+    async def _refill_loop(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        backoff = 1.0
+        while True:
+            self._wake.clear()
+            deficits = list(self._deficits())
+            if not deficits:
+                await self._wake.wait()
+                continue
+            results = await asyncio.gather(
+                *(self._fill_one(pair, semaphore) for pair in deficits), return_exceptions=True
+            )
+            if any(result is True for result in results):
+                backoff = 1.0
+            else:
+                logging.warning(f"Commentary pool refill failed; retrying in {backoff:.0f}s.")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff_seconds)
+
+    def start(self):
+        """Starts the background warm-up/refill task (no-op when depth is 0)."""
+        if self.depth <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._refill_loop())
+        logging.info(f"Commentary pool warming up ({len(self._pools)} move pairs, depth {self.depth}).")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+def create_commentary_pool(generate: CommentaryGenerator, pairs: Iterable[MovePair]) -> CommentaryPool:
+    """Builds the pool sized by COMMENTARY_POOL_DEPTH and COMMENTARY_POOL_CONCURRENCY."""
+    # Generations in flight together are combined by the Gemini batcher, so
+    # the default concurrency matches its default batch size.
+    try:
+        depth = int(os.getenv("COMMENTARY_POOL_DEPTH", "3"))
+        concurrency = int(os.getenv("COMMENTARY_POOL_CONCURRENCY", "8"))
+    except ValueError:
+        logging.warning("Invalid COMMENTARY_POOL_* environment variables. Using defaults.")
+        depth, concurrency = 3, 8
+    return CommentaryPool(generate, pairs, depth=depth, concurrency=concurrency)
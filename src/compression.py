@@ -0,0 +1,162 @@
+# src/compression.py
+
+import gzip
+import logging
+import os
+from mimetypes import guess_type
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+# Brotli is optional: without it only gzip variants are produced.
+try:
+    import brotli
+except ImportError: # pragma: no cover - depends on the environment
+    brotli = None
+
+# --- Configuration ---
+PRECOMPRESSED_DIR = os.path.join("build", "static")
+COMPRESSIBLE_EXTENSIONS = {".js", ".css", ".html", ".svg", ".json", ".txt", ".map"}
+# Below this size a compressed variant is not worth the extra file
+PRECOMPRESS_MIN_SIZE = 256
+
+# Encodings in order of preference, with their file suffixes
+_ENCODING_SUFFIXES = (("br", ".br"), ("gzip", ".gz"))
+
+
+# --- Accept-Encoding ---
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Maps each coding in an Accept-Encoding header to its q-value."""
+    codings: Dict[str, float] = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        codings[coding] = quality
+    return codings
+
+def choose_encoding(header: str, available: List[str]) -> Optional[str]:
+    """Picks the preferred available encoding the client accepts, if any."""
+    codings = parse_accept_encoding(header)
+    wildcard = codings.get("*", 0.0)
+    for encoding in available:
+        if codings.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+# --- Build Step ---
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def precompress_static_assets(source_dir: str = "static", output_dir: str = PRECOMPRESSED_DIR) -> Dict[str, Dict[str, str]]:
+    """
+    Writes max-level gzip (and brotli, when installed) copies of every text
+    asset in `source_dir` to `output_dir`, reusing copies that are newer than
+    their source. Returns {relative path: {encoding: variant path}}.
+    """
+    encodings = [(name, suffix) for name, suffix in _ENCODING_SUFFIXES if name != "br" or brotli is not None]
+    variants: Dict[str, Dict[str, str]] = {}
+    for root, _, files in os.walk(source_dir):
+        for name in files:
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            source_path = os.path.join(root, name)
+            relative_path = os.path.relpath(source_path, source_dir)
+            source_stat = os.stat(source_path)
+            if source_stat.st_size < PRECOMPRESS_MIN_SIZE:
+                continue
+            data = None
+            for encoding, suffix in encodings:
+                variant_path = os.path.join(output_dir, relative_path + suffix)
+                try:
+                    if os.stat(variant_path).st_mtime >= source_stat.st_mtime:
+                        variants.setdefault(relative_path, {})[encoding] = variant_path
+                        continue
+                except FileNotFoundError:
+                    pass
+                if data is None:
+                    with open(source_path, "rb") as f:
+                        data = f.read()
+                compressed = _compress(data, encoding)
+                if len(compressed) >= len(data):
+                    continue
+                os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+                temp_path = f"{variant_path}.{os.getpid()}.tmp"
+                with open(temp_path, "wb") as f:
+                    f.write(compressed)
+                os.replace(temp_path, variant_path)
+                variants.setdefault(relative_path, {})[encoding] = variant_path
+    logging.info(f"Precompressed {len(variants)} static assets ({', '.join(e for e, _ in encodings)}).")
+    return variants
+
+
+# --- Static Files ---
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves a precompressed variant (see
+    precompress_static_assets) when the client accepts its encoding. Each
+    variant is its own file, so it gets its own ETag and 304 handling.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.variants: Dict[str, Dict[str, str]] = {}
+
+    def load_variants(self, variants: Dict[str, Dict[str, str]]):
+        self.variants = variants
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        variants = None
+        if self.directory is not None and self.variants:
+            variants = self.variants.get(os.path.relpath(full_path, self.directory))
+        if not variants:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(
+            request_headers.get("accept-encoding", ""),
+            [name for name, _ in _ENCODING_SUFFIXES if name in variants],
+        )
+        if encoding is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        else:
+            variant_path = variants[encoding]
+            try:
+                variant_stat = os.stat(variant_path)
+            except FileNotFoundError:
+                return super().file_response(full_path, stat_result, scope, status_code)
+            # media_type comes from the original name, not the .br/.gz suffix
+            response = FileResponse(
+                variant_path,
+                status_code=status_code,
+                stat_result=variant_stat,
+                media_type=guess_type(str(full_path))[0] or "text/plain",
+                headers={"Content-Encoding": encoding},
+            )
+        response.headers["Vary"] = "Accept-Encoding"
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+if __name__ == "__main__":
+    # Build step: python -m src.compression
+    logging.basicConfig(level=logging.INFO)
+    precompress_static_assets()
@@ -0,0 +1,146 @@
+# src/game_channel.py
+
+"""
+WebSocket channel for playing many rounds over one connection.
+
+Every frame is JSON text. The client sends one move per frame:
+
+    {"move": "rock", "opponent": "adaptive", "n": 7}    (opponent and n optional)
+
+and the server replies with compact messages, `n` echoing the round:
+
+    {"t": "hello", "player_id": "..."}                        on connect
+    {"t": "r", "n": 7, "c": "spock", "r": 2, "s": [3, 4, 1]}  result: computer move,
+                                                              outcome (0 tie, 1 win, 2 loss),
+                                                              score [wins, losses, ties]
+    {"t": "c", "n": 7, "text": "..."}                         Yoda's commentary, right after the result
+    {"t": "e", "n": 7, "error": "...", "retry_after": 3}      rejected frame (retry_after on 429s)
+
+Rounds count against the same per-client rate limit, update the same
+score and get the same commentary (pooled or fallback, never a Gemini call
+per round) as POST /api/v1/play/{player_move}.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import time
+from typing import Optional
+
+from starlette.websockets import WebSocket
+
+from . import game_engine
+from .metrics import record_rate_limit_rejection
+from .rate_limit import RateLimiter
+from .services import play_round, round_commentary
+
+OPPONENTS = ("random", "adaptive")
+_OUTCOME_CODES = {label: code for code, label in enumerate(game_engine.RESULT_LABELS)}
+MAX_FRAME_CHARS = 256
+
+
+class GameChannel:
+    """
+    Serves one connection. Each round's result is queued for sending as soon
+    as it is resolved, followed by its commentary, which like the HTTP
+    endpoint's comes from the commentary pool (or the fallback) without
+    waiting on Gemini. A single writer task sends everything, so frames
+    never interleave.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        player_id: str,
+        rate_limiter: RateLimiter,
+        rate_limit_path: str,
+        max_queued_messages: int = 64,
+    ):
+        self.websocket = websocket
+        self.player_id = player_id
+        self.rate_limiter = rate_limiter
+        self.rate_limit_path = rate_limit_path
+        client = websocket.client
+        self.client = client.host if client else "unknown"
+        self._outbox: "asyncio.Queue[str]" = asyncio.Queue(maxsize=max_queued_messages)
+        self._rounds = 0
+        self._closed = False
+
+    async def _send(self, message: dict):
+        # Waits when the client reads slower than it plays, which slows the reader too
+        await self._outbox.put(json.dumps(message, separators=(",", ":")))
+
+    async def _write_loop(self):
+        while True:
+            message = await self._outbox.get()
+            if self._closed:
+                continue # Keep draining so producers never block on a dead connection
+            try:
+                await self.websocket.send_text(message)
+            except Exception as e: # Client went away mid-send; the reader sees the disconnect
+                logging.info("Game channel for %s stopped sending: %r", self.client, e)
+                self._closed = True
+
+    def _rate_limit_error(self) -> Optional[dict]:
+        """The error to send if the rate limit rejects this round, else None."""
+        if not self.rate_limiter.enabled:
+            return None
+        policy = self.rate_limiter.match("POST", self.rate_limit_path)
+        if policy is None:
+            return None
+        retry_after = policy.acquire(self.client, time.monotonic())
+        if retry_after == 0.0:
+            return None
+        record_rate_limit_rejection(policy.rule.route)
+        return {"error": f"Rate limit exceeded: {policy.rule.description}", "retry_after": math.ceil(retry_after)}
+
+    async def _handle_frame(self, text: str):
+        self._rounds += 1
+        number = self._rounds
+        try:
+            if len(text) > MAX_FRAME_CHARS:
+                raise ValueError("Frame too large.")
+            frame = json.loads(text)
+            if not isinstance(frame, dict):
+                raise ValueError("Expected a JSON object.")
+            number = frame.get("n", number)
+            player_move = frame.get("move")
+            opponent = frame.get("opponent", "random")
+            if player_move not in game_engine.MOVE_INDEX:
+                raise ValueError(f"Invalid move; expected one of {', '.join(game_engine.MOVES)}.")
+            if opponent not in OPPONENTS:
+                raise ValueError(f"Invalid opponent; expected one of {', '.join(OPPONENTS)}.")
+        except ValueError as e: # json.JSONDecodeError is a ValueError
+            await self._send({"t": "e", "n": number, "error": str(e)})
+            return
+
+        rejection = self._rate_limit_error()
+        if rejection is not None:
+            await self._send({"t": "e", "n": number, **rejection})
+            return
+
+        computer_move, result, score = await play_round(player_move, self.player_id, opponent)
+        await self._send({"t": "r", "n": number, "c": computer_move, "r": _OUTCOME_CODES[result], "s": list(score)})
+        await self._send({"t": "c", "n": number, "text": round_commentary(player_move, computer_move, result)})
+
+    async def run(self):
+        """Accepts the connection and serves it until the client disconnects."""
+        await self.websocket.accept()
+        writer = asyncio.create_task(self._write_loop())
+        try:
+            await self._send({"t": "hello", "player_id": self.player_id})
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                text = message.get("text")
+                if text is None:
+                    await self._send({"t": "e", "n": None, "error": "Expected a text frame."})
+                    continue
+                await self._handle_frame(text)
+        finally:
+            self._closed = True
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)
+            logging.info("Game channel for %s closed after %s frames.", self.client, self._rounds)
@@ -0,0 +1,88 @@
+# src/game_engine.py
+
+import random
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+# --- Encoding ---
+# Moves are small integers indexing MOVES; outcomes index RESULT_LABELS.
+MOVES: Tuple[str, ...] = ('rock', 'paper', 'scissors', 'lizard', 'spock')
+MOVE_INDEX = {move: index for index, move in enumerate(MOVES)}
+
+TIE, WIN, LOSE = 0, 1, 2 # From the player's point of view
+RESULT_LABELS: Tuple[str, ...] = ('Tie.', 'You win.', 'You lose.')
+
+# What each move defeats
+_BEATS = {
+    'scissors': ('paper', 'lizard'),
+    'paper': ('rock', 'spock'),
+    'rock': ('lizard', 'scissors'),
+    'lizard': ('spock', 'paper'),
+    'spock': ('scissors', 'rock'),
+}
+
+def _build_outcome_table() -> Tuple[Tuple[int, ...], ...]:
+    table = []
+    for player in MOVES:
+        row = []
+        for computer in MOVES:
+            if player == computer:
+                row.append(TIE)
+            elif computer in _BEATS[player]:
+                row.append(WIN)
+            else:
+                row.append(LOSE)
+        table.append(tuple(row))
+    return tuple(table)
+
+# OUTCOME_TABLE[player][computer] -> TIE / WIN / LOSE
+OUTCOME_TABLE = _build_outcome_table()
+OUTCOME_MATRIX = np.array(OUTCOME_TABLE, dtype=np.int8)
+OUTCOME_MATRIX.setflags(write=False)
+
+
+# --- Single Round ---
+
+def encode_move(move: str) -> int:
+    """Returns the integer code of a move; raises KeyError for unknown moves."""
+    return MOVE_INDEX[move]
+
+def pick_move_index() -> int:
+    """Uniformly random move code."""
+    return random.randrange(len(MOVES))
+
+def resolve(player_index: int, computer_index: int) -> int:
+    """Outcome code of one round."""
+    return OUTCOME_TABLE[player_index][computer_index]
+
+
+# --- Vectorized Rounds ---
+
+def encode_moves(moves: Sequence[str]) -> np.ndarray:
+    """Encodes a sequence of move names into an int8 array."""
+    return np.fromiter((MOVE_INDEX[move] for move in moves), dtype=np.int8, count=len(moves))
+
+def pick_move_indices(count: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """`count` uniformly random move codes."""
+    rng = rng or np.random.default_rng()
+    return rng.integers(0, len(MOVES), size=count, dtype=np.int8)
+
+def resolve_batch(player_indices: np.ndarray, computer_indices: np.ndarray) -> np.ndarray:
+    """Outcome codes for whole arrays of rounds via a single matrix gather."""
+    return OUTCOME_MATRIX[player_indices, computer_indices]
+
+def tally(outcomes: np.ndarray) -> Tuple[int, int, int]:
+    """(wins, losses, ties) counted from an outcome array."""
+    counts = np.bincount(outcomes, minlength=len(RESULT_LABELS))
+    return int(counts[WIN]), int(counts[LOSE]), int(counts[TIE])
+
+def outcome_counts_by_move(pair_counts: np.ndarray) -> np.ndarray:
+    """
+    Per player move, rounds by outcome code: a (moves x outcomes) array from
+    a (player move x computer move) array of round counts.
+    """
+    counts = np.zeros((len(MOVES), len(RESULT_LABELS)), dtype=np.int64)
+    for outcome in range(len(RESULT_LABELS)):
+        counts[:, outcome] = (pair_counts * (OUTCOME_MATRIX == outcome)).sum(axis=1)
+    return counts
@@ -0,0 +1,268 @@
+# src/game_history.py
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from . import game_engine
+
+# (played_at, player_id, player_move, computer_move, outcome) with moves/outcome as engine codes
+RoundRecord = Tuple[float, str, int, int, int]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY,
+    played_at REAL NOT NULL,
+    player_id TEXT NOT NULL,
+    player_move INTEGER NOT NULL,
+    computer_move INTEGER NOT NULL,
+    outcome INTEGER NOT NULL
+);
+-- Rounds per (player_move, computer_move); the pair determines the outcome,
+-- so win rates and move frequencies for both sides derive from these 25 rows.
+CREATE TABLE IF NOT EXISTS pair_counts (
+    player_move INTEGER NOT NULL,
+    computer_move INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (player_move, computer_move)
+);
+-- Current streak per player: kind is WIN or LOSE (a tie ends any streak).
+CREATE TABLE IF NOT EXISTS player_streaks (
+    player_id TEXT PRIMARY KEY,
+    kind INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    best_win INTEGER NOT NULL,
+    best_loss INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class HistoryAggregates:
+    """Snapshot of the aggregate tables."""
+    __slots__ = ("pair_counts", "longest_win_streak", "longest_loss_streak")
+
+    def __init__(self, pair_counts: List[List[int]], longest_win_streak: int, longest_loss_streak: int):
+        self.pair_counts = pair_counts # [player_move][computer_move] -> rounds
+        self.longest_win_streak = longest_win_streak
+        self.longest_loss_streak = longest_loss_streak
+
+
+class GameHistory:
+    """
+    Append-only log of played rounds in SQLite (WAL mode) with aggregate
+    tables kept up to date in the same transactions.
+
+    `record` only appends to an in-memory buffer, so the play endpoint never
+    touches the disk. A background task writes the buffer in batches every
+    `flush_seconds` (sooner once `batch_size` rounds are waiting). If the
+    disk stalls, the buffer keeps the newest `max_buffer` rounds.
+
+    Aggregates are read from their tables (not by scanning the log) and
+    cached for `stats_ttl_seconds`. Every worker writes to the same file, so
+    the aggregates cover all workers and survive restarts.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_seconds: float = 0.5,
+        batch_size: int = 500,
+        max_buffer: int = 100_000,
+        stats_ttl_seconds: float = 2.0,
+    ):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.batch_size = max(batch_size, 1)
+        self.stats_ttl_seconds = stats_ttl_seconds
+        self._buffer: Deque[RoundRecord] = deque(maxlen=max(max_buffer, 1))
+        self.dropped = 0
+        self._wake: Optional[asyncio.Event] = None # Created in start(), on the serving loop
+        self._task: Optional[asyncio.Task] = None
+        self._writer: Optional[sqlite3.Connection] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.Lock() # A cancelled flush may still be writing in its thread
+        self._reader_lock = threading.Lock()
+        self._cached: Optional[HistoryAggregates] = None
+        self._cached_at = 0.0
+
+    # --- Request path ---
+
+    def record(self, player_id: str, player_move: str, computer_move: str):
+        """Queues one round for writing. O(1), never blocks."""
+        player_index = game_engine.MOVE_INDEX[player_move]
+        computer_index = game_engine.MOVE_INDEX[computer_move]
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append((
+            time.time(), player_id, player_index, computer_index,
+            game_engine.resolve(player_index, computer_index),
+        ))
+        if len(self._buffer) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+
+    # --- Storage ---
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL") # Durable at checkpoints; no fsync per batch
+        return connection
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._writer = self._connect()
+        self._writer.executescript(_SCHEMA)
+        self._reader = self._connect()
+        logging.info(f"Opened game history at {self.path}.")
+
+    def _write_batch(self, batch: List[RoundRecord]):
+        """Appends rounds and updates the aggregates in one transaction (worker thread)."""
+        with self._writer_lock:
+            db = self._writer
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany(
+                    "INSERT INTO rounds (played_at, player_id, player_move, computer_move, outcome) VALUES (?, ?, ?, ?, ?)",
+                    batch,
+                )
+                pairs = Counter((player_move, computer_move) for _, _, player_move, computer_move, _ in batch)
+                db.executemany(
+                    "INSERT INTO pair_counts VALUES (?, ?, ?) "
+                    "ON CONFLICT (player_move, computer_move) DO UPDATE SET count = count + excluded.count",
+                    [(player_move, computer_move, count) for (player_move, computer_move), count in pairs.items()],
+                )
+
+                outcomes_by_player: Dict[str, List[int]] = {}
+                for _, player_id, _, _, outcome in batch:
+                    outcomes_by_player.setdefault(player_id, []).append(outcome)
+                longest_win = longest_loss = 0
+                streak_rows = []
+                for player_id, outcomes in outcomes_by_player.items():
+                    row = db.execute(
+                        "SELECT kind, length, best_win, best_loss FROM player_streaks WHERE player_id = ?", (player_id,)
+                    ).fetchone()
+                    kind, length, best_win, best_loss = row or (game_engine.TIE, 0, 0, 0)
+                    for outcome in outcomes:
+                        if outcome == game_engine.TIE:
+                            kind, length = game_engine.TIE, 0
+                        elif outcome == kind:
+                            length += 1
+                        else:
+                            kind, length = outcome, 1
+                        if kind == game_engine.WIN:
+                            best_win = max(best_win, length)
+                        elif kind == game_engine.LOSE:
+                            best_loss = max(best_loss, length)
+                    streak_rows.append((player_id, kind, length, best_win, best_loss))
+                    longest_win, longest_loss = max(longest_win, best_win), max(longest_loss, best_loss)
+                db.executemany("INSERT OR REPLACE INTO player_streaks VALUES (?, ?, ?, ?, ?)", streak_rows)
+                db.executemany(
+                    "INSERT INTO records VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value)",
+                    [("longest_win_streak", longest_win), ("longest_loss_streak", longest_loss)],
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def _read_aggregates(self) -> HistoryAggregates:
+        size = len(game_engine.MOVES)
+        pair_counts = [[0] * size for _ in range(size)]
+        with self._reader_lock:
+            for player_move, computer_move, count in self._reader.execute("SELECT * FROM pair_counts"):
+                pair_counts[player_move][computer_move] = count
+            records = dict(self._reader.execute("SELECT name, value FROM records"))
+        return HistoryAggregates(
+            pair_counts, records.get("longest_win_streak", 0), records.get("longest_loss_streak", 0)
+        )
+
+    def _read_player_streak(self, player_id: str) -> Tuple[int, int]:
+        with self._reader_lock:
+            row = self._reader.execute(
+                "SELECT kind, length, best_win FROM player_streaks WHERE player_id = ?", (player_id,)
+            ).fetchone()
+        if row is None:
+            return 0, 0
+        kind, length, best_win = row
+        return (-length if kind == game_engine.LOSE else length if kind == game_engine.WIN else 0), best_win
+
+    # --- Async API ---
+
+    async def aggregates(self) -> HistoryAggregates:
+        """Aggregate snapshot, at most `stats_ttl_seconds` old."""
+        now = time.monotonic()
+        if self._cached is None or now - self._cached_at >= self.stats_ttl_seconds:
+            self._cached = await asyncio.to_thread(self._read_aggregates)
+            self._cached_at = now
+        return self._cached
+
+    async def player_streak(self, player_id: str) -> Tuple[int, int]:
+        """(current streak, best win streak); the current streak is negative for losses."""
+        return await asyncio.to_thread(self._read_player_streak, player_id)
+
+    async def flush(self):
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except sqlite3.Error as e:
+                logging.error(f"Failed to write {len(batch)} rounds to the game history: {e}")
+                self._buffer.extendleft(reversed(batch)) # Retried on the next flush
+                return
+        if self.dropped:
+            logging.warning(f"Game history buffer was full; dropped {self.dropped} rounds.")
+            self.dropped = 0
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self):
+        """Opens the database and starts the background writer."""
+        if self._task is not None:
+            return
+        self.open()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stops the writer after writing everything still buffered."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+        for connection in (self._writer, self._reader):
+            connection.close()
+        logging.info("Game history flushed and closed.")
+
+
+def create_game_history() -> GameHistory:
+    """Builds the history configured by GAME_HISTORY_PATH and GAME_HISTORY_FLUSH_SECONDS."""
+    path = os.getenv("GAME_HISTORY_PATH", os.path.join("data", "game_history.db"))
+    try:
+        flush_seconds = float(os.getenv("GAME_HISTORY_FLUSH_SECONDS", "0.5"))
+    except ValueError:
+        logging.warning("Invalid GAME_HISTORY_FLUSH_SECONDS environment variable. Using default 0.5.")
+        flush_seconds = 0.5
+    return GameHistory(path, flush_seconds=flush_seconds)
@@ -0,0 +1,180 @@
+# src/gemini_batcher.py
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+from .metrics import record_batch_size, record_upstream_error
+
+# generate(prompt, operation, prompts) -> SDK-style response with a `.text` attribute,
+# where `prompts` is how many prompts the request answers (1 unless combined)
+Generator = Callable[[str, str, int], Awaitable[Any]]
+_PendingItem = Tuple[str, str, "asyncio.Future"]
+
+
+class BatchItemResponse:
+    """The part of a combined response that belongs to one prompt; shaped like an SDK response."""
+    __slots__ = ("text", "prompt_feedback")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.prompt_feedback = None
+
+
+def build_batch_prompt(prompts: List[str]) -> str:
+    """Combines independent prompts into one request asking for a JSON array of answers."""
+    sections = "\n\n".join(
+        f"### Request {number}\n{prompt.strip()}" for number, prompt in enumerate(prompts, start=1)
+    )
+    return (
+        f"You will receive {len(prompts)} independent requests. Answer each one on its own, "
+        f"following that request's instructions exactly.\n"
+        f"Reply with ONLY a JSON array of exactly {len(prompts)} strings, where element N is the "
+        f"complete answer to Request N. No other text.\n\n{sections}"
+    )
+
+def parse_batch_response(response: Any, expected: int) -> Optional[List[str]]:
+    """Splits a combined response into `expected` answers, or returns None if it doesn't fit."""
+    try:
+        text = response.text.strip()
+    except Exception: # Blocked or empty responses raise on .text
+        return None
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end <= start:
+        return None
+    try:
+        answers = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(answers, list) or len(answers) != expected:
+        return None
+    if not all(isinstance(answer, str) and answer.strip() for answer in answers):
+        return None
+    return [answer.strip() for answer in answers]
+
+
+class GeminiBatcher:
+    """
+    Micro-batching dispatcher for Gemini prompts.
+
+    Prompts submitted within `window_seconds` of each other (up to
+    `max_batch_size`) are sent as one combined request and the answers are
+    split back to the waiting callers. A lone prompt is sent as is, and if
+    a combined response can't be split every prompt is retried on its own.
+    `generate` is any async callable taking (prompt, operation, prompts), so
+    a fake model can stand in for Gemini. Combined requests may take up to
+    `max_timeout` seconds (see `batch_timeout`).
+
+    Only submit prompts the server wrote itself: prompts in one batch can
+    read and steer each other, so free text from different users must never
+    share a request.
+    """
+
+    def __init__(self, generate: Generator, window_seconds: float = 0.005, max_batch_size: int = 8, max_timeout: float = 30.0):
+        self.generate = generate
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.max_timeout = max_timeout
+        self.batches = 0
+        self.fallbacks = 0
+        self._pending: List[_PendingItem] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch_size > 1 and self.window_seconds > 0
+
+    def batch_timeout(self, single_timeout: float, prompts: int) -> float:
+        """Time budget of a request answering `prompts` prompts, given the timeout of a single one."""
+        return min(single_timeout * prompts, max(self.max_timeout, single_timeout))
+
+    async def submit(self, prompt: str, operation: str) -> Any:
+        """Returns the response for `prompt`, possibly answered as part of a batch."""
+        if not self.enabled:
+            return await self.generate(prompt, operation, 1)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((prompt, operation, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_seconds, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        # Callers that were cancelled while waiting are dropped from the batch.
+        items = [item for item in self._pending if not item[2].done()]
+        self._pending = []
+        if not items:
+            return
+        task = asyncio.ensure_future(self._dispatch(items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, items: List[_PendingItem]):
+        try:
+            record_batch_size("gemini", len(items))
+            if len(items) == 1:
+                await self._run_single(items[0])
+                return
+
+            self.batches += 1
+            try:
+                response = await self.generate(build_batch_prompt([item[0] for item in items]), "batch", len(items))
+            except Exception as e:
+                # The upstream itself failed (or its circuit is open): retrying
+                # each prompt separately would only multiply the load.
+                for _, _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            answers = parse_batch_response(response, len(items))
+            if answers is None:
+                self.fallbacks += 1
+                record_upstream_error("gemini", "batch_parse")
+                logging.warning(f"Could not split batched Gemini response ({len(items)} prompts); retrying one by one.")
+                await asyncio.gather(*(self._run_single(item) for item in items))
+                return
+            for (_, _, future), answer in zip(items, answers):
+                if not future.done():
+                    future.set_result(BatchItemResponse(answer))
+        finally:
+            for _, _, future in items:
+                if not future.done():
+                    future.cancel()
+
+    async def _run_single(self, item: _PendingItem):
+        prompt, operation, future = item
+        if future.done():
+            return
+        try:
+            response = await self.generate(prompt, operation, 1)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(response)
+
+
+def create_gemini_batcher(generate: Generator) -> GeminiBatcher:
+    """
+    Builds the batcher configured by GEMINI_BATCH_WINDOW_MS, GEMINI_BATCH_SIZE
+    (1 disables batching) and GEMINI_BATCH_MAX_TIMEOUT (seconds).
+    """
+    try:
+        window_ms = float(os.getenv("GEMINI_BATCH_WINDOW_MS", "5"))
+        max_batch_size = int(os.getenv("GEMINI_BATCH_SIZE", "8"))
+        max_timeout = float(os.getenv("GEMINI_BATCH_MAX_TIMEOUT", "30"))
+    except ValueError:
+        logging.warning("Invalid GEMINI_BATCH_WINDOW_MS/GEMINI_BATCH_SIZE/GEMINI_BATCH_MAX_TIMEOUT environment variables. Using defaults.")
+        window_ms, max_batch_size, max_timeout = 5.0, 8, 30.0
+    logging.info(f"Initialized Gemini batcher (window={window_ms}ms, max batch={max_batch_size}, batch timeout up to {max_timeout}s).")
+    return GeminiBatcher(generate, window_seconds=window_ms / 1000, max_batch_size=max_batch_size, max_timeout=max_timeout)
@@ -0,0 +1,214 @@
+# src/image_pipeline.py
+
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+from typing import Dict, List, Tuple
+
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+from starlette.responses import Response
+
+# Pillow is optional at runtime: without it the pages keep using the originals.
+try:
+    from PIL import Image, features
+except ImportError: # pragma: no cover - depends on the environment
+    Image = None
+    features = None
+
+# --- Configuration ---
+SOURCE_DIR = "images"
+OUTPUT_DIR = os.path.join("build", "images")
+MANIFEST_NAME = "manifest.json"
+PUBLIC_PREFIX = "/assets/images"
+ORIGINALS_PREFIX = "/images"
+
+# Bump when the encoding settings change so existing variants are rebuilt.
+PIPELINE_VERSION = 1
+
+# Rendered widths (1x and 2x of the largest CSS size) per image stem
+DEFAULT_WIDTHS: Tuple[int, ...] = (128, 256)
+IMAGE_WIDTHS: Dict[str, Tuple[int, ...]] = {
+    "RPSLS_Rules_Diagram": (320, 640),
+}
+
+_SOURCE_EXTENSIONS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG"}
+_MODERN_FORMATS = (
+    # (Pillow format, extension, MIME type, save options)
+    ("AVIF", "avif", "image/avif", {"quality": 60}),
+    ("WEBP", "webp", "image/webp", {"quality": 80, "method": 6}),
+)
+_FALLBACK_OPTIONS = {
+    "JPEG": {"quality": 82, "optimize": True, "progressive": True},
+    "PNG": {"optimize": True},
+}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+# --- Static Files ---
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    StaticFiles for content-hashed assets: adds a long-lived immutable
+    Cache-Control header. ETag/Last-Modified and 304 handling come from
+    StaticFiles itself.
+    """
+
+    def file_response(self, full_path, stat_result, scope: Scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+# --- Pipeline ---
+
+def _supported_formats() -> List[tuple]:
+    return [fmt for fmt in _MODERN_FORMATS if features.check(fmt[1])]
+
+def _fingerprint(sources: List[str]) -> str:
+    """Hash of every source image plus the pipeline settings."""
+    digest = hashlib.sha256(f"{PIPELINE_VERSION}:{DEFAULT_WIDTHS}:{sorted(IMAGE_WIDTHS.items())}".encode())
+    for path in sources:
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def _write_hashed(output_dir: str, stem: str, width: int, extension: str, data: bytes) -> str:
+    content_hash = hashlib.sha256(data).hexdigest()[:12]
+    filename = f"{stem}-{width}.{content_hash}.{extension}"
+    # Written under a temporary name and renamed into place: variants are served as
+    # immutable, so a crash or a concurrent worker must never leave a partial file there.
+    path = os.path.join(output_dir, filename)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+    return f"{PUBLIC_PREFIX}/{filename}"
+
+def _encode(image, pillow_format: str, options: dict) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=pillow_format, **options)
+    return buffer.getvalue()
+
+def _build_image(path: str, output_dir: str, formats: List[tuple]) -> dict:
+    stem, extension = os.path.splitext(os.path.basename(path))
+    fallback_format = _SOURCE_EXTENSIONS[extension.lower()]
+    fallback_extension = extension.lower().lstrip(".")
+    widths = IMAGE_WIDTHS.get(stem, DEFAULT_WIDTHS)
+
+    srcsets: Dict[str, List[str]] = {mime: [] for _, _, mime, _ in formats}
+    fallback_srcset: List[str] = []
+    urls: Dict[str, str] = {}
+    with Image.open(path) as source:
+        source = source.convert("RGBA" if fallback_format == "PNG" and source.mode in ("RGBA", "LA", "P") else "RGB")
+        for width in widths:
+            width = min(width, source.width)
+            height = round(source.height * width / source.width)
+            resized = source.resize((width, height), Image.LANCZOS)
+            for pillow_format, ext, mime, options in formats:
+                url = _write_hashed(output_dir, stem, width, ext, _encode(resized, pillow_format, options))
+                srcsets[mime].append(f"{url} {width}w")
+                urls[ext] = url
+            url = _write_hashed(output_dir, stem, width, fallback_extension,
+                                _encode(resized, fallback_format, _FALLBACK_OPTIONS[fallback_format]))
+            fallback_srcset.append(f"{url} {width}w")
+            urls["fallback"] = url
+
+    return {
+        "width": width,
+        "height": height,
+        "sources": [{"type": mime, "srcset": ", ".join(srcsets[mime])} for _, _, mime, _ in formats],
+        "fallback": urls["fallback"],
+        "fallback_srcset": ", ".join(fallback_srcset),
+        # Largest variant in the best format every current browser decodes
+        "preferred": urls.get("webp", urls["fallback"]),
+    }
+
+def _list_sources(source_dir: str) -> List[str]:
+    return sorted(
+        os.path.join(source_dir, name) for name in os.listdir(source_dir)
+        if os.path.splitext(name)[1].lower() in _SOURCE_EXTENSIONS
+    )
+
+def _original_manifest(sources: List[str]) -> dict:
+    """Manifest pointing at the untouched originals (used when Pillow is unavailable)."""
+    images = {}
+    for path in sources:
+        name = os.path.basename(path)
+        url = f"{ORIGINALS_PREFIX}/{name}"
+        images[os.path.splitext(name)[0]] = {
+            "width": None, "height": None, "sources": [],
+            "fallback": url, "fallback_srcset": "", "preferred": url,
+        }
+    return {"fingerprint": None, "images": images}
+
+def build_image_manifest(source_dir: str = SOURCE_DIR, output_dir: str = OUTPUT_DIR) -> dict:
+    """
+    Produces resized, content-hashed AVIF/WebP variants (plus an optimized
+    fallback in the source format) for every image in `source_dir`, and
+    returns the manifest that templates and script.js use to reference them.
+    Variants are reused when the sources and settings are unchanged.
+    """
+    sources = _list_sources(source_dir)
+    if Image is None:
+        logging.warning("Pillow is not installed; serving original images without optimized variants.")
+        return _original_manifest(sources)
+
+    fingerprint = _fingerprint(sources)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("fingerprint") == fingerprint:
+            logging.info(f"Reusing optimized images from {output_dir}.")
+            return manifest
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(output_dir, exist_ok=True)
+    formats = _supported_formats()
+    manifest = {
+        "fingerprint": fingerprint,
+        "images": {os.path.splitext(os.path.basename(path))[0]: _build_image(path, output_dir, formats) for path in sources},
+    }
+    # Write the manifest atomically: other workers may be starting concurrently.
+    temp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, manifest_path)
+
+    # Drop variants from previous builds. Names are content hashes, so files
+    # another worker just wrote for the same sources are never removed.
+    referenced = {MANIFEST_NAME}
+    for entry in manifest["images"].values():
+        for srcset in [entry["fallback_srcset"]] + [source["srcset"] for source in entry["sources"]]:
+            referenced.update(candidate.split()[0].rsplit("/", 1)[-1] for candidate in srcset.split(", "))
+    for name in os.listdir(output_dir):
+        if name not in referenced and not name.endswith(".tmp"):
+            os.remove(os.path.join(output_dir, name))
+    logging.info(f"Built optimized images in {output_dir} ({', '.join(ext for _, ext, _, _ in formats) or 'fallback only'}).")
+    return manifest
+
+def load_image_manifest(source_dir: str = SOURCE_DIR, output_dir: str = OUTPUT_DIR) -> dict:
+    """Like build_image_manifest, but never fails startup: falls back to the originals."""
+    try:
+        return build_image_manifest(source_dir, output_dir)
+    except Exception as e:
+        logging.error(f"Image pipeline failed; serving original images: {e}")
+        return _original_manifest(_list_sources(source_dir))
+
+
+if __name__ == "__main__":
+    # Build step: python -m src.image_pipeline
+    logging.basicConfig(level=logging.INFO)
+    build_image_manifest()
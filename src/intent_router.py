@@ -0,0 +1,356 @@
+# src/intent_router.py
+
+import logging
+import math
+import os
+import random
+import re
+import zlib
+from operator import add
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# --- Intents ---
+JOKE = "joke"         # Answered from the dad joke buffer
+CHAT = "chat"         # Anything else: answered by Gemini
+GREETING = "greeting"
+THANKS = "thanks"
+FAREWELL = "farewell"
+IDENTITY = "identity"
+RULES = "rules"
+
+INTENTS: Tuple[str, ...] = (JOKE, GREETING, THANKS, FAREWELL, IDENTITY, RULES, CHAT)
+
+_RULES_TEXT = (
+    "Simple, the rules are. Scissors cuts paper, paper covers rock, rock crushes lizard, "
+    "lizard poisons Spock, Spock smashes scissors, scissors decapitates lizard, lizard eats paper, "
+    "paper disproves Spock, Spock vaporizes rock, and rock crushes scissors. Choose your move, you must."
+)
+
+# Intents answered locally without a Gemini call, in Yoda's voice
+CANNED_REPLIES: Dict[str, Tuple[str, ...]] = {
+    GREETING: (
+        "Greetings, young one. A round with me, play you will?",
+        "Hmm. Welcome, you are. Rock, paper, scissors, lizard or Spock, choose you must.",
+        "Hello, I say. Strong in the Force, this game is.",
+    ),
+    THANKS: (
+        "Welcome, you are.",
+        "Thanks, needed they are not. Play on, you should.",
+        "Pleased, I am. Hmm.",
+    ),
+    FAREWELL: (
+        "Go in peace. May the Force be with you.",
+        "Farewell, young one. Return soon, you will.",
+        "Leaving, you are? Practice, you must. Hmm.",
+    ),
+    IDENTITY: (
+        "Yoda, I am. Jedi Master, and champion of rock, paper, scissors, lizard, Spock.",
+        "Old, I am. Nine hundred years. Yoda, they call me.",
+    ),
+    RULES: (_RULES_TEXT,),
+}
+
+# --- Patterns ---
+# Phrases that mark an intent wherever they appear in a message, as words.
+# At least two words each: a single word ("joke", "rules") says too little
+# on its own ("is the dark side no joke", "who rules the galaxy") and is
+# matched only as a whole message by INTENT_PATTERNS below.
+INTENT_PHRASES: Dict[str, Tuple[str, ...]] = {
+    JOKE: (
+        "tell me a joke", "tell us a joke", "tell a joke", "tell me a pun", "tell me something funny",
+        "say something funny", "know any jokes", "know a joke", "got any jokes", "any good jokes",
+        "a dad joke", "another joke", "one more joke", "make me laugh", "crack me up", "a good laugh",
+    ),
+    RULES: (
+        "the rules of the game", "rules of this game", "the game rules", "explain the rules",
+        "how do i play", "how do you play", "how to play", "how does one play",
+        "how does this game work", "how does the game work", "what beats what",
+    ),
+}
+
+# Whole-message patterns, matched against the normalized message (lowercase
+# words joined by single spaces): short messages that need no answer from Gemini.
+_ADDRESS = r"(?: (?:master )?yoda| master| there| friend)?"
+_PLEASE = r"(?: please| now)?"
+INTENT_PATTERNS: Dict[str, str] = {
+    JOKE: rf"(?:a |another |one more )?(?:joke|jokes|pun|puns)(?: time)?{_PLEASE}{_ADDRESS}{_PLEASE}",
+    GREETING: rf"(?:hi|hello|hey|heya|hiya|howdy|greetings|hail|good (?:morning|afternoon|evening)){_ADDRESS}",
+    THANKS: rf"(?:thanks|thank you|thx|ty|cheers|much appreciated)(?: (?:so|very) much| a lot)?{_ADDRESS}",
+    FAREWELL: rf"(?:bye|goodbye|good bye|bye bye|farewell|see you|see ya|later|good night)(?: later| soon)?{_ADDRESS}",
+    IDENTITY: r"(?:who|what) are you|are you (?:yoda|real|human|a (?:bot|robot|ai|jedi))",
+    RULES: rf"(?:what are )?(?:the )?(?:game )?rules{_PLEASE}{_ADDRESS}{_PLEASE}",
+}
+
+# --- Training Examples ---
+# Phrasings the patterns don't cover; the n-gram model generalizes from these.
+TRAINING_EXAMPLES: Dict[str, Tuple[str, ...]] = {
+    JOKE: (
+        "tell me a joke", "joke please", "know any jokes", "say something funny",
+        "make me laugh", "i need a laugh", "cheer me up with a joke", "got any good jokes",
+        "give me a dad joke", "another joke", "one more joke", "entertain me",
+        "crack me up", "do you know a pun", "i want to hear something hilarious",
+        "tell me something that will make me smile", "amuse me yoda", "be funny",
+        "got anything to make me giggle", "share a joke with me",
+    ),
+    GREETING: (
+        "hi", "hello", "hey", "hey there", "hello yoda", "hi master yoda", "greetings",
+        "good morning", "good evening", "howdy", "yo", "hello there", "hey yoda whats up",
+        "hi how are you", "hello how are you doing", "hey buddy", "sup",
+    ),
+    THANKS: (
+        "thanks", "thank you", "thank you yoda", "thanks a lot", "much appreciated",
+        "thank you so much", "thanks master", "ty", "thx", "cheers", "that was helpful thanks",
+        "great thanks", "thanks for the advice", "i appreciate it", "thank you for playing",
+    ),
+    FAREWELL: (
+        "bye", "goodbye", "see you later", "see ya", "farewell", "good night",
+        "i have to go", "gotta go", "talk to you later", "bye yoda", "catch you later",
+        "i am leaving now", "until next time", "later master", "i must go now",
+    ),
+    IDENTITY: (
+        "who are you", "what are you", "are you yoda", "are you real", "are you a bot",
+        "are you an ai", "who am i talking to", "what is your name", "tell me about yourself",
+        "are you a robot", "introduce yourself", "how old are you",
+    ),
+    RULES: (
+        "what are the rules", "how do i play", "how does this game work", "explain the rules",
+        "what beats spock", "does rock beat lizard", "what does lizard beat", "how to play",
+        "what beats what", "explain rock paper scissors lizard spock", "does paper beat spock",
+        "what can beat scissors", "which move wins", "teach me the game",
+    ),
+    CHAT: (
+        "what is the force", "tell me about the jedi", "who is luke skywalker",
+        "what should i do with my life", "what is the meaning of life", "how do i become a jedi",
+        "what do you think of darth vader", "can you teach me to use a lightsaber",
+        "i feel sad today", "give me some advice", "what is your favorite food",
+        "tell me about dagobah", "do you like the dark side", "what happened to the sith",
+        "who trained you", "where do you live", "what is the weather like",
+        "can you help me with my homework", "i am afraid of failing", "tell me a story",
+        "what is love", "how do i stay calm", "should i quit my job", "why is the sky blue",
+        "what did you think of episode one", "do you know obi wan", "tell me a secret",
+        "what is patience", "i lost the game", "my friend betrayed me", "is anger bad",
+        "how strong is the force in me", "what would you do in my place", "explain the prophecy",
+        "hello yoda what is the meaning of the force", "hi can you explain what a padawan is",
+        "thanks but what about the sith", "who are you fighting", "what are you doing today",
+        "i want to learn about the galaxy", "recommend a book", "why do you talk like that",
+        "i am tired", "i am bored", "i am happy today", "i won the game", "i keep losing to you",
+    ),
+}
+
+
+# --- Features ---
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(message: str) -> List[str]:
+    """Lowercase alphanumeric words of a message ("What's up?!" -> what, s, up)."""
+    return _TOKEN_RE.findall(message.casefold())
+
+def token_features(token: str, mask: int) -> List[int]:
+    """
+    Hashed unigram and character trigrams of one word (trigrams within the
+    word, so misspellings like "jokke" still share most features with "joke").
+    """
+    padded = f" {token} "
+    features = [zlib.crc32(f"w{token}".encode()) & mask]
+    for index in range(len(padded) - 2):
+        features.append(zlib.crc32(f"c{padded[index:index + 3]}".encode()) & mask)
+    return features
+
+def bigram_feature(previous: str, token: str, mask: int) -> int:
+    """Hashed word bigram; "^" and "$" mark the start and end of the message."""
+    return zlib.crc32(f"b{previous} {token}".encode()) & mask
+
+def hashed_features(tokens: Sequence[str], mask: int) -> List[int]:
+    """All hashed features of a message: per-word features plus word bigrams."""
+    features = []
+    previous = "^"
+    for token in tokens:
+        features.extend(token_features(token, mask))
+        features.append(bigram_feature(previous, token, mask))
+        previous = token
+    features.append(bigram_feature(previous, "$", mask))
+    return features
+
+
+# --- Router ---
+
+_UNCACHED = object()
+
+class IntentMatch:
+    """Result of classifying one message; `source` is "phrase", "pattern", "model" or "default"."""
+    __slots__ = ("intent", "confidence", "source")
+
+    def __init__(self, intent: str, confidence: float, source: str):
+        self.intent = intent
+        self.confidence = confidence
+        self.source = source
+
+    def __repr__(self) -> str:
+        return f"IntentMatch({self.intent!r}, {self.confidence:.2f}, {self.source!r})"
+
+
+class IntentRouter:
+    """
+    Local classifier deciding how a chat message is answered: with a joke,
+    with a canned reply, or by Gemini (CHAT).
+
+    A message is checked in three stages, all built once up front:
+      1. INTENT_PHRASES, looked up word by word in an index keyed on each
+         phrase's first word (one dict lookup per word, however many phrases);
+      2. INTENT_PATTERNS, compiled into one regular expression that must
+         match the whole message;
+      3. a multinomial naive Bayes model over hashed word, bigram and
+         character-trigram features, trained on TRAINING_EXAMPLES. Its
+         log-likelihoods are averaged over the message's words and bigrams
+         (unknown ones included, as no evidence), so long messages and
+         messages of mostly unfamiliar words don't produce near-certain
+         probabilities; its prediction is used only when that probability
+         reaches `threshold`.
+    Anything else goes to CHAT. Each word's and bigram's summed weights are
+    memoized (up to `max_cached_keys`), so a typical message is classified
+    in a few microseconds.
+    """
+
+    def __init__(
+        self,
+        examples: Dict[str, Sequence[str]] = TRAINING_EXAMPLES,
+        phrases: Dict[str, Sequence[str]] = INTENT_PHRASES,
+        patterns: Dict[str, str] = INTENT_PATTERNS,
+        replies: Dict[str, Sequence[str]] = CANNED_REPLIES,
+        threshold: float = 0.85,
+        hash_bits: int = 20,
+        smoothing: float = 0.1,
+        max_cached_keys: int = 50_000,
+        rng: Optional[random.Random] = None,
+    ):
+        self.intents: Tuple[str, ...] = tuple(examples)
+        self.threshold = threshold
+        self.replies = {intent: tuple(texts) for intent, texts in replies.items()}
+        self.rng = rng or random.Random()
+        self.max_cached_keys = max_cached_keys
+        self._mask = (1 << hash_bits) - 1
+        # first word -> [(phrase words, intent)], longest phrase first
+        self._phrases: Dict[str, List[Tuple[Tuple[str, ...], str]]] = {}
+        for intent, intent_phrases in phrases.items():
+            for phrase in intent_phrases:
+                words = tuple(phrase.split())
+                if len(words) < 2:
+                    raise ValueError(f"Intent phrase '{phrase}' needs at least two words; match single words with a pattern.")
+                self._phrases.setdefault(words[0], []).append((words, intent))
+        for candidates in self._phrases.values():
+            candidates.sort(key=lambda candidate: -len(candidate[0]))
+        # One alternation with a named group per intent; the group that matched names the intent
+        self._pattern = re.compile("|".join(f"(?P<{intent}>{pattern})" for intent, pattern in patterns.items()))
+        self._weights = self._train(examples, smoothing)
+        # word or "previous word" bigram -> summed weights, None when it carries no evidence
+        self._vectors: Dict[str, Optional[Tuple[float, ...]]] = {}
+
+    def _train(self, examples: Dict[str, Sequence[str]], smoothing: float) -> Dict[int, Tuple[float, ...]]:
+        """Per-feature log-likelihoods for every intent, for the features seen in training."""
+        counts: Dict[int, List[int]] = {}
+        totals = [0] * len(self.intents)
+        for index, intent in enumerate(self.intents):
+            for example in examples[intent]:
+                for feature in hashed_features(tokenize(example), self._mask):
+                    counts.setdefault(feature, [0] * len(self.intents))[index] += 1
+                    totals[index] += 1
+        vocabulary = len(counts)
+        weights = {}
+        for feature, feature_counts in counts.items():
+            log_likelihoods = [
+                math.log((count + smoothing) / (total + smoothing * vocabulary))
+                for count, total in zip(feature_counts, totals)
+            ]
+            # Only differences between intents matter; centering keeps the sums small
+            mean = sum(log_likelihoods) / len(log_likelihoods)
+            weights[feature] = tuple(value - mean for value in log_likelihoods)
+        logging.info(f"Trained intent router on {sum(map(len, examples.values()))} examples ({vocabulary} features).")
+        return weights
+
+    def _vector(self, key: str) -> Optional[Tuple[float, ...]]:
+        """Summed weights of a word's features, or of a bigram's ("previous word")."""
+        if " " in key:
+            features = [bigram_feature(*key.split(" "), self._mask)]
+        else:
+            features = token_features(key, self._mask)
+        vector = None
+        for feature in features:
+            weights = self._weights.get(feature)
+            if weights is not None: # Unseen features carry no evidence either way
+                vector = weights if vector is None else tuple(map(add, vector, weights))
+        if len(self._vectors) >= self.max_cached_keys:
+            self._vectors.clear()
+        self._vectors[key] = vector
+        return vector
+
+    def predict(self, tokens: Sequence[str]) -> Tuple[str, float]:
+        """Most likely intent by the n-gram model and its probability."""
+        cached = self._vectors.get
+        vectors = []
+        keys = 0
+        previous = "^"
+        for token in tokens:
+            for key in (token, f"{previous} {token}"):
+                vector = cached(key, _UNCACHED)
+                if vector is _UNCACHED:
+                    vector = self._vector(key)
+                if vector is not None:
+                    vectors.append(vector)
+            keys += 2
+            previous = token
+        vector = cached(f"{previous} $", _UNCACHED)
+        if vector is _UNCACHED:
+            vector = self._vector(f"{previous} $")
+        if vector is not None:
+            vectors.append(vector)
+        keys += 1
+        if not vectors: # Nothing known about any word
+            return CHAT, 1.0 / len(self.intents)
+        # Summed log-likelihoods grow with the message and saturate the
+        # softmax; per word/bigram averages keep the probability meaningful
+        scores = [sum(column) / keys for column in zip(*vectors)]
+        top = max(scores)
+        total = sum(math.exp(score - top) for score in scores)
+        return self.intents[scores.index(top)], 1.0 / total
+
+    def _match_phrase(self, tokens: List[str]) -> Optional[str]:
+        phrases = self._phrases
+        for index, token in enumerate(tokens):
+            candidates = phrases.get(token)
+            if candidates is None:
+                continue
+            for words, intent in candidates:
+                if tuple(tokens[index:index + len(words)]) == words:
+                    return intent
+        return None
+
+    def classify(self, message: str) -> IntentMatch:
+        tokens = tokenize(message)
+        if not tokens:
+            return IntentMatch(CHAT, 1.0, "default")
+        intent = self._match_phrase(tokens)
+        if intent is not None:
+            return IntentMatch(intent, 1.0, "phrase")
+        match = self._pattern.fullmatch(" ".join(tokens))
+        if match is not None:
+            return IntentMatch(match.lastgroup, 1.0, "pattern")
+        intent, confidence = self.predict(tokens)
+        if intent != CHAT and confidence >= self.threshold:
+            return IntentMatch(intent, confidence, "model")
+        return IntentMatch(CHAT, confidence if intent == CHAT else 1.0 - confidence, "default")
+
+    def reply(self, intent: str) -> Optional[str]:
+        """A canned answer for `intent`, or None if it needs a joke or Gemini."""
+        texts = self.replies.get(intent)
+        return self.rng.choice(texts) if texts else None
+
+
+def create_intent_router() -> IntentRouter:
+    """Builds the chat intent router; INTENT_ROUTER_THRESHOLD sets the model's minimum confidence (above 1 disables it)."""
+    try:
+        threshold = float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.85"))
+    except ValueError:
+        logging.warning("Invalid INTENT_ROUTER_THRESHOLD environment variable. Using default 0.85.")
+        threshold = 0.85
+    return IntentRouter(threshold=threshold)
@@ -0,0 +1,138 @@
+# src/joke_buffer.py
+
+import asyncio
+import logging
+import os
+import random
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Set
+
+from .metrics import record_cache
+
+JokeFetcher = Callable[[], Awaitable[str]]
+
+
+class JokeBuffer:
+    """
+    Prefetch queue of distinct dad jokes.
+
+    A background task keeps up to `capacity` jokes buffered, fetching with at
+    most `concurrency` requests in flight and skipping jokes that are already
+    buffered or were served recently. `get` serves from the buffer without
+    waiting on the upstream; when the buffer is empty it tries one direct
+    fetch and, if the upstream is down, falls back to a recently served
+    (stale) joke.
+    """
+
+    def __init__(
+        self,
+        fetch: JokeFetcher,
+        capacity: int = 8,
+        concurrency: int = 2,
+        recent_size: int = 100,
+        max_backoff_seconds: float = 60.0,
+    ):
+        self.fetch = fetch
+        self.capacity = capacity
+        self.concurrency = max(1, concurrency)
+        self.max_backoff_seconds = max_backoff_seconds
+        self._buffer: Deque[str] = deque()
+        self._recent: Deque[str] = deque(maxlen=max(recent_size, 1))
+        self._recent_set: Set[str] = set()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def _is_known(self, joke: str) -> bool:
+        return joke in self._recent_set or joke in self._buffer
+
+    def _mark_served(self, joke: str):
+        if joke in self._recent_set:
+            return
+        if len(self._recent) == self._recent.maxlen:
+            self._recent_set.discard(self._recent[0])
+        self._recent.append(joke)
+        self._recent_set.add(joke)
+
+    async def get(self) -> str:
+        """
+        Returns a joke: buffered if possible, otherwise fetched directly, and
+        as a last resort a stale one. Re-raises the fetch error only when no
+        joke has ever been seen.
+        """
+        self._wake.set()
+        if self._buffer:
+            joke = self._buffer.popleft()
+            self._mark_served(joke)
+            record_cache("joke_buffer", "hit")
+            return joke
+        record_cache("joke_buffer", "miss")
+        try:
+            joke = await self.fetch()
+        except Exception:
+            if self._recent:
+                logging.warning("Joke upstream unavailable and buffer empty; serving a stale joke.")
+                record_cache("joke_buffer", "stale")
+                return random.choice(self._recent)
+            raise
+        self._mark_served(joke)
+        return joke
+
+    async def _fetch_one(self, semaphore: asyncio.Semaphore) -> bool:
+        async with semaphore:
+            joke = await self.fetch()
+        if self._is_known(joke) or len(self._buffer) >= self.capacity:
+            return False
+        self._buffer.append(joke)
+        return True
+
+    async def _refill_loop(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        backoff = 1.0
+        while True:
+            self._wake.clear()
+            missing = self.capacity - len(self._buffer)
+            if missing <= 0:
+                await self._wake.wait()
+                continue
+            results = await asyncio.gather(
+                *(self._fetch_one(semaphore) for _ in range(missing)), return_exceptions=True
+            )
+            if any(result is True for result in results):
+                backoff = 1.0
+            else:
+                # Upstream down, or only returning jokes we already have
+                logging.warning(f"Joke buffer refill made no progress; retrying in {backoff:.0f}s.")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff_seconds)
+
+    def start(self):
+        """Starts the background prefetch task (no-op when capacity is 0)."""
+        if self.capacity <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._refill_loop())
+        logging.info(f"Joke buffer prefetching (capacity {self.capacity}, concurrency {self.concurrency}).")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+def create_joke_buffer(fetch: JokeFetcher) -> JokeBuffer:
+    """Builds the buffer sized by JOKE_BUFFER_SIZE, JOKE_BUFFER_CONCURRENCY and JOKE_RECENT_SIZE."""
+    try:
+        capacity = int(os.getenv("JOKE_BUFFER_SIZE", "8"))
+        concurrency = int(os.getenv("JOKE_BUFFER_CONCURRENCY", "2"))
+        recent_size = int(os.getenv("JOKE_RECENT_SIZE", "100"))
+    except ValueError:
+        logging.warning("Invalid JOKE_BUFFER_* environment variables. Using defaults.")
+        capacity, concurrency, recent_size = 8, 2, 100
+    return JokeBuffer(fetch, capacity=capacity, concurrency=concurrency, recent_size=recent_size)
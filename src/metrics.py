@@ -0,0 +1,229 @@
+# src/metrics.py
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# --- Configuration ---
+# With several workers, prometheus_client must write to a directory shared by
+# all of them (PROMETHEUS_MULTIPROC_DIR, set by main.py before workers start).
+MULTIPROCESS_MODE = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# --- Metric Definitions ---
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled.",
+    multiprocess_mode="livesum",
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of calls to external services.",
+    ["upstream", "operation"],
+    buckets=_LATENCY_BUCKETS,
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total",
+    "Failed calls to external services.",
+    ["upstream", "operation"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Lookups in the app's caches and pools by result (hit, miss, coalesced, stale).",
+    ["cache", "result"],
+)
+UPSTREAM_REJECTIONS = Counter(
+    "upstream_rejections_total",
+    "Calls to external services refused without being attempted (circuit_open, saturated).",
+    ["upstream", "reason"],
+)
+UPSTREAM_HEDGES = Counter(
+    "upstream_hedged_requests_total",
+    "Second attempts sent because the first call to an external service was slow.",
+    ["upstream"],
+)
+CIRCUIT_STATE = Gauge(
+    "upstream_circuit_state",
+    "Circuit breaker state per external service (0 closed, 1 half-open, 2 open).",
+    ["upstream"],
+    multiprocess_mode="livemax",
+)
+UPSTREAM_BATCH_SIZE = Histogram(
+    "upstream_batch_size",
+    "Prompts per dispatched request to a batching upstream (1 = sent alone).",
+    ["upstream"],
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32),
+)
+CHAT_INTENTS = Counter(
+    "chat_intents_total",
+    "Chat messages by routed intent (only 'chat' goes to Gemini).",
+    ["intent"],
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total",
+    "Requests rejected by the rate limiter.",
+    ["route"],
+)
+
+
+# --- Recording Helpers ---
+
+class observe_upstream:
+    """
+    Context manager timing one call to an external service and counting it
+    as an error if it raises:
+
+        with observe_upstream("gemini", "chat"):
+            response = await gemini_model.generate_content_async(prompt)
+    """
+    __slots__ = ("upstream", "operation", "start")
+
+    def __init__(self, upstream: str, operation: str):
+        self.upstream = upstream
+        self.operation = operation
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and issubclass(exc_type, asyncio.CancelledError):
+            return False # Abandoned (e.g. the losing half of a hedged pair): neither latency nor error
+        UPSTREAM_LATENCY.labels(self.upstream, self.operation).observe(time.perf_counter() - self.start)
+        if exc_type is not None:
+            UPSTREAM_ERRORS.labels(self.upstream, self.operation).inc()
+        return False
+
+def record_upstream_error(upstream: str, operation: str):
+    """Counts a failure that was reported without an exception (e.g. an empty response)."""
+    UPSTREAM_ERRORS.labels(upstream, operation).inc()
+
+def record_upstream_rejection(upstream: str, reason: str):
+    UPSTREAM_REJECTIONS.labels(upstream, reason).inc()
+
+def record_upstream_hedge(upstream: str):
+    UPSTREAM_HEDGES.labels(upstream).inc()
+
+def record_circuit_state(upstream: str, state: int):
+    CIRCUIT_STATE.labels(upstream).set(state)
+
+def record_batch_size(upstream: str, size: int):
+    UPSTREAM_BATCH_SIZE.labels(upstream).observe(size)
+
+def record_cache(cache: str, result: str):
+    CACHE_REQUESTS.labels(cache, result).inc()
+
+def record_rate_limit_rejection(route: str):
+    RATE_LIMIT_REJECTIONS.labels(route).inc()
+
+def record_chat_intent(intent: str):
+    CHAT_INTENTS.labels(intent).inc()
+
+
+# --- ASGI Middleware ---
+
+# endpoint -> full path template, cached after the first request
+_endpoint_templates: dict = {}
+
+def _prefixed_template(scope: Scope, route) -> str:
+    """
+    Depending on the FastAPI version, scope["route"] may be the router-local
+    route without its include prefix. Recover the prefix by finding where in
+    the request path the route's own pattern starts matching.
+    """
+    path = scope["path"]
+    path_regex = getattr(route, "path_regex", None)
+    if path_regex is not None:
+        for index, char in enumerate(path):
+            if char == "/" and path_regex.match(path[index:]):
+                return path[:index] + route.path
+    return route.path
+
+def route_template(scope: Scope) -> str:
+    """
+    Route path template (e.g. /api/v1/play/{player_move}) to keep label
+    cardinality bounded. Mounted apps report their mount path (e.g. /static).
+    """
+    template = scope.get("route_template") # Set by middleware that answers before routing
+    if template is not None:
+        return template
+    endpoint = scope.get("endpoint")
+    route = scope.get("route")
+    if endpoint is not None and route is not None:
+        template = _endpoint_templates.get(endpoint)
+        if template is None:
+            template = _endpoint_templates[endpoint] = _prefixed_template(scope, route)
+        return template
+    return scope.get("root_path") or "unmatched"
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency and the in-flight
+    gauge. Latency covers the time until the final body chunk is sent.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            REQUEST_LATENCY.labels(scope["method"], route_template(scope), str(status_code)).observe(
+                time.perf_counter() - start
+            )
+
+
+# --- Exposition ---
+
+def render_metrics() -> bytes:
+    """Prometheus text exposition, aggregated across workers in multiprocess mode."""
+    if MULTIPROCESS_MODE:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+def mark_worker_exit(pid: Optional[int] = None):
+    """Drops a worker's (by default this process's) live gauges from the shared multiprocess directory."""
+    if MULTIPROCESS_MODE:
+        multiprocess.mark_process_dead(pid or os.getpid())
+        logging.info(f"Marked metrics of worker {pid or os.getpid()} as dead.")
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
@@ -1,7 +1,11 @@
 # src/models.py
 
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, List, Literal, Optional
+
+Move = Literal['rock', 'paper', 'scissors', 'lizard', 'spock']
+# 'random' picks uniformly; 'adaptive' predicts the player's next move from their history
+Opponent = Literal['random', 'adaptive']
 
 # --- Game Related Models ---
 
@@ -21,6 +25,47 @@ class PlayResponse(BaseModel):
     result: str
     commentary: Optional[str] # Yoda speaks only on computer wins, or provides defaults
 
+class BatchPlayInput(BaseModel):
+    """Request model for resolving many rounds at once (simulations, bot tournaments)."""
+    player_moves: List[Move] = Field(
+        ...,
+        title="Player Moves",
+        description="The player's moves, one per round.",
+        min_length=1,
+        max_length=10000
+    )
+
+class BatchPlayResponse(BaseModel):
+    """Response model for a batch of rounds. Batches do not change the player's score."""
+    computer_moves: List[str]
+    results: List[str]
+    wins: int
+    losses: int
+    ties: int
+
+
+class MoveStats(BaseModel):
+    """Aggregated results of every recorded round in which the player chose `move`."""
+    move: str
+    played: int
+    wins: int
+    losses: int
+    ties: int
+    win_rate: float
+
+class StatsResponse(BaseModel):
+    """Statistics over all recorded rounds, plus the requesting player's streaks."""
+    total_rounds: int
+    wins: int
+    losses: int
+    ties: int
+    moves: List[MoveStats]
+    computer_move_frequency: Dict[str, int]
+    longest_win_streak: int
+    longest_loss_streak: int
+    current_streak: int = Field(..., description="Your current streak: positive for wins in a row, negative for losses.")
+    best_win_streak: int
+
 
 # --- Chat Related Models ---
 
@@ -0,0 +1,160 @@
+# src/opponent.py
+
+import logging
+import os
+import random
+from collections import OrderedDict
+from typing import List, Optional
+
+from . import game_engine
+
+# --- Model Layout ---
+# Each player has one bytearray of move counts, 5 per context row:
+#   row 0            - no context (overall move frequencies)
+#   rows 1..5        - after the player's last move (order 1)
+#   rows 6..30       - after the player's last two moves (order 2)
+_SIZE = len(game_engine.MOVES)
+_ORDER1_ROW = 1
+_ORDER2_ROW = 1 + _SIZE
+_ROWS = 1 + _SIZE + _SIZE * _SIZE
+_COUNT_MAX = 255 # A row is halved before any count overflows, so old habits fade
+
+# Longer contexts predict better once they have data; weights per order 0, 1, 2.
+_ORDER_WEIGHTS = (1.0, 2.0, 4.0)
+
+# For each computer move: (player moves it beats, player moves that beat it)
+_COMPUTER_MATCHUPS = tuple(
+    (
+        tuple(player for player in range(_SIZE) if game_engine.OUTCOME_TABLE[player][computer] == game_engine.LOSE),
+        tuple(player for player in range(_SIZE) if game_engine.OUTCOME_TABLE[player][computer] == game_engine.WIN),
+    )
+    for computer in range(_SIZE)
+)
+
+
+class _PlayerModel:
+    """Move counts and the last two moves of one player (a fixed 155-byte table)."""
+    __slots__ = ("counts", "previous", "last")
+
+    def __init__(self):
+        self.counts = bytearray(_ROWS * _SIZE)
+        self.previous = -1
+        self.last = -1
+
+    def context_rows(self):
+        """(weight, row offset) for each context known so far."""
+        yield _ORDER_WEIGHTS[0], 0
+        if self.last >= 0:
+            yield _ORDER_WEIGHTS[1], (_ORDER1_ROW + self.last) * _SIZE
+            if self.previous >= 0:
+                yield _ORDER_WEIGHTS[2], (_ORDER2_ROW + self.previous * _SIZE + self.last) * _SIZE
+
+    def update(self, move: int):
+        counts = self.counts
+        for _, offset in self.context_rows():
+            if counts[offset + move] == _COUNT_MAX:
+                for index in range(offset, offset + _SIZE):
+                    counts[index] >>= 1
+            counts[offset + move] += 1
+        self.previous, self.last = self.last, move
+
+
+class AdaptiveOpponent:
+    """
+    Computer opponent that predicts each player's next move with a mixed
+    order-0/1/2 Markov model over their recent moves and plays the move with
+    the best expected result against that prediction.
+
+    `observe` updates a fixed-size table per player in O(1), and `pick` reads
+    at most three rows of it, so both run inline in the request. Players are
+    kept in an LRU capped at `max_players`. With probability `exploration`
+    (and until a player has history) the move is uniformly random, so the
+    opponent itself can't be trivially read.
+
+    Models are per process: with several workers each learns from the rounds
+    it serves.
+    """
+
+    def __init__(self, max_players: int = 100_000, exploration: float = 0.1, rng: Optional[random.Random] = None):
+        if max_players < 1:
+            raise ValueError("max_players must be at least 1.")
+        self.max_players = max_players
+        self.exploration = exploration
+        self.rng = rng or random.Random()
+        if rng is None and hasattr(os, "register_at_fork"):
+            # Workers forked from a preloaded app would otherwise all share one sequence
+            os.register_at_fork(after_in_child=self.rng.seed)
+        self._models: "OrderedDict[str, _PlayerModel]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def _weighted_counts(self, player_id: str) -> Optional[List[float]]:
+        """Mixed next-move scores for `player_id` (unnormalized), or None without history."""
+        model = self._models.get(player_id)
+        if model is None:
+            return None
+        counts = model.counts
+        scores = [0.0] * _SIZE
+        total_weight = 0.0
+        for weight, offset in model.context_rows():
+            row = counts[offset:offset + _SIZE]
+            row_total = sum(row)
+            if not row_total:
+                continue
+            # Rows with few observations are trusted less.
+            weight *= row_total / (row_total + 2)
+            total_weight += weight
+            scale = weight / row_total
+            for move in range(_SIZE):
+                scores[move] += scale * row[move]
+        return scores if total_weight else None
+
+    def predict(self, player_id: str) -> Optional[List[float]]:
+        """Predicted probabilities of the player's next move, or None without history."""
+        scores = self._weighted_counts(player_id)
+        if scores is None:
+            return None
+        total = sum(scores)
+        return [score / total for score in scores]
+
+    def pick(self, player_id: str) -> int:
+        """Move code for the computer's next round against `player_id`."""
+        rng = self.rng
+        if rng.random() < self.exploration:
+            return rng.randrange(_SIZE)
+        scores = self._weighted_counts(player_id)
+        if scores is None:
+            return rng.randrange(_SIZE)
+        # Expected result of each computer move (scaled): P(it wins) - P(it loses)
+        best_moves, best_value = [], None
+        for computer, ((beaten_a, beaten_b), (beater_a, beater_b)) in enumerate(_COMPUTER_MATCHUPS):
+            value = scores[beaten_a] + scores[beaten_b] - scores[beater_a] - scores[beater_b]
+            if best_value is None or value > best_value + 1e-9:
+                best_moves, best_value = [computer], value
+            elif value >= best_value - 1e-9:
+                best_moves.append(computer)
+        return best_moves[0] if len(best_moves) == 1 else rng.choice(best_moves)
+
+    def observe(self, player_id: str, player_move: int):
+        """Learns the move `player_id` just played."""
+        model = self._models.get(player_id)
+        if model is None:
+            if len(self._models) >= self.max_players:
+                self._models.popitem(last=False)
+            model = self._models[player_id] = _PlayerModel()
+        else:
+            self._models.move_to_end(player_id)
+        model.update(player_move)
+
+
+def create_adaptive_opponent() -> AdaptiveOpponent:
+    """Builds the opponent configured by ADAPTIVE_OPPONENT_MAX_PLAYERS and ADAPTIVE_OPPONENT_EXPLORATION."""
+    try:
+        max_players = int(os.getenv("ADAPTIVE_OPPONENT_MAX_PLAYERS", "100000"))
+        exploration = float(os.getenv("ADAPTIVE_OPPONENT_EXPLORATION", "0.1"))
+    except ValueError:
+        logging.warning("Invalid ADAPTIVE_OPPONENT_MAX_PLAYERS/ADAPTIVE_OPPONENT_EXPLORATION environment variables. Using defaults.")
+        max_players, exploration = 100_000, 0.1
+    logging.info(f"Initialized adaptive opponent (max players={max_players}, exploration={exploration}).")
+    return AdaptiveOpponent(max_players=max_players, exploration=exploration)
@@ -0,0 +1,180 @@
+# src/page_cache.py
+
+import gzip
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.templating import Jinja2Templates
+from starlette.requests import Request
+from starlette.responses import Response
+
+from .compression import choose_encoding
+
+# Brotli is optional: without it pages are only gzipped.
+try:
+    import brotli
+except ImportError: # pragma: no cover - depends on the environment
+    brotli = None
+
+# --- Configuration ---
+# Per-player values are rendered as these markers once, then spliced in per request.
+SCORE_FIELDS = ("wins", "losses", "ties")
+_MARKER = "\ue000" # Private-use character: never escaped by Jinja, never in real content
+_MARKER_PATTERN = re.compile(f"{_MARKER}(\\w+){_MARKER}")
+_SCORE_MARKERS = {field: f"{_MARKER}{field}{_MARKER}" for field in SCORE_FIELDS}
+
+PAGE_CACHE_CONTROL = "private, no-cache" # Always revalidated; a matching ETag costs a 304
+
+# (wins, losses, ties)
+ScoreTuple = Tuple[int, int, int]
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+class RenderedPage:
+    """
+    One rendering of a template with the score left as gaps. `parts`
+    alternates literal bytes and score field indexes.
+    """
+    __slots__ = ("parts", "digest", "_bodies", "_max_bodies")
+
+    def __init__(self, html: str, max_bodies: int = 256):
+        pieces = _MARKER_PATTERN.split(html)
+        self.parts: List[object] = [
+            piece.encode() if index % 2 == 0 else SCORE_FIELDS.index(piece)
+            for index, piece in enumerate(pieces)
+        ]
+        self.digest = hashlib.blake2b(html.encode(), digest_size=8).hexdigest()
+        self._bodies: "OrderedDict[Tuple[ScoreTuple, Optional[str]], bytes]" = OrderedDict()
+        self._max_bodies = max_bodies
+
+    def etag(self, score: ScoreTuple, encoding: Optional[str]) -> str:
+        # Strong validator: the bytes are fully determined by page, score and coding.
+        suffix = f"-{encoding}" if encoding else ""
+        return f'"{self.digest}-{score[0]}-{score[1]}-{score[2]}{suffix}"'
+
+    def body(self, score: ScoreTuple, encoding: Optional[str]) -> bytes:
+        """The page for `score`, encoded; recent (score, encoding) bodies are kept."""
+        key = (score, encoding)
+        body = self._bodies.get(key)
+        if body is not None:
+            self._bodies.move_to_end(key)
+            return body
+        body = b"".join(part if isinstance(part, bytes) else str(score[part]).encode() for part in self.parts)
+        if encoding is not None:
+            body = _compress(body, encoding)
+        self._bodies[key] = body
+        if len(self._bodies) > self._max_bodies:
+            self._bodies.popitem(last=False)
+        return body
+
+
+class PageCache:
+    """
+    Caches the rendered HTML of one template instead of running Jinja2 per
+    request. url_for renders root-relative paths, so the page doesn't depend
+    on the client-supplied Host header or scheme: it is rendered once per
+    root path (set by the server, not the client), with per-player values
+    spliced in afterwards, and re-rendered when any file in the template
+    directory changes (checked at most every `check_seconds`) or after `clear()`.
+    """
+
+    def __init__(
+        self,
+        templates: Jinja2Templates,
+        template_name: str,
+        directory: str = "templates",
+        check_seconds: float = 1.0,
+        max_variants: int = 8,
+    ):
+        self.templates = templates
+        self.template_name = template_name
+        self.directory = directory
+        self.check_seconds = check_seconds
+        self.max_variants = max(max_variants, 1)
+        self.encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+        self.renders = 0
+        self._pages: "OrderedDict[str, RenderedPage]" = OrderedDict()
+        self._signature: Optional[tuple] = None
+        self._checked_at = 0.0
+
+    def _template_signature(self) -> tuple:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                stat = os.stat(os.path.join(root, name))
+                entries.append((root, name, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(entries))
+
+    def clear(self):
+        """Drops every rendering, e.g. after template globals changed."""
+        self._pages.clear()
+
+    def _check_templates(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_seconds:
+            return
+        self._checked_at = now
+        signature = self._template_signature()
+        if signature != self._signature:
+            if self._signature is not None:
+                logging.info(f"Templates changed; re-rendering {self.template_name}.")
+            self._signature = signature
+            self.clear()
+
+    def page(self, request: Request) -> RenderedPage:
+        self._check_templates()
+        root_path = request.scope.get("root_path", "")
+        page = self._pages.get(root_path)
+        if page is not None:
+            self._pages.move_to_end(root_path)
+            return page
+
+        def url_for(name: str, /, **path_params) -> str:
+            # Shadows Jinja2Templates' url_for, which builds absolute URLs from the Host header
+            return root_path + str(request.app.url_path_for(name, **path_params))
+
+        html = self.templates.get_template(self.template_name).render(
+            {"request": request, "score": _SCORE_MARKERS, "url_for": url_for}
+        )
+        key = root_path
+        page = self._pages[key] = RenderedPage(html)
+        self.renders += 1
+        if len(self._pages) > self.max_variants:
+            self._pages.popitem(last=False)
+        return page
+
+    def response(self, request: Request, score: ScoreTuple) -> Response:
+        """200 with the (compressed) page for `score`, or 304 if the client's copy is current."""
+        page = self.page(request)
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""), self.encodings)
+        headers: Dict[str, str] = {
+            "ETag": page.etag(score, encoding),
+            "Cache-Control": PAGE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding, Cookie, X-Player-Id",
+        }
+        if_none_match = request.headers.get("if-none-match", "")
+        if headers["ETag"] in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(page.body(score, encoding), media_type="text/html", headers=headers)
+
+
+def create_page_cache(templates: Jinja2Templates, template_name: str) -> PageCache:
+    """Builds a page cache; PAGE_CACHE_CHECK_SECONDS sets how often templates are checked for changes."""
+    try:
+        check_seconds = float(os.getenv("PAGE_CACHE_CHECK_SECONDS", "1"))
+    except ValueError:
+        logging.warning("Invalid PAGE_CACHE_CHECK_SECONDS environment variable. Using default 1.")
+        check_seconds = 1.0
+    return PageCache(templates, template_name, check_seconds=check_seconds)
@@ -0,0 +1,303 @@
+# src/rate_limit.py
+
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metrics import record_rate_limit_rejection
+from .state_backend import StateBackend, StateBackendError, get_state_backend, get_state_backend_name
+
+_PERIODS = {"second": 1.0, "minute": 60.0, "hour": 3600.0, "day": 86400.0}
+
+# Answered by routing or request validation before any endpoint ran: the previous
+# (slowapi) limiter, a decorator on the endpoint, never counted these.
+_UNCHARGED_STATUSES = frozenset({404, 405, 422})
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """Parses "15/minute" into (15, 60.0)."""
+    try:
+        amount, unit = rate.split("/")
+        return int(amount), _PERIODS[unit.strip().rstrip("s")]
+    except (ValueError, KeyError):
+        raise ValueError(f"Invalid rate '{rate}'; expected '<count>/<second|minute|hour|day>'.")
+
+
+# --- Token Buckets ---
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "unsynced")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.unsynced = 0 # Requests admitted since the last sync to the shared backend
+
+
+class RateLimitRule:
+    """
+    A rate applied per client to requests matching `method` and `path`
+    (or any path starting with `path` when `prefix` is set). `route` is the
+    label used for metrics.
+    """
+
+    def __init__(self, method: str, path: str, rate: str, prefix: bool = False, route: Optional[str] = None):
+        self.method = method
+        self.path = path
+        self.rate = rate
+        self.prefix = prefix
+        self.route = route or path
+        self.limit, self.period = parse_rate(rate)
+        self.name = f"{method} {self.route}"
+        # Same wording as the 429 bodies the previous (slowapi) limiter sent
+        unit = next(name for name, seconds in _PERIODS.items() if seconds == self.period)
+        self.description = f"{self.limit} per 1 {unit}"
+
+
+class TokenBucketPolicy:
+    """
+    Token buckets for one rule, keyed by client. A bucket holds up to
+    `limit` tokens and refills at limit/period per second, so the long-run
+    rate matches the rule. Buckets idle for a full period are full again;
+    they are evicted (oldest first) as new clients arrive, and the total is
+    capped at `max_clients`.
+    """
+
+    def __init__(self, rule: RateLimitRule, max_clients: int = 10000):
+        self.rule = rule
+        self.capacity = float(rule.limit)
+        self.refill_rate = rule.limit / rule.period
+        self.max_clients = max(max_clients, 1)
+        self._buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+        self._dirty: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _refill(self, bucket: _Bucket, now: float):
+        bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated) * self.refill_rate)
+        bucket.updated = now
+
+    def _evict(self, now: float):
+        buckets = self._buckets
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if len(buckets) < self.max_clients and now - oldest.updated < self.rule.period:
+                break
+            key, _ = buckets.popitem(last=False)
+            self._dirty.discard(key)
+
+    def acquire(self, client: str, now: float) -> float:
+        """Takes a token for `client`: returns 0.0 if admitted, else seconds until one is available."""
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            self._evict(now)
+            bucket = self._buckets[client] = _Bucket(self.capacity, now)
+        else:
+            self._buckets.move_to_end(client)
+            self._refill(bucket, now)
+        if bucket.tokens >= 1.0:
+            bucket.tokens -= 1.0
+            bucket.unsynced += 1
+            self._dirty.add(client)
+            return 0.0
+        return (1.0 - bucket.tokens) / self.refill_rate
+
+    def refund(self, client: str):
+        """Gives back the token of an admitted request that turned out not to count."""
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            return
+        bucket.tokens = min(self.capacity, bucket.tokens + 1.0)
+        if bucket.unsynced:
+            bucket.unsynced -= 1
+
+    def drain_unsynced(self) -> List[Tuple[str, int]]:
+        """Admissions since the last call, per client."""
+        drained = []
+        for client in self._dirty:
+            bucket = self._buckets.get(client)
+            if bucket is not None and bucket.unsynced:
+                drained.append((client, bucket.unsynced))
+                bucket.unsynced = 0
+        self._dirty.clear()
+        return drained
+
+    def apply_shared_count(self, client: str, used: int, now: float):
+        """Caps the local bucket by what all workers together used in the current window."""
+        bucket = self._buckets.get(client)
+        if bucket is not None:
+            self._refill(bucket, now)
+            bucket.tokens = min(bucket.tokens, max(self.capacity - used, 0.0))
+
+
+# --- Limiter ---
+
+class RateLimiter:
+    """
+    Per-client rate limits for a set of routes, checked in-process.
+
+    With `sync_seconds` > 0, a background task periodically adds each
+    worker's admissions to per-window counters in the shared state backend
+    and lowers local buckets by what the other workers used, so limits hold
+    approximately across workers without a backend round-trip per request.
+    """
+
+    def __init__(
+        self,
+        rules: List[RateLimitRule],
+        max_clients: int = 10000,
+        sync_seconds: float = 0.0,
+        backend: Optional[StateBackend] = None,
+    ):
+        self.enabled = True
+        self.sync_seconds = sync_seconds
+        self.backend = backend
+        self.policies = [TokenBucketPolicy(rule, max_clients) for rule in rules]
+        self._exact: Dict[Tuple[str, str], TokenBucketPolicy] = {}
+        self._prefixes: List[TokenBucketPolicy] = []
+        for policy in self.policies:
+            if policy.rule.prefix:
+                self._prefixes.append(policy)
+            else:
+                self._exact[(policy.rule.method, policy.rule.path)] = policy
+        self._task: Optional[asyncio.Task] = None
+
+    def match(self, method: str, path: str) -> Optional[TokenBucketPolicy]:
+        policy = self._exact.get((method, path))
+        if policy is not None:
+            return policy
+        for policy in self._prefixes:
+            if policy.rule.method == method and path.startswith(policy.rule.path):
+                return policy
+        return None
+
+    def _push(self, batch: List[Tuple[TokenBucketPolicy, str, int]], now: float) -> List[int]:
+        """Blocking backend updates; runs in a worker thread."""
+        totals = []
+        for policy, client, count in batch:
+            window = int(now // policy.rule.period)
+            key = f"ratelimit:{policy.rule.name}:{client}:{window}"
+            totals.append(self.backend.incr(key, count, ttl=policy.rule.period))
+        return totals
+
+    async def sync(self):
+        """Pushes local admissions to the shared backend and applies the shared totals."""
+        batch = [
+            (policy, client, count)
+            for policy in self.policies
+            for client, count in policy.drain_unsynced()
+        ]
+        if not batch:
+            return
+        now = time.time()
+        try:
+            totals = await asyncio.to_thread(self._push, batch, now)
+        except (StateBackendError, OSError) as e:
+            logging.warning(f"Rate limit sync failed; limits are per worker until it recovers: {e}")
+            return
+        for (policy, client, _), used in zip(batch, totals):
+            policy.apply_shared_count(client, used, time.monotonic())
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self.sync_seconds)
+            await self.sync()
+
+    def start(self):
+        """Starts periodic syncing (no-op without a backend or interval)."""
+        if self.sync_seconds <= 0 or self.backend is None or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._sync_loop())
+        logging.info(f"Rate limits sync to the '{self.backend.name}' state backend every {self.sync_seconds}s.")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.sync()
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware enforcing a RateLimiter before routing. Clients are
+    keyed by address, so it must run inside ProxyHeadersMiddleware.
+    Rejections get the same 429 JSON body as before plus a Retry-After header.
+    Requests that routing or validation turn away (404, 405, 422, e.g. an
+    invalid move) get their token back, as they never reach an endpoint.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.limiter.enabled:
+            await self.app(scope, receive, send)
+            return
+        policy = self.limiter.match(scope["method"], scope["path"])
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        client_key = client[0] if client else "unknown"
+        retry_after = policy.acquire(client_key, time.monotonic())
+        if retry_after == 0.0:
+            status = None
+
+            async def send_wrapper(message: Message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                if status in _UNCHARGED_STATUSES:
+                    policy.refund(client_key)
+            return
+
+        record_rate_limit_rejection(policy.rule.route)
+        scope["route_template"] = policy.rule.route # Label for MetricsMiddleware; routing never ran
+        body = json.dumps({"error": f"Rate limit exceeded: {policy.rule.description}"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def create_rate_limiter(rules: List[RateLimitRule]) -> RateLimiter:
+    """
+    Builds the limiter configured by RATE_LIMIT_MAX_CLIENTS and
+    RATE_LIMIT_SYNC_SECONDS (default 1s with a shared STATE_BACKEND, 0 =
+    no syncing, which is right for a single worker).
+    """
+    shared = get_state_backend_name() != "local"
+    try:
+        max_clients = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+        sync_seconds = float(os.getenv("RATE_LIMIT_SYNC_SECONDS", "1" if shared else "0"))
+    except ValueError:
+        logging.warning("Invalid RATE_LIMIT_MAX_CLIENTS/RATE_LIMIT_SYNC_SECONDS environment variables. Using defaults.")
+        max_clients, sync_seconds = 10000, (1.0 if shared else 0.0)
+    backend = get_state_backend() if sync_seconds > 0 else None
+    logging.info(f"Initialized token-bucket rate limiter ({len(rules)} rules, sync every {sync_seconds}s).")
+    return RateLimiter(rules, max_clients=max_clients, sync_seconds=sync_seconds, backend=backend)
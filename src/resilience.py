@@ -0,0 +1,305 @@
+# src/resilience.py
+
+import asyncio
+import logging
+import os
+import time
+from array import array
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+from .metrics import record_circuit_state, record_upstream_hedge, record_upstream_rejection
+
+T = TypeVar("T")
+
+# --- Exceptions ---
+
+class UpstreamUnavailableError(Exception):
+    """Base class for calls refused or abandoned by the resilience layer."""
+    def __init__(self, detail: str):
+        self.detail = detail
+        super().__init__(detail)
+
+class CircuitOpenError(UpstreamUnavailableError):
+    """The upstream's circuit is open; the call was not attempted."""
+    pass
+
+class UpstreamSaturatedError(UpstreamUnavailableError):
+    """Too many calls to the upstream are already in flight."""
+    pass
+
+class UpstreamTimeoutError(UpstreamUnavailableError):
+    """The call did not finish within the upstream's adaptive timeout."""
+    pass
+
+
+# --- Building Blocks ---
+
+class LatencyTracker:
+    """
+    Ring buffer of the latest successful call durations. Percentiles are
+    recomputed every `recompute_every` samples rather than on every read.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20, recompute_every: int = 10):
+        self.window = max(window, 1)
+        self.min_samples = min(max(min_samples, 1), self.window)
+        self.recompute_every = max(recompute_every, 1)
+        self._samples = array("d", bytes(8 * self.window))
+        self._count = 0
+        self._since_sort = 0
+        self._sorted: Optional[list] = None
+
+    def record(self, seconds: float):
+        self._samples[self._count % self.window] = seconds
+        self._count += 1
+        self._since_sort += 1
+        if self._since_sort >= self.recompute_every:
+            self._sorted = None
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Nearest-rank percentile, or None until `min_samples` were recorded."""
+        size = min(self._count, self.window)
+        if size < self.min_samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples[:size])
+            self._since_sort = 0
+        ranked = self._sorted
+        return ranked[min(len(ranked) - 1, int(fraction * len(ranked)))]
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker. After `failure_threshold` failures
+    in a row the circuit opens and calls fail fast; after `reset_seconds` a
+    single probe call is let through (half-open) and its outcome closes or
+    re-opens the circuit.
+    """
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+    STATE_NAMES = ("closed", "half_open", "open")
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def _set_state(self, state: int):
+        if state != self.state:
+            logging.warning(f"Circuit for '{self.name}' is now {self.STATE_NAMES[state]}.")
+            self.state = state
+            record_circuit_state(self.name, state)
+
+    def allow(self) -> bool:
+        """Whether a call may proceed now. In half-open state, admits one probe."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if self.clock() - self._opened_at < self.reset_seconds:
+                return False
+            self._set_state(self.HALF_OPEN)
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self._probe_in_flight = False
+        self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._opened_at = self.clock()
+            self._set_state(self.OPEN)
+
+    def record_abandoned(self):
+        """The call was cancelled by its caller: no verdict, but free the probe slot."""
+        self._probe_in_flight = False
+
+
+# --- Upstream ---
+
+class Upstream:
+    """
+    Resilience policy for one external service, shared by all of its calls:
+
+    - a circuit breaker that fails fast while the service is down,
+    - a timeout of `timeout_multiplier` x the observed p99 latency, clamped
+      to [min_timeout, max_timeout] (`initial_timeout` until warmed up),
+    - at most `max_concurrency` calls in flight; extra calls fail fast
+      instead of queueing behind a slow service,
+    - optionally, a hedged second attempt once the first has been running
+      longer than the observed p95.
+
+    Callers catch UpstreamUnavailableError and fall back like for any other
+    upstream failure.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_timeout: float = 10.0,
+        min_timeout: float = 1.0,
+        max_timeout: float = 15.0,
+        timeout_multiplier: float = 3.0,
+        max_concurrency: int = 32,
+        hedge: bool = False,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+    ):
+        self.name = name
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.max_concurrency = max(max_concurrency, 1)
+        self.hedge = hedge
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_seconds)
+        self.latency = LatencyTracker()
+        self.in_flight = 0
+
+    @property
+    def timeout(self) -> float:
+        p99 = self.latency.percentile(0.99)
+        if p99 is None:
+            return self.initial_timeout
+        return min(max(p99 * self.timeout_multiplier, self.min_timeout), self.max_timeout)
+
+    @property
+    def hedge_delay(self) -> Optional[float]:
+        """Delay before a hedged attempt, or None when hedging is off or not warmed up."""
+        if not self.hedge:
+            return None
+        return self.latency.percentile(0.95)
+
+    def _admit(self):
+        if not self.breaker.allow():
+            record_upstream_rejection(self.name, "circuit_open")
+            raise CircuitOpenError(f"Circuit for '{self.name}' is open.")
+        if self.in_flight >= self.max_concurrency:
+            # A probe admitted by allow() above must not stay reserved.
+            self.breaker.record_abandoned()
+            record_upstream_rejection(self.name, "saturated")
+            raise UpstreamSaturatedError(f"Too many calls to '{self.name}' in flight.")
+
+    @asynccontextmanager
+    async def slot(self, track_latency: bool = True) -> AsyncIterator[None]:
+        """
+        Admits one call and records its outcome with the breaker. Use directly
+        for calls that cannot be wrapped in a single awaitable (streams).
+        """
+        self._admit()
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            yield
+        except (asyncio.CancelledError, GeneratorExit):
+            # Caller went away (e.g. a client closed a stream): no verdict.
+            self.breaker.record_abandoned()
+            raise
+        except BaseException:
+            self.breaker.record_failure()
+            raise
+        else:
+            self.breaker.record_success()
+            if track_latency:
+                self.latency.record(time.perf_counter() - start)
+        finally:
+            self.in_flight -= 1
+
+    async def call(self, func: Callable[[], Awaitable[T]], timeout: Optional[float] = None, track_latency: bool = True) -> T:
+        """
+        Runs `func()` under this upstream's breaker, timeout and concurrency
+        limit. Calls unlike the usual one (e.g. several requests combined)
+        pass their own `timeout`, which also turns off hedging, and
+        `track_latency=False` to stay out of the adaptive timeout's percentiles.
+        """
+        async with self.slot(track_latency=track_latency):
+            hedge_delay = self.hedge_delay if timeout is None else None
+            if timeout is None:
+                timeout = self.timeout
+            try:
+                if hedge_delay is None or hedge_delay >= timeout:
+                    return await asyncio.wait_for(func(), timeout)
+                return await self._hedged(func, timeout, hedge_delay)
+            except asyncio.TimeoutError:
+                raise UpstreamTimeoutError(f"'{self.name}' did not answer within {timeout:.2f}s.")
+
+    async def _hedged(self, func: Callable[[], Awaitable[T]], timeout: float, hedge_delay: float) -> T:
+        """First successful result of `func()` and, if it is slow, a second `func()`."""
+        deadline = time.perf_counter() + timeout
+        pending = {asyncio.ensure_future(func())}
+        hedged = False
+        error: Optional[BaseException] = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+            if not done and self.in_flight < self.max_concurrency:
+                hedged = True
+                self.in_flight += 1
+                record_upstream_hedge(self.name)
+                pending.add(asyncio.ensure_future(func()))
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+            if hedged:
+                self.in_flight -= 1
+
+
+def create_upstream(
+    name: str,
+    initial_timeout: float,
+    max_timeout: float,
+    max_concurrency: int,
+    hedge: bool,
+) -> Upstream:
+    """
+    Builds an Upstream; each setting can be overridden with <NAME>_TIMEOUT
+    (initial), <NAME>_MAX_TIMEOUT, <NAME>_MAX_CONCURRENCY, <NAME>_HEDGE,
+    <NAME>_CIRCUIT_FAILURES and <NAME>_CIRCUIT_RESET_SECONDS.
+    """
+    prefix = name.upper()
+    failure_threshold, reset_seconds = 5, 30.0
+    try:
+        settings = (
+            float(os.getenv(f"{prefix}_TIMEOUT", str(initial_timeout))),
+            float(os.getenv(f"{prefix}_MAX_TIMEOUT", str(max_timeout))),
+            int(os.getenv(f"{prefix}_MAX_CONCURRENCY", str(max_concurrency))),
+            int(os.getenv(f"{prefix}_CIRCUIT_FAILURES", str(failure_threshold))),
+            float(os.getenv(f"{prefix}_CIRCUIT_RESET_SECONDS", str(reset_seconds))),
+        )
+        initial_timeout, max_timeout, max_concurrency, failure_threshold, reset_seconds = settings
+    except ValueError:
+        logging.warning(f"Invalid {prefix}_* resilience environment variables. Using defaults.")
+    hedge = os.getenv(f"{prefix}_HEDGE", str(hedge)).lower() in ("true", "1")
+    logging.info(
+        f"Upstream '{name}': timeout {initial_timeout}s (adaptive, max {max_timeout}s), "
+        f"max {max_concurrency} in flight, hedging {'on' if hedge else 'off'}."
+    )
+    return Upstream(
+        name,
+        initial_timeout=initial_timeout,
+        max_timeout=max_timeout,
+        max_concurrency=max_concurrency,
+        hedge=hedge,
+        failure_threshold=failure_threshold,
+        reset_seconds=reset_seconds,
+    )
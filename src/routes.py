@@ -1,36 +1,58 @@
 # src/routes.py
 
+import asyncio
 import logging
-from typing import Literal
+from typing import Literal, Optional
 import os
+import uuid
+import json
 
 # FastAPI and related imports
-from fastapi import FastAPI, Request, status, Depends, APIRouter
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, Request, Response, status, Depends, APIRouter, Query, WebSocket
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware # <--- IMPORT THIS
-
-# Rate Limiting imports
-from slowapi.errors import RateLimitExceeded
-from slowapi import _rate_limit_exceeded_handler
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.requests import HTTPConnection
 
 # Caching imports
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.inmemory import InMemoryBackend
 
 # External library imports (for exception handling)
 import httpx
 
 # Project-specific imports
-from .models import Score, PlayResponse, ChatInput, ChatResponse
+# Structured, queue-based logging; configured before the modules below log their setup
+from .structured_logging import RequestIdMiddleware, configure_logging, flush_logging
+configure_logging()
+from .models import Opponent, Score, StatsResponse, PlayResponse, ChatInput, ChatResponse, BatchPlayInput, BatchPlayResponse
 from .services import (
     get_current_score_service,
+    get_stats_service,
     handle_play_round,
+    handle_play_batch,
     handle_chat,
+    stream_chat,
+    commentary_pool,
+    joke_buffer,
+    game_history,
+    score_store,
     DadJokeAPIError
 )
-from .utils import limiter, http_client
+from .utils import clients
+from .state_backend import StateCacheBackend, get_state_backend
+from .image_pipeline import ImmutableStaticFiles, load_image_manifest, OUTPUT_DIR as IMAGE_OUTPUT_DIR
+from .compression import PrecompressedStaticFiles, precompress_static_assets
+from .page_cache import create_page_cache
+from .game_channel import GameChannel
+from .metrics import (
+    MetricsMiddleware,
+    METRICS_CONTENT_TYPE,
+    mark_worker_exit,
+    render_metrics,
+)
+from .rate_limit import RateLimitMiddleware, RateLimitRule, create_rate_limiter
 
 # --- FastAPI App Initialization ---
 app = FastAPI(
@@ -38,6 +60,22 @@ app = FastAPI(
     description="Play Rock Paper Scissors Lizard Spock & Chat with Yoda (Ask for jokes!)"
 )
 
+API_V1_PREFIX = "/api/v1"
+
+# --- Rate Limiting ---
+# Per-client token buckets checked before routing (see rate_limit.py).
+# Added first so it runs inside ProxyHeadersMiddleware and sees the real client address.
+rate_limiter = create_rate_limiter([
+    RateLimitRule("GET", f"{API_V1_PREFIX}/score", "60/minute"),
+    RateLimitRule("GET", f"{API_V1_PREFIX}/stats", "60/minute"),
+    RateLimitRule("POST", f"{API_V1_PREFIX}/play/batch", "15/minute"),
+    RateLimitRule("POST", f"{API_V1_PREFIX}/play/", "15/minute", prefix=True, route=f"{API_V1_PREFIX}/play/{{player_move}}"),
+    RateLimitRule("POST", f"{API_V1_PREFIX}/chat", "15/minute"),
+    RateLimitRule("POST", f"{API_V1_PREFIX}/chat/stream", "15/minute"),
+])
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+logging.info("Added RateLimitMiddleware.")
+
 # --- ADD PROXY HEADERS MIDDLEWARE ---
 # This tells FastAPI to trust headers like X-Forwarded-Proto (set by Cloud Run)
 # to determine if the original request was HTTPS.
@@ -46,9 +84,32 @@ app.add_middleware(ProxyHeadersMiddleware, trusted_hosts="*")
 logging.info("Added ProxyHeadersMiddleware.")
 # ------------------------------------
 
+# --- Response Compression ---
+# Dynamic responses (JSON, rendered HTML) above the threshold are gzipped.
+# Static text assets are precompressed at startup instead (see compression.py),
+# and responses that already carry a Content-Encoding are left untouched.
+try:
+    compression_min_size = int(os.getenv("COMPRESSION_MIN_SIZE", "1000"))
+except ValueError:
+    logging.warning("Invalid COMPRESSION_MIN_SIZE environment variable. Using default 1000.")
+    compression_min_size = 1000
+app.add_middleware(GZipMiddleware, minimum_size=compression_min_size)
+logging.info(f"Added GZipMiddleware (minimum_size={compression_min_size}).")
+
+# --- Metrics Middleware ---
+# Added after compression so its latency includes it.
+app.add_middleware(MetricsMiddleware)
+logging.info("Added MetricsMiddleware.")
+
+# --- Request Correlation IDs ---
+# Outermost, so every record logged while serving a request carries its id.
+app.add_middleware(RequestIdMiddleware)
+logging.info("Added RequestIdMiddleware.")
+
 # --- Static File & Template Configuration ---
+static_files = PrecompressedStaticFiles(directory="static")
 try:
-    app.mount("/static", StaticFiles(directory="static"), name="static")
+    app.mount("/static", static_files, name="static")
     logging.info("Mounted static directory at /static")
 except RuntimeError as e:
     logging.warning(f"Could not mount static directory (might already be mounted, or path issue): {e}")
@@ -59,12 +120,14 @@ try:
 except RuntimeError as e:
     logging.warning(f"Could not mount images directory (might already be mounted, or path issue): {e}")
 
+# Resized, content-hashed image variants built at startup (see image_pipeline.py)
+app.mount("/assets/images", ImmutableStaticFiles(directory=IMAGE_OUTPUT_DIR, check_dir=False), name="image_variants")
+logging.info("Mounted optimized image variants at /assets/images")
+
 templates = Jinja2Templates(directory="templates")
 logging.info("Configured Jinja2Templates.")
-
-# --- Rate Limiter Setup ---
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# The index page is rendered once and served from memory (see page_cache.py)
+index_page_cache = create_page_cache(templates, "index.html")
 
 # --- Exception Handlers ---
 @app.exception_handler(DadJokeAPIError)
@@ -86,23 +149,76 @@ async def httpx_request_exception_handler(request: Request, exc: httpx.RequestEr
 # --- Lifespan Events (Startup & Shutdown) ---
 @app.on_event("startup")
 async def startup_event():
+    configure_logging() # uvicorn set up its own log handlers when it started this worker
     logging.info("Application startup...")
-    FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
-    logging.info("FastAPI Cache initialized with InMemoryBackend.")
+    image_manifest = await asyncio.to_thread(load_image_manifest)
+    templates.env.globals["image_manifest"] = image_manifest["images"]
+    index_page_cache.clear()
+    static_files.load_variants(await asyncio.to_thread(precompress_static_assets))
+    state_backend = get_state_backend()
+    FastAPICache.init(StateCacheBackend(state_backend), prefix="fastapi-cache")
+    logging.info(f"FastAPI Cache initialized on the '{state_backend.name}' state backend.")
+    # Gemini loads in the background; game routes don't wait for it, and
+    # the commentary pool starts filling once it is ready. Without an API key
+    # it never will, so the pool isn't started and Yoda uses his fallback line.
+    clients.warm_up()
+    if clients.gemini_unavailable:
+        logging.warning("Commentary pool not started: GOOGLE_API_KEY is not set. Yoda's commentary uses its fallback line.")
+    else:
+        commentary_pool.start()
+    joke_buffer.start()
+    rate_limiter.start()
+    game_history.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logging.info("Application shutdown...")
-    await http_client.aclose()
-    logging.info("HTTPX client closed.")
+    await commentary_pool.stop()
+    await joke_buffer.stop()
+    await rate_limiter.stop()
+    await game_history.stop()
+    await clients.aclose()
+    get_state_backend().close()
+    mark_worker_exit()
+    flush_logging()
+
+# --- Player Identification ---
+PLAYER_ID_COOKIE = "player_id"
+PLAYER_ID_HEADER = "X-Player-Id"
+
+def _existing_player_id(connection: HTTPConnection) -> Optional[str]:
+    """The X-Player-Id header or player_id cookie of a request or WebSocket, if valid."""
+    player_id = connection.headers.get(PLAYER_ID_HEADER) or connection.cookies.get(PLAYER_ID_COOKIE)
+    if player_id and len(player_id) <= 64:
+        return player_id
+    return None
+
+def get_player_id(request: Request, response: Response) -> str:
+    """
+    Dependency that resolves the caller's player id, which keys their score.
+    Uses the X-Player-Id header or the player_id cookie; otherwise issues a
+    new id and sets it as a cookie on the response.
+    """
+    player_id = _existing_player_id(request)
+    if player_id:
+        return player_id
+    player_id = uuid.uuid4().hex
+    response.set_cookie(PLAYER_ID_COOKIE, player_id, max_age=60 * 60 * 24 * 365, httponly=True, samesite="lax")
+    return player_id
 
 # --- Frontend Endpoint ---
 @app.get("/", response_class=HTMLResponse, tags=["Frontend"], include_in_schema=False)
-async def read_index(request: Request):
-    logging.info("Serving index.html")
-    # The middleware should ensure request.url.scheme is 'https' now
-    logging.info(f"Request scheme: {request.url.scheme}")
-    return templates.TemplateResponse("index.html", {"request": request})
+async def read_index(request: Request, response: Response, player_id: str = Depends(get_player_id)):
+    # Cached rendering with the player's score spliced in; 304 if unchanged
+    page_response = index_page_cache.response(request, await score_store.aget(player_id))
+    # A returned Response doesn't pick up headers set on `response`, such as a new player_id cookie
+    page_response.headers.raw.extend(item for item in response.headers.raw if item[0] == b"set-cookie")
+    return page_response
+
+# --- Metrics Endpoint ---
+@app.get("/metrics", tags=["Monitoring"], include_in_schema=False)
+async def metrics_endpoint():
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
 
 # --- API Endpoints (Backend Logic) ---
 
@@ -110,22 +226,45 @@ async def read_index(request: Request):
 api_router_v1 = APIRouter()
 
 @api_router_v1.get("/score", response_model=Score, tags=["Game API"])
-@limiter.limit("60/minute")
-async def get_score(request: Request):
-    score_data = get_current_score_service()
+async def get_score(request: Request, player_id: str = Depends(get_player_id)):
+    score_data = await get_current_score_service(player_id)
     return score_data
 
+@api_router_v1.get("/stats", response_model=StatsResponse, tags=["Game API"])
+async def get_stats(request: Request, player_id: str = Depends(get_player_id)):
+    """Win rates per move, computer move frequencies and streaks across all recorded rounds."""
+    return await get_stats_service(player_id)
+
+# Registered before /play/{player_move} so "batch" is not parsed as a move
+@api_router_v1.post("/play/batch", response_model=BatchPlayResponse, tags=["Game API"])
+async def play_batch(
+    batch_input: BatchPlayInput,
+    request: Request
+):
+    return handle_play_batch(batch_input.player_moves)
+
 @api_router_v1.post("/play/{player_move}", response_model=PlayResponse, tags=["Game API"])
-@limiter.limit("15/minute")
 async def play_game(
     player_move: Literal['rock', 'paper', 'scissors', 'lizard', 'spock'],
-    request: Request
+    request: Request,
+    player_id: str = Depends(get_player_id),
+    opponent: Opponent = Query("random", description="'adaptive' plays against a model of your past moves.")
 ):
-    play_data = await handle_play_round(player_move)
+    play_data = await handle_play_round(player_move, player_id, opponent)
     return play_data
 
+@api_router_v1.websocket("/play/ws")
+async def play_game_socket(websocket: WebSocket):
+    """
+    Plays a stream of rounds over one connection (protocol in game_channel.py).
+    Same player id, score and rate limit as POST /play/{player_move}; a new
+    player id is announced in the hello message, since no cookie can be set.
+    """
+    player_id = _existing_player_id(websocket) or uuid.uuid4().hex
+    channel = GameChannel(websocket, player_id, rate_limiter, f"{API_V1_PREFIX}/play/ws")
+    await channel.run()
+
 @api_router_v1.post("/chat", response_model=ChatResponse, tags=["Chat API"])
-@limiter.limit("15/minute")
 async def chat_with_yoda(
     chat_input: ChatInput,
     request: Request
@@ -133,6 +272,26 @@ async def chat_with_yoda(
     response_text = await handle_chat(chat_input.user_message)
     return ChatResponse(yoda_response=response_text)
 
+@api_router_v1.post("/chat/stream", tags=["Chat API"])
+async def chat_with_yoda_stream(
+    chat_input: ChatInput,
+    request: Request
+):
+    """
+    Streams Yoda's response as Server-Sent Events: one `data: {"delta": ...}`
+    event per chunk, followed by a final `event: done`.
+    """
+    async def event_stream():
+        async for chunk in stream_chat(chat_input.user_message):
+            yield f"data: {json.dumps({'delta': chunk})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Include the API router in the main app with a prefix
-app.include_router(api_router_v1, prefix="/api/v1")
+app.include_router(api_router_v1, prefix=API_V1_PREFIX)
 logging.info("Included API router at /api/v1")
\ No newline at end of file
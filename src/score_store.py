@@ -0,0 +1,182 @@
+# src/score_store.py
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .state_backend import get_state_backend, get_state_backend_name
+
+# --- Constants ---
+# Field order used by every score snapshot returned from a store.
+SCORE_FIELDS = ("wins", "losses", "ties")
+
+# (wins, losses, ties)
+ScoreTuple = Tuple[int, int, int]
+
+DEFAULT_MAX_PLAYERS = 10_000
+DEFAULT_IDLE_SECONDS = 3600.0
+
+
+# --- Store Interface ---
+
+class ScoreStore:
+    """
+    Interface for per-player score storage.
+    Implementations must make `increment` atomic for a single player id.
+    Async code calls `aget` and `aincrement`, which stores backed by a
+    blocking backend override to keep the event loop free.
+    """
+
+    def get(self, player_id: str) -> ScoreTuple:
+        """Returns the (wins, losses, ties) snapshot for a player."""
+        raise NotImplementedError
+
+    def increment(self, player_id: str, field: str) -> ScoreTuple:
+        """Atomically adds one to `field` and returns the updated snapshot."""
+        raise NotImplementedError
+
+    async def aget(self, player_id: str) -> ScoreTuple:
+        return self.get(player_id)
+
+    async def aincrement(self, player_id: str, field: str) -> ScoreTuple:
+        return self.increment(player_id, field)
+
+
+# --- In-Memory Implementation ---
+
+class _ScoreRecord:
+    """Compact per-player record (no per-instance __dict__)."""
+    __slots__ = ("wins", "losses", "ties", "last_seen")
+
+    def __init__(self, now: float):
+        self.wins = 0
+        self.losses = 0
+        self.ties = 0
+        self.last_seen = now
+
+    def snapshot(self) -> ScoreTuple:
+        return (self.wins, self.losses, self.ties)
+
+
+class InMemoryScoreStore(ScoreStore):
+    """
+    Bounded LRU of per-player scores for a single process.
+
+    All operations are synchronous and contain no awaits, so when called from
+    the event loop each one runs to completion without interleaving; no lock
+    is needed and no copy of the whole table is made per request.
+    Least-recently-used players are evicted once `max_players` is reached,
+    and players idle for longer than `idle_seconds` are swept on insert.
+    """
+
+    def __init__(self, max_players: int = DEFAULT_MAX_PLAYERS, idle_seconds: float = DEFAULT_IDLE_SECONDS):
+        if max_players < 1:
+            raise ValueError("max_players must be at least 1.")
+        self.max_players = max_players
+        self.idle_seconds = idle_seconds
+        self._records: "OrderedDict[str, _ScoreRecord]" = OrderedDict()
+
+    def _touch(self, player_id: str, create: bool) -> Optional[_ScoreRecord]:
+        now = time.monotonic()
+        record = self._records.get(player_id)
+        if record is not None:
+            record.last_seen = now
+            self._records.move_to_end(player_id)
+            return record
+        if not create:
+            return None
+        self._evict(now)
+        record = _ScoreRecord(now)
+        self._records[player_id] = record
+        return record
+
+    def _evict(self, now: float):
+        """Drops idle players from the LRU end, then enforces the size bound."""
+        records = self._records
+        cutoff = now - self.idle_seconds
+        while records:
+            oldest = next(iter(records.values()))
+            if oldest.last_seen >= cutoff:
+                break
+            records.popitem(last=False)
+        while len(records) >= self.max_players:
+            records.popitem(last=False)
+
+    def get(self, player_id: str) -> ScoreTuple:
+        record = self._touch(player_id, create=False)
+        return record.snapshot() if record is not None else (0, 0, 0)
+
+    def increment(self, player_id: str, field: str) -> ScoreTuple:
+        if field not in SCORE_FIELDS:
+            raise ValueError(f"Unknown score field: {field}")
+        record = self._touch(player_id, create=True)
+        setattr(record, field, getattr(record, field) + 1)
+        return record.snapshot()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+
+# --- Shared Implementation ---
+
+class SharedScoreStore(ScoreStore):
+    """
+    Scores kept in the shared state backend (see state_backend.py) so every
+    worker sees the same totals. Each player is one three-counter vector
+    whose TTL is refreshed on every round, which gives idle eviction;
+    `max_players` is bounded by the backend's own capacity instead.
+    """
+
+    def __init__(self, max_players: int = DEFAULT_MAX_PLAYERS, idle_seconds: float = DEFAULT_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self.backend = get_state_backend()
+
+    def get(self, player_id: str) -> ScoreTuple:
+        return self.backend.get_vector(f"score:{player_id}", len(SCORE_FIELDS))
+
+    def increment(self, player_id: str, field: str) -> ScoreTuple:
+        if field not in SCORE_FIELDS:
+            raise ValueError(f"Unknown score field: {field}")
+        return self.backend.incr_vector(
+            f"score:{player_id}", SCORE_FIELDS.index(field), len(SCORE_FIELDS), ttl=self.idle_seconds
+        )
+
+    async def aget(self, player_id: str) -> ScoreTuple:
+        return await self.backend.run(self.get, player_id)
+
+    async def aincrement(self, player_id: str, field: str) -> ScoreTuple:
+        return await self.backend.run(self.increment, player_id, field)
+
+
+# --- Factory ---
+
+_STORE_FACTORIES: Dict[str, type] = {
+    "memory": InMemoryScoreStore,
+    "shared": SharedScoreStore,
+}
+
+def create_score_store() -> ScoreStore:
+    """
+    Builds the score store selected by the SCORE_STORE_BACKEND environment
+    variable, sized by SCORE_STORE_MAX_PLAYERS and SCORE_STORE_IDLE_SECONDS.
+    Defaults to "shared" when a cross-worker STATE_BACKEND is configured and
+    to "memory" otherwise.
+    """
+    default_backend = "memory" if get_state_backend_name() == "local" else "shared"
+    backend = os.getenv("SCORE_STORE_BACKEND", default_backend).lower()
+    try:
+        max_players = int(os.getenv("SCORE_STORE_MAX_PLAYERS", str(DEFAULT_MAX_PLAYERS)))
+        idle_seconds = float(os.getenv("SCORE_STORE_IDLE_SECONDS", str(DEFAULT_IDLE_SECONDS)))
+    except ValueError:
+        logging.warning("Invalid score store sizing environment variables. Using defaults.")
+        max_players, idle_seconds = DEFAULT_MAX_PLAYERS, DEFAULT_IDLE_SECONDS
+
+    factory = _STORE_FACTORIES.get(backend)
+    if factory is None:
+        logging.warning(f"Unknown SCORE_STORE_BACKEND '{backend}'. Falling back to 'memory'.")
+        factory = InMemoryScoreStore
+    store = factory(max_players=max_players, idle_seconds=idle_seconds)
+    logging.info(f"Initialized {factory.__name__} (max_players={max_players}, idle_seconds={idle_seconds}).")
+    return store
@@ -1,25 +1,52 @@
 # src/services.py
 
+import asyncio
 import logging
-import random
 import json
-from typing import Optional, Union, Literal # Keep Optional
+import os
+from typing import AsyncIterator, List, Optional, Tuple, Union, Literal # Keep Optional
 
-# Caching import for joke fetching
-from fastapi_cache.decorator import cache
-
-# HTTP client for joke fetching, Gemini client for AI
+# Lazily created HTTP client (joke fetching) and Gemini client (AI)
 # Imported here to be used by service functions
-from .utils import http_client, gemini_model
+from .utils import ClientUnavailableError, clients
 # Models for structuring return types or internal use
-from .models import Score, PlayResponse # Keep Score, PlayResponse
+from .models import Opponent, Score, PlayResponse, BatchPlayResponse, MoveStats, StatsResponse
+# Table-driven game rules (single rounds and vectorized batches)
+from . import game_engine
+# Per-player score storage
+from .score_store import create_score_store
+# Cache and single-flight coalescing for Gemini chat responses
+from .chat_cache import create_chat_response_cache, normalize_message
+# Pattern-learning computer opponent
+from .opponent import create_adaptive_opponent
+# Append-only SQLite log of played rounds with aggregated statistics
+from .game_history import create_game_history
+# Background-filled pool of Yoda victory commentaries
+from .commentary_pool import create_commentary_pool
+# Background prefetch queue of dad jokes
+from .joke_buffer import create_joke_buffer
+# Local chat classifier: jokes and canned answers never reach Gemini
+from .intent_router import CHAT, JOKE, create_intent_router
+# Upstream latency/error and cache metrics
+from .metrics import observe_upstream, record_chat_intent, record_upstream_error
+# Circuit breakers, adaptive timeouts and concurrency limits for upstream calls
+from .resilience import UpstreamUnavailableError, create_upstream
+# Combines concurrent Gemini prompts into one request
+from .gemini_batcher import create_gemini_batcher
 # HTTP exception type for error handling during joke fetch
 import httpx
+import numpy as np
 
 # --- Constants ---
 # JOKE_FETCH_FAILED and JokeFetchStatus are no longer needed for chat response logic
 # JOKE_FETCH_FAILED: Literal["JOKE_FETCH_FAILED"] = "JOKE_FETCH_FAILED"
 # JokeFetchStatus = Literal["JOKE_FETCH_FAILED"]
+MOVES = list(game_engine.MOVES)
+CHAT_FALLBACK_RESPONSE = "Meditating, I am. Speak later, we can. Hmm."
+CHAT_BLOCKED_RESPONSE = "Meditating on this, I am. Clouded, the answer is."
+COMMENTARY_FALLBACK = "Victorious, I am... comment, the Force blocks. Hmm."
+# Overridable so the joke buffer can be pointed at a local stub server
+DAD_JOKE_API_URL = os.getenv("DAD_JOKE_API_URL", "https://icanhazdadjoke.com/")
 
 # --- Exceptions ---
 class ServiceError(Exception):
@@ -32,75 +59,116 @@ class DadJokeAPIError(ServiceError):
     """Custom exception for Dad Joke API errors during fetch."""
     pass
 
-# --- State Management (In-Memory) ---
-score_storage = {"score": {"wins": 0, "losses": 0, "ties": 0}}
+# --- Upstream Resilience ---
+# One policy per external service, shared by all of its calls (see resilience.py).
+# Hedging would double paid Gemini calls, so by default it is only on for dad jokes.
+gemini_upstream = create_upstream("gemini", initial_timeout=10.0, max_timeout=15.0, max_concurrency=32, hedge=False)
+dad_joke_upstream = create_upstream("dad_joke", initial_timeout=5.0, max_timeout=10.0, max_concurrency=8, hedge=True)
 
-# --- Internal Helper Functions ---
+# --- State Management ---
+# Scores are kept per player id; see score_store.py for the available backends.
+score_store = create_score_store()
+
+# Maps a round result to the score field it increments.
+_RESULT_TO_SCORE_FIELD = {
+    'You win.': 'wins',
+    'You lose.': 'losses',
+    'Tie.': 'ties',
+}
 
-def _get_score_data() -> dict:
-    """Internal function to safely access score data."""
-    return score_storage.get("score", {"wins": 0, "losses": 0, "ties": 0}).copy()
+# Chat responses keyed on the normalized user message
+chat_response_cache = create_chat_response_cache()
 
-def _update_score_data(new_score_dict: dict):
-    """Internal function to safely update score data."""
-    score_storage["score"] = new_score_dict
-    logging.info(f"Score updated in memory: {new_score_dict}")
+# Learns every player's move sequence; used when a round asks for the adaptive opponent.
+adaptive_opponent = create_adaptive_opponent()
+
+# Routes chat messages to a joke, a canned reply or Gemini
+intent_router = create_intent_router()
+
+# --- Internal Helper Functions ---
 
 def pick_computer_move() -> str:
     """Randomly picks the computer's move (internal game logic)."""
-    moves = ['rock', 'paper', 'scissors', 'lizard', 'spock']
-    return random.choice(moves)
+    return game_engine.MOVES[game_engine.pick_move_index()]
 
 def determine_winner(player_move: str, computer_move: str) -> str:
-    """Determines the winner of the game (internal game logic)."""
-    if player_move == computer_move:
-        return 'Tie.'
-    elif (
-        (player_move == 'scissors' and (computer_move == 'paper' or computer_move == 'lizard')) or
-        (player_move == 'paper' and (computer_move == 'rock' or computer_move == 'spock')) or
-        (player_move == 'rock' and (computer_move == 'lizard' or computer_move == 'scissors')) or
-        (player_move == 'lizard' and (computer_move == 'spock' or computer_move == 'paper')) or
-        (player_move == 'spock' and (computer_move == 'scissors' or computer_move == 'rock'))
-    ):
-        return 'You win.'
-    else:
-        return 'You lose.'
+    """Determines the winner of the game via the engine's outcome table."""
+    outcome = game_engine.resolve(game_engine.MOVE_INDEX[player_move], game_engine.MOVE_INDEX[computer_move])
+    return game_engine.RESULT_LABELS[outcome]
 
-@cache(expire=5) # Keep cache on the actual fetching function
 async def _fetch_dad_joke_from_api() -> str:
     """
     Internal helper to fetch a dad joke asynchronously using httpx.
-    Raises DadJokeAPIError on failure. Caches the result.
+    Raises DadJokeAPIError on failure. Called by the joke buffer, which
+    prefetches and de-duplicates jokes.
     """
-    url = "https://icanhazdadjoke.com/"
+    url = DAD_JOKE_API_URL
     headers = {'Accept': 'application/json'}
-    logging.info("Attempting to fetch dad joke from API (or cache)...")
+    logging.info("Attempting to fetch dad joke from API...")
+    async def request_joke() -> httpx.Response:
+        with observe_upstream("dad_joke", "fetch"):
+            response = await clients.http_client.get(url, headers=headers)
+            response.raise_for_status() # Check for 4xx/5xx errors
+        return response
+
     try:
-        response = await http_client.get(url, headers=headers)
-        response.raise_for_status() # Check for 4xx/5xx errors
+        response = await dad_joke_upstream.call(request_joke)
         joke_data = response.json()
         joke = joke_data.get('joke')
         if not joke:
              raise DadJokeAPIError("API returned valid response but no joke text found.")
         logging.info("Dad joke fetched successfully.")
         return joke
+    except UpstreamUnavailableError as e:
+        logging.warning("Dad joke API skipped: %s", e.detail)
+        raise DadJokeAPIError(e.detail)
     except httpx.TimeoutException as e:
-        logging.error(f"Dad joke API request timed out: {e}")
+        logging.error("Dad joke API request timed out: %s", e)
         raise DadJokeAPIError(f"Request timed out: {e}")
     except httpx.RequestError as e:
-        logging.error(f"Dad joke API request failed: {e}")
+        logging.error("Dad joke API request failed: %s", e)
         raise DadJokeAPIError(f"Request failed: {e}")
     except json.JSONDecodeError as e:
-        logging.error(f"Failed to decode JSON response from Dad Joke API: {e}")
+        logging.error("Failed to decode JSON response from Dad Joke API: %s", e)
         raise DadJokeAPIError(f"Failed to decode JSON response: {e}")
+    except httpx.HTTPStatusError as e:
+        logging.error("Dad joke API returned an error status: %s", e)
+        raise DadJokeAPIError(f"Bad status: {e.response.status_code}")
     except DadJokeAPIError as e:
-        logging.error(f"DadJokeAPIError during fetch: {e.detail}")
+        logging.error("DadJokeAPIError during fetch: %s", e.detail)
         raise
 
-async def _get_yoda_commentary(player_move: str, computer_move: str, score: Score) -> Optional[str]:
+# Played rounds; started and stopped by the app lifespan hooks in routes.py.
+game_history = create_game_history()
+
+# Jokes are served from this buffer; started and stopped by the app lifespan hooks in routes.py.
+joke_buffer = create_joke_buffer(_fetch_dad_joke_from_api)
+
+async def _generate_content(prompt: str, operation: str, prompts: int = 1):
+    """One timed Gemini request under the gemini_upstream policy, answering `prompts` prompts."""
+    gemini_model = await clients.gemini_model()
+
+    async def generate():
+        with observe_upstream("gemini", operation):
+            return await gemini_model.generate_content_async(prompt)
+
+    if prompts == 1:
+        return await gemini_upstream.call(generate)
+    # A combined request writes several answers: it gets its own time budget,
+    # and its latency stays out of the per-prompt adaptive timeout.
+    timeout = gemini_batcher.batch_timeout(gemini_upstream.timeout, prompts)
+    return await gemini_upstream.call(generate, timeout=timeout, track_latency=False)
+
+# Commentary prompts arriving together are sent as one request. Only server-written
+# prompts are batched: users' chat messages must not share a request.
+gemini_batcher = create_gemini_batcher(_generate_content)
+
+async def _get_yoda_commentary(player_move: str, computer_move: str) -> Optional[str]:
     """
     Internal helper to get Yoda's commentary on his win via Gemini API.
     Returns the commentary string or None if fetching fails.
+    Called by the commentary pool in the background, so the prompt does not
+    depend on any one player's score.
     """
     prompt = f"""You are Yoda from Star Wars. You just won a round of Rock Paper Scissors Lizard Spock against a player.
     Comment on your victory in 1-2 short sentences, using your characteristic speech pattern (object-subject-verb, wise/cryptic sayings). Be a bit smug about winning.
@@ -108,150 +176,335 @@ async def _get_yoda_commentary(player_move: str, computer_move: str, score: Scor
     Round Details:
     - Player played: {player_move}
     - You (Computer) played: {computer_move} (You won!)
-    - Current Score: Player Wins={score.wins}, Your Wins (Losses)={score.losses}, Ties={score.ties}
 
     Speak your comment on this victory, you will:"""
     try:
-        logging.info(f"Calling Gemini API for Yoda commentary (Player: {player_move}, Computer: {computer_move})")
-        response = await gemini_model.generate_content_async(prompt)
+        logging.info("Calling Gemini API for Yoda commentary (Player: %s, Computer: %s)", player_move, computer_move)
+        response = await gemini_batcher.submit(prompt, "commentary")
         commentary = response.text.strip()
         if not commentary:
              if response.prompt_feedback and response.prompt_feedback.block_reason:
-                 logging.warning(f"Yoda commentary blocked: {response.prompt_feedback.block_reason}")
+                 logging.warning("Yoda commentary blocked: %s", response.prompt_feedback.block_reason)
                  return "Blocked by the Force, my words are. Hmm."
              else:
                  logging.warning("Gemini returned empty Yoda commentary.")
+                 record_upstream_error("gemini", "commentary")
                  return None
         return commentary
+    except UpstreamUnavailableError as e:
+        logging.warning("Skipping Yoda commentary: %s", e.detail)
+        return None
+    except ClientUnavailableError as e:
+        logging.debug("Skipping Yoda commentary: %s", e.detail) # Logged by the client registry
+        return None
     except Exception as e:
-        logging.error(f"Error getting Yoda commentary from Gemini: {e}")
+        logging.error("Error getting Yoda commentary from Gemini: %s", e, exc_info=True)
         return None
 
+# Pre-generated commentary for every (player_move, computer_move) pair Yoda wins.
+# Started and stopped by the app lifespan hooks in routes.py.
+commentary_pool = create_commentary_pool(
+    _get_yoda_commentary,
+    [(player, computer) for player in MOVES for computer in MOVES
+     if determine_winner(player, computer) == 'You lose.'],
+)
+
+def _build_yoda_chat_prompt(user_message: str) -> str:
+    """Builds the Gemini prompt for a normal (non-joke) chat message."""
+    return f"""You are Yoda from Star Wars. Respond to the user's message below.
+Speak ONLY in your characteristic style (object-subject-verb order is common, use wise/cryptic sayings, short sentences). Keep your responses relatively brief (1-3 sentences maximum). Do NOT break character.
+
+User says: "{user_message}"
+
+Your response as Yoda (normal conversation):"""
+
 # --- SIMPLIFIED: Removed joke_info parameter and related logic ---
 async def _get_yoda_chat_response(user_message: str) -> Optional[str]:
     """
     Internal helper to get Yoda's chat response via Gemini API for normal conversation.
     Returns the chat response string or None if fetching fails.
     """
-    # Only the normal conversation prompt is needed now
-    prompt = f"""You are Yoda from Star Wars. Respond to the user's message below.
-Speak ONLY in your characteristic style (object-subject-verb order is common, use wise/cryptic sayings, short sentences). Keep your responses relatively brief (1-3 sentences maximum). Do NOT break character.
-
-User says: "{user_message}"
+    prompt = _build_yoda_chat_prompt(user_message)
 
-Your response as Yoda (normal conversation):"""
-
-    logging.debug(f"Generated full prompt for Gemini chat:\n{prompt}") # Log the final prompt
+    logging.debug("Generated full prompt for Gemini chat:\n%s", prompt) # Only formatted when debug logging is on
 
     try:
-        logging.info(f"Calling Gemini API for Yoda chat response.")
-        response = await gemini_model.generate_content_async(prompt) # Use the simplified prompt
+        logging.info("Calling Gemini API for Yoda chat response.")
+        # Sent on its own: batched with other users' messages, it could read or steer their answers
+        response = await _generate_content(prompt, "chat")
         yoda_response = response.text.strip()
         if not yoda_response:
              if response.prompt_feedback and response.prompt_feedback.block_reason:
-                 logging.warning(f"Yoda chat response blocked: {response.prompt_feedback.block_reason}")
-                 return "Meditating on this, I am. Clouded, the answer is."
+                 logging.warning("Yoda chat response blocked: %s", response.prompt_feedback.block_reason)
+                 return CHAT_BLOCKED_RESPONSE
              else:
                  logging.warning("Gemini returned empty Yoda chat response.")
+                 record_upstream_error("gemini", "chat")
                  return None
         return yoda_response
+    except UpstreamUnavailableError as e:
+        logging.warning("Skipping Gemini for Yoda chat response: %s", e.detail)
+        return None
+    except ClientUnavailableError as e:
+        logging.debug("Skipping Gemini for Yoda chat response: %s", e.detail) # Logged by the client registry
+        return None
     except Exception as e:
-        logging.error(f"Error getting Yoda chat response from Gemini: {e}")
+        logging.error("Error getting Yoda chat response from Gemini: %s", e, exc_info=True)
         return None
 
+class StreamOutcome:
+    """Set by _stream_yoda_chat_response: whether Gemini's answer arrived in full."""
+    __slots__ = ("complete",)
+
+    def __init__(self):
+        self.complete = False
+
+async def _stream_yoda_chat_response(user_message: str, outcome: Optional[StreamOutcome] = None) -> AsyncIterator[str]:
+    """
+    Internal helper that streams Yoda's chat response from Gemini chunk by chunk.
+    Mirrors _get_yoda_chat_response: yields the blocked message when the prompt
+    is blocked and the generic fallback when nothing could be generated. If the
+    stream breaks after some text was sent, it simply ends there; `outcome`
+    is marked complete only when Gemini's stream finished without an error.
+    """
+    prompt = _build_yoda_chat_prompt(user_message)
+    sent_any = False
+    response = None
+    try:
+        logging.info("Calling Gemini API for streamed Yoda chat response.")
+        gemini_model = await clients.gemini_model()
+        # Stream durations are not call latencies, so they don't feed the adaptive timeout;
+        # the timeout bounds the wait for the stream to start.
+        async with gemini_upstream.slot(track_latency=False):
+            with observe_upstream("gemini", "chat_stream"):
+                response = await asyncio.wait_for(
+                    gemini_model.generate_content_async(prompt, stream=True), gemini_upstream.timeout
+                )
+                async for chunk in response:
+                    try:
+                        text = chunk.text
+                    except ValueError: # Chunk without text parts (e.g. safety stop)
+                        continue
+                    if text:
+                        sent_any = True
+                        yield text
+        if sent_any and outcome is not None:
+            outcome.complete = True
+    except UpstreamUnavailableError as e:
+        logging.warning("Skipping Gemini for streamed Yoda chat response: %s", e.detail)
+    except ClientUnavailableError as e:
+        logging.debug("Skipping Gemini for streamed Yoda chat response: %s", e.detail) # Logged by the client registry
+    except Exception as e:
+        if sent_any:
+            logging.error("Streamed Yoda chat response broke off after partial text: %s", e, exc_info=True)
+        else:
+            logging.error("Error streaming Yoda chat response from Gemini: %s", e, exc_info=True)
+    if sent_any:
+        return
+    feedback = getattr(response, "prompt_feedback", None)
+    if feedback and feedback.block_reason:
+        logging.warning("Yoda chat response blocked: %s", feedback.block_reason)
+        yield CHAT_BLOCKED_RESPONSE
+    else:
+        yield CHAT_FALLBACK_RESPONSE
+
 # --- Public Service Functions (Called by routes.py) ---
 
-def get_current_score_service() -> Score:
-    """Service function to retrieve the current score."""
-    score_data = _get_score_data()
-    return Score(**score_data)
+async def get_current_score_service(player_id: str) -> Score:
+    """Service function to retrieve the current score of a player."""
+    wins, losses, ties = await score_store.aget(player_id)
+    return Score(wins=wins, losses=losses, ties=ties)
 
-async def handle_play_round(player_move: str) -> PlayResponse:
+async def get_stats_service(player_id: str) -> StatsResponse:
+    """Service function to build statistics over all recorded rounds."""
+    aggregates = await game_history.aggregates()
+    current_streak, best_win_streak = await game_history.player_streak(player_id)
+    pair_counts = np.array(aggregates.pair_counts, dtype=np.int64)
+    by_move = game_engine.outcome_counts_by_move(pair_counts)
+
+    moves = []
+    for index, move in enumerate(game_engine.MOVES):
+        wins, losses, ties = (int(by_move[index, outcome]) for outcome in (game_engine.WIN, game_engine.LOSE, game_engine.TIE))
+        played = wins + losses + ties
+        moves.append(MoveStats(
+            move=move, played=played, wins=wins, losses=losses, ties=ties,
+            win_rate=round(wins / played, 4) if played else 0.0,
+        ))
+    totals = by_move.sum(axis=0)
+    return StatsResponse(
+        total_rounds=int(pair_counts.sum()),
+        wins=int(totals[game_engine.WIN]),
+        losses=int(totals[game_engine.LOSE]),
+        ties=int(totals[game_engine.TIE]),
+        moves=moves,
+        computer_move_frequency=dict(zip(game_engine.MOVES, (int(count) for count in pair_counts.sum(axis=0)))),
+        longest_win_streak=aggregates.longest_win_streak,
+        longest_loss_streak=aggregates.longest_loss_streak,
+        current_streak=current_streak,
+        best_win_streak=best_win_streak,
+    )
+
+async def play_round(player_move: str, player_id: str, opponent: Opponent = "random") -> Tuple[str, str, Tuple[int, int, int]]:
     """
-    Service function to handle all logic for a game round.
-    Returns a PlayResponse model containing all results.
+    Plays one round and records it: returns (computer_move, result, (wins, losses, ties)).
+    Shared by the HTTP and WebSocket game endpoints, so both update scores alike.
     """
-    # (This function's logic remains unchanged)
-    computer_move = pick_computer_move()
+    if opponent == "adaptive":
+        # Picked from the player's history only, before their move is seen.
+        computer_move = game_engine.MOVES[adaptive_opponent.pick(player_id)]
+    else:
+        computer_move = pick_computer_move()
+    # Rounds against either opponent are learned, so switching modes starts warm.
+    adaptive_opponent.observe(player_id, game_engine.MOVE_INDEX[player_move])
     result = determine_winner(player_move, computer_move)
 
-    current_score_data = _get_score_data()
-    current_score_model = Score(**current_score_data)
-    if result == 'You win.':
-        current_score_data['wins'] += 1
-    elif result == 'You lose.':
-        current_score_data['losses'] += 1
-    elif result == 'Tie.':
-        current_score_data['ties'] += 1
-    _update_score_data(current_score_data)
-
-    commentary: Optional[str] = None
+    # The store increments atomically and returns the new snapshot, so
+    # concurrent rounds for the same player can't overwrite each other's updates
+    # (with a network backend, the round trip runs off the event loop).
+    score = await score_store.aincrement(player_id, _RESULT_TO_SCORE_FIELD[result])
+    # Buffered in memory; written to disk in batches by a background task.
+    game_history.record(player_id, player_move, computer_move)
+    return computer_move, result, score
+
+def round_commentary(player_move: str, computer_move: str, result: str) -> str:
+    """Yoda's comment on a round, without waiting on Gemini."""
     if result == 'You lose.':
-        logging.info("Player lost. Fetching Yoda commentary...")
-        commentary = await _get_yoda_commentary(
-            player_move=player_move,
-            computer_move=computer_move,
-            score=current_score_model
-        )
+        # Served from the pre-generated pool; never waits on Gemini.
+        commentary = commentary_pool.take(player_move, computer_move)
         if commentary is None:
-            commentary = "Victorious, I am... comment, the Force blocks. Hmm."
+            commentary = COMMENTARY_FALLBACK
+        return commentary
     elif result == 'You win.':
-        commentary = f"Strong with {player_move}, you are. Defeated me, you have. Impressive."
+        return f"Strong with {player_move}, you are. Defeated me, you have. Impressive."
     else:
-        commentary = f"Both chose {player_move}. A tie, it is. Balanced, the Force remains."
+        return f"Both chose {player_move}. A tie, it is. Balanced, the Force remains."
 
+async def handle_play_round(player_move: str, player_id: str, opponent: Opponent = "random") -> PlayResponse:
+    """
+    Service function to handle all logic for a game round.
+    Returns a PlayResponse model containing all results.
+    """
+    computer_move, result, (wins, losses, ties) = await play_round(player_move, player_id, opponent)
     return PlayResponse(
-        wins=current_score_data['wins'],
-        losses=current_score_data['losses'],
-        ties=current_score_data['ties'],
+        wins=wins,
+        losses=losses,
+        ties=ties,
         player_move=player_move,
         computer_move=computer_move,
         result=result,
-        commentary=commentary
+        commentary=round_commentary(player_move, computer_move, result)
+    )
+
+def handle_play_batch(player_moves: List[str]) -> BatchPlayResponse:
+    """
+    Service function to resolve many rounds at once with the vectorized engine.
+    Batches are simulations: no score update and no commentary.
+    """
+    player_indices = game_engine.encode_moves(player_moves)
+    computer_indices = game_engine.pick_move_indices(len(player_moves))
+    outcomes = game_engine.resolve_batch(player_indices, computer_indices)
+    wins, losses, ties = game_engine.tally(outcomes)
+    moves, labels = game_engine.MOVES, game_engine.RESULT_LABELS
+    return BatchPlayResponse(
+        computer_moves=[moves[i] for i in computer_indices.tolist()],
+        results=[labels[o] for o in outcomes.tolist()],
+        wins=wins,
+        losses=losses,
+        ties=ties
     )
 
-# --- MODIFIED handle_chat function ---
+async def _get_joke_reply() -> str:
+    """Fetches a dad joke for the chat, or a Yoda-style failure message."""
+    try:
+        # Served from the prefetch buffer; only fetches inline when it is empty
+        fetched_joke = await joke_buffer.get()
+        logging.info("Dad joke served: '%s'", fetched_joke)
+        # Return the joke text directly
+        return fetched_joke
+    except DadJokeAPIError as e:
+        # Handle fetch failure
+        logging.warning("Failed to fetch dad joke for chat request: %s", e.detail)
+        # Return a specific failure message
+        return "Find a joke, I could not. Clouded, the source is. Hmm."
+    except Exception as e:
+        # Handle any other unexpected error during fetch
+        logging.error("Unexpected error fetching dad joke: %s", e, exc_info=True)
+        return "Disturbance in the Force, there is. Fetch the joke, I could not."
+
+async def _local_chat_reply(user_message: str) -> Optional[str]:
+    """
+    Answers the message without Gemini when the intent router allows it: a
+    dad joke or a canned reply. Returns None for messages Gemini must answer.
+    """
+    match = intent_router.classify(user_message)
+    record_chat_intent(match.intent)
+    if match.intent == CHAT:
+        return None
+    logging.info("Chat message routed to '%s' (%s, confidence %.2f).", match.intent, match.source, match.confidence)
+    if match.intent == JOKE:
+        return await _get_joke_reply()
+    return intent_router.reply(match.intent)
+
 async def handle_chat(user_message: str) -> str:
     """
     Service function to handle incoming chat messages.
-    If a joke is requested, fetches and returns the joke directly.
-    Otherwise, gets Yoda's response via Gemini.
+    Jokes and simple intents (greetings, thanks, rules...) are answered
+    locally; anything else gets Yoda's response via Gemini.
     Returns the response string.
     """
-    logging.info(f"Handling chat message in service: {user_message}")
-    user_message_lower = user_message.lower()
-    # Keywords to detect joke requests
-    joke_keywords = [" joke", " funny", " laugh", " humor", " tell me a"]
-    is_joke_request = any(keyword in user_message_lower for keyword in joke_keywords)
+    logging.info("Handling chat message in service: %s", user_message)
 
     # --- BRANCHING LOGIC ---
-    if is_joke_request:
-        # Handle joke request directly
-        logging.info("Joke request detected in handle_chat.")
-        try:
-            # Attempt to fetch the joke
-            fetched_joke = await _fetch_dad_joke_from_api()
-            logging.info(f"Dad joke fetched successfully: '{fetched_joke}'")
-            # Return the joke text directly
-            return fetched_joke
-        except DadJokeAPIError as e:
-            # Handle fetch failure
-            logging.warning(f"Failed to fetch dad joke for chat request: {e.detail}")
-            # Return a specific failure message
-            return "Find a joke, I could not. Clouded, the source is. Hmm."
-        except Exception as e:
-            # Handle any other unexpected error during fetch
-            logging.error(f"Unexpected error fetching dad joke: {e}")
-            return "Disturbance in the Force, there is. Fetch the joke, I could not."
+    local_reply = await _local_chat_reply(user_message)
+    if local_reply is not None:
+        # Joke or canned reply, answered without Gemini
+        return local_reply
     else:
         # Handle normal chat request via Gemini/Yoda
         logging.info("Normal chat message. Calling _get_yoda_chat_response.")
-        # Call the simplified chat response function (no joke_info needed)
-        yoda_response = await _get_yoda_chat_response(user_message=user_message)
+        # Identical messages are answered from the cache, and concurrent
+        # identical messages share a single Gemini call.
+        yoda_response = await chat_response_cache.get_or_compute(
+            user_message, lambda: _get_yoda_chat_response(user_message=user_message)
+        )
 
         # Provide a generic fallback if the Gemini chat call failed
         if yoda_response is None:
-            yoda_response = "Meditating, I am. Speak later, we can. Hmm."
+            yoda_response = CHAT_FALLBACK_RESPONSE
 
-        logging.info(f"Returning Yoda response from service: {yoda_response}")
+        logging.info("Returning Yoda response from service: %s", yoda_response)
         return yoda_response
+
+async def stream_chat(user_message: str) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of handle_chat. Local replies (jokes, canned
+    answers) and cached responses are sent as a single chunk; anything else
+    is forwarded from Gemini as it arrives, and the complete text is cached
+    only once Gemini's stream finishes cleanly (not after an error or a
+    client disconnect). Unlike handle_chat, concurrent identical messages
+    are not coalesced: each opens its own Gemini stream, since a follower
+    would otherwise wait for the whole answer before its first chunk.
+    """
+    logging.info("Handling streamed chat message in service: %s", user_message)
+    local_reply = await _local_chat_reply(user_message)
+    if local_reply is not None:
+        yield local_reply
+        return
+
+    cache_key = normalize_message(user_message)
+    cached = chat_response_cache.get(cache_key)
+    if cached is not None:
+        chat_response_cache.record_hit()
+        yield cached
+        return
+
+    chat_response_cache.record_miss()
+    parts: List[str] = []
+    outcome = StreamOutcome()
+    # If the client disconnects, the yield raises GeneratorExit and nothing is cached
+    async for chunk in _stream_yoda_chat_response(user_message, outcome):
+        parts.append(chunk)
+        yield chunk
+    full_response = "".join(parts).strip()
+    if outcome.complete and full_response: # A stream that broke off would replay a truncated answer
+        chat_response_cache.put(cache_key, full_response)
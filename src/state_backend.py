@@ -0,0 +1,602 @@
+# src/state_backend.py
+
+import asyncio
+import contextlib
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+try:
+    import fcntl # POSIX only; required by the shared-memory backend
+except ImportError: # pragma: no cover - Windows
+    fcntl = None
+
+# Adapter for fastapi-cache, which keeps its own state
+from fastapi_cache.types import Backend as CacheBackend
+
+# --- Exceptions ---
+class StateBackendError(Exception):
+    """Raised when a state backend cannot be initialized or used."""
+    def __init__(self, detail: str):
+        self.detail = detail
+        super().__init__(detail)
+
+
+# --- Backend Interface ---
+
+class StateBackend:
+    """
+    Key/value state shared by every consumer in the app (scores, rate limits
+    and the response cache). Implementations must make each method atomic
+    with respect to other callers of the same backend, including callers in
+    other worker processes when the backend is shared.
+
+    Counters created with `incr` keep the TTL given at creation (fixed
+    windows). Vectors updated with `incr_vector` refresh their TTL on every
+    update (idle expiry).
+
+    Methods are synchronous. Backends whose calls wait on the network set
+    `blocking`; async code goes through `run`, which moves their calls off
+    the event loop.
+    """
+
+    name = "base"
+    blocking = False
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Calls `func` (one of this backend's methods): inline, or in a worker thread if the backend blocks."""
+        if self.blocking:
+            return await asyncio.to_thread(func, *args, **kwargs)
+        return func(*args, **kwargs)
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def ttl(self, key: str) -> float:
+        """Remaining lifetime in seconds: 0.0 if missing, -1.0 if it never expires."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        raise NotImplementedError
+
+    def get_int(self, key: str) -> int:
+        raise NotImplementedError
+
+    def incr_vector(self, key: str, index: int, size: int, amount: int = 1, ttl: Optional[float] = None) -> Tuple[int, ...]:
+        raise NotImplementedError
+
+    def get_vector(self, key: str, size: int) -> Tuple[int, ...]:
+        raise NotImplementedError
+
+    def clear(self) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# --- Local (Single Process) Implementation ---
+
+class LocalStateBackend(StateBackend):
+    """
+    Process-local backend. Correct only with a single worker; used as the
+    default so development needs no shared files or servers.
+    """
+
+    name = "local"
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        # key -> [value, expires_at]; expires_at is 0.0 for no expiry
+        self._data: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float) -> Optional[list]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] and entry[1] <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, value, expires_at: float) -> list:
+        entry = [value, expires_at]
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+        return entry
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._live(key, time.time())
+            return entry[0] if entry is not None and isinstance(entry[0], bytes) else None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        with self._lock:
+            self._store(key, value, time.time() + ttl if ttl else 0.0)
+
+    def ttl(self, key: str) -> float:
+        now = time.time()
+        with self._lock:
+            entry = self._live(key, now)
+            if entry is None:
+                return 0.0
+            return entry[1] - now if entry[1] else -1.0
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.time()
+        with self._lock:
+            entry = self._live(key, now)
+            if entry is None or not isinstance(entry[0], int):
+                entry = self._store(key, 0, now + ttl if ttl else 0.0)
+            entry[0] += amount
+            return entry[0]
+
+    def get_int(self, key: str) -> int:
+        with self._lock:
+            entry = self._live(key, time.time())
+            return entry[0] if entry is not None and isinstance(entry[0], int) else 0
+
+    def incr_vector(self, key: str, index: int, size: int, amount: int = 1, ttl: Optional[float] = None) -> Tuple[int, ...]:
+        now = time.time()
+        with self._lock:
+            entry = self._live(key, now)
+            if entry is None or not isinstance(entry[0], list) or len(entry[0]) != size:
+                entry = self._store(key, [0] * size, 0.0)
+            entry[0][index] += amount
+            entry[1] = now + ttl if ttl else 0.0
+            return tuple(entry[0])
+
+    def get_vector(self, key: str, size: int) -> Tuple[int, ...]:
+        with self._lock:
+            entry = self._live(key, time.time())
+            if entry is None or not isinstance(entry[0], list) or len(entry[0]) != size:
+                return (0,) * size
+            return tuple(entry[0])
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._data)
+            self._data.clear()
+            return count
+
+
+# --- Shared-Memory (mmap) Implementation ---
+
+_FILE_MAGIC = b"RLSSTAT1"
+_FILE_HEADER = struct.Struct("<8sI") # magic, slot count
+_FILE_HEADER_SIZE = 64
+_SLOT_HEADER = struct.Struct("<16sdI") # key digest, expires_at, value length
+_SLOT_SIZE = 512
+_VALUE_CAPACITY = _SLOT_SIZE - _SLOT_HEADER.size
+_EMPTY_DIGEST = bytes(16)
+_INT64 = struct.Struct("<q")
+_MAX_PROBES = 32
+
+class SharedMemoryStateBackend(StateBackend):
+    """
+    Open-addressing hash table in a memory-mapped file, shared by every
+    worker process on the host that opens the same path.
+
+    Each slot holds a 16-byte key digest, an absolute expiry and up to
+    `_VALUE_CAPACITY` bytes of value; counters are stored as raw int64s.
+    Writers serialize on an flock of the file (plus a thread lock, since
+    flock does not exclude threads sharing a descriptor). flock also does
+    not exclude processes sharing a descriptor, so a backend opened before
+    a fork reopens the file in the child. When a probe sequence is full,
+    the entry closest to expiry is evicted, so TTL'd entries behave like a
+    bounded cache; live keys without a TTL are never evicted, so a write
+    whose probe sequence holds only those raises StateBackendError.
+    """
+
+    name = "shm"
+
+    def __init__(self, path: str, slots: int = 32_768):
+        if fcntl is None:
+            raise StateBackendError("The shared-memory state backend requires a POSIX platform (fcntl).")
+        if slots < _MAX_PROBES:
+            raise StateBackendError(f"The shared-memory state backend needs at least {_MAX_PROBES} slots.")
+        self.path = path
+        self.slots = slots
+        self._size = _FILE_HEADER_SIZE + slots * _SLOT_SIZE
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                self._initialize_file()
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(self._fd, self._size)
+        except StateBackendError:
+            os.close(self._fd)
+            raise
+        except OSError as e:
+            os.close(self._fd)
+            raise StateBackendError(f"Could not map shared state file {path}: {e}")
+        self._closed = False
+        _open_shared_backends.add(self)
+
+    def _reopen_after_fork(self):
+        """
+        In a forked child: the inherited descriptor shares its open file
+        description (and so its flock) with the parent and every sibling,
+        so open the file again to get a lock of our own.
+        """
+        inherited_fd, inherited_map = self._fd, self._map
+        self._thread_lock = threading.Lock() # May have been held by another thread at fork time
+        self._fd = os.open(self.path, os.O_RDWR)
+        self._map = mmap.mmap(self._fd, self._size)
+        inherited_map.close()
+        os.close(inherited_fd)
+
+    def _initialize_file(self):
+        """
+        Formats a new (empty) file; accepts one another worker formatted with
+        the same geometry. Any other file may still be mapped by running
+        processes at its own size, so it is never reformatted: that fails.
+        """
+        size = os.fstat(self._fd).st_size
+        header = os.pread(self._fd, _FILE_HEADER.size, 0) if size >= _FILE_HEADER.size else b""
+        if size == self._size and _FILE_HEADER.unpack(header) == (_FILE_MAGIC, self.slots):
+            return
+        # Empty, or sized by a formatter that died before writing the header (nobody mapped it then)
+        if size == 0 or (size == self._size and header == bytes(_FILE_HEADER.size)):
+            os.ftruncate(self._fd, self._size)
+            os.pwrite(self._fd, _FILE_HEADER.pack(_FILE_MAGIC, self.slots), 0)
+            logging.info(f"Formatted shared state file {self.path} ({self.slots} slots).")
+            return
+        if len(header) == _FILE_HEADER.size and header[:len(_FILE_MAGIC)] == _FILE_MAGIC:
+            found = f"{_FILE_HEADER.unpack(header)[1]} slots"
+        else:
+            found = "not a state file"
+        raise StateBackendError(
+            f"Shared state file {self.path} does not match the configured {self.slots} slots "
+            f"({size} bytes, {found}). Stop the workers using it and remove it, or point "
+            f"STATE_SHM_PATH at another file."
+        )
+
+    # --- Locking and slot helpers ---
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _digest(key: str) -> bytes:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        return digest if digest != _EMPTY_DIGEST else b"\x01" + digest[1:]
+
+    def _offset(self, index: int) -> int:
+        return _FILE_HEADER_SIZE + index * _SLOT_SIZE
+
+    def _read_header(self, index: int) -> Tuple[bytes, float, int]:
+        return _SLOT_HEADER.unpack_from(self._map, self._offset(index))
+
+    def _read_value(self, index: int, length: int) -> bytes:
+        start = self._offset(index) + _SLOT_HEADER.size
+        return self._map[start:start + length]
+
+    def _write(self, index: int, digest: bytes, expires_at: float, value: bytes):
+        offset = self._offset(index)
+        _SLOT_HEADER.pack_into(self._map, offset, digest, expires_at, len(value))
+        start = offset + _SLOT_HEADER.size
+        self._map[start:start + len(value)] = value
+
+    def _find(self, digest: bytes, now: float) -> Tuple[int, int]:
+        """
+        Probes for `digest`. Returns (live match index or -1, index to
+        write a new entry at, or -1 if every probed slot holds a live key
+        without a TTL). Expired entries keep their digest as tombstones so
+        later entries in the probe chain stay reachable.
+        """
+        home = int.from_bytes(digest[:8], "little") % self.slots
+        free = -1
+        victim, victim_expiry = -1, float("inf")
+        for probe in range(_MAX_PROBES):
+            index = (home + probe) % self.slots
+            slot_digest, expires_at, _ = self._read_header(index)
+            if slot_digest == _EMPTY_DIGEST:
+                return -1, free if free != -1 else index
+            expired = expires_at and expires_at <= now
+            if slot_digest == digest:
+                if not expired:
+                    return index, index
+                return -1, index
+            if expired and free == -1:
+                free = index
+            elif expires_at and expires_at < victim_expiry:
+                victim, victim_expiry = index, expires_at
+        return -1, free if free != -1 else victim
+
+    def _get_live(self, key: str, now: float) -> Tuple[bytes, int, int]:
+        digest = self._digest(key)
+        index, write_index = self._find(digest, now)
+        return digest, index, write_index
+
+    def _writable(self, key: str, now: float) -> Tuple[bytes, int, int]:
+        digest, index, write_index = self._get_live(key, now)
+        if write_index == -1:
+            raise StateBackendError(
+                f"No slot for '{key}': its probe sequence is full of keys without a TTL. Raise STATE_SHM_SLOTS."
+            )
+        return digest, index, write_index
+
+    # --- Public operations ---
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._locked():
+            _, index, _ = self._get_live(key, time.time())
+            if index == -1:
+                return None
+            _, _, length = self._read_header(index)
+            return self._read_value(index, length)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        if len(value) > _VALUE_CAPACITY:
+            raise StateBackendError(f"Value for '{key}' is {len(value)} bytes; the shared-memory backend holds at most {_VALUE_CAPACITY}.")
+        now = time.time()
+        with self._locked():
+            digest, _, write_index = self._writable(key, now)
+            self._write(write_index, digest, now + ttl if ttl else 0.0, value)
+
+    def ttl(self, key: str) -> float:
+        now = time.time()
+        with self._locked():
+            _, index, _ = self._get_live(key, now)
+            if index == -1:
+                return 0.0
+            _, expires_at, _ = self._read_header(index)
+            return expires_at - now if expires_at else -1.0
+
+    def delete(self, key: str) -> bool:
+        with self._locked():
+            digest, index, _ = self._get_live(key, time.time())
+            if index == -1:
+                return False
+            self._write(index, digest, 1.0, b"") # Expired tombstone
+            return True
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.time()
+        with self._locked():
+            digest, index, write_index = self._writable(key, now)
+            if index != -1:
+                _, expires_at, length = self._read_header(index)
+                current = _INT64.unpack(self._read_value(index, length))[0] if length == _INT64.size else 0
+            else:
+                expires_at, current = (now + ttl if ttl else 0.0), 0
+            current += amount
+            self._write(write_index, digest, expires_at, _INT64.pack(current))
+            return current
+
+    def get_int(self, key: str) -> int:
+        with self._locked():
+            _, index, _ = self._get_live(key, time.time())
+            if index == -1:
+                return 0
+            _, _, length = self._read_header(index)
+            return _INT64.unpack(self._read_value(index, length))[0] if length == _INT64.size else 0
+
+    def incr_vector(self, key: str, index: int, size: int, amount: int = 1, ttl: Optional[float] = None) -> Tuple[int, ...]:
+        layout = struct.Struct(f"<{size}q")
+        now = time.time()
+        with self._locked():
+            digest, slot, write_index = self._writable(key, now)
+            values = [0] * size
+            if slot != -1:
+                _, _, length = self._read_header(slot)
+                if length == layout.size:
+                    values = list(layout.unpack(self._read_value(slot, length)))
+            values[index] += amount
+            self._write(write_index, digest, now + ttl if ttl else 0.0, layout.pack(*values))
+            return tuple(values)
+
+    def get_vector(self, key: str, size: int) -> Tuple[int, ...]:
+        layout = struct.Struct(f"<{size}q")
+        with self._locked():
+            _, slot, _ = self._get_live(key, time.time())
+            if slot == -1:
+                return (0,) * size
+            _, _, length = self._read_header(slot)
+            if length != layout.size:
+                return (0,) * size
+            return layout.unpack(self._read_value(slot, length))
+
+    def clear(self) -> int:
+        with self._locked():
+            count = 0
+            for index in range(self.slots):
+                if self._read_header(index)[0] != _EMPTY_DIGEST:
+                    count += 1
+            self._map[_FILE_HEADER_SIZE:self._size] = bytes(self._size - _FILE_HEADER_SIZE)
+            return count
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        _open_shared_backends.discard(self)
+        self._map.close()
+        os.close(self._fd)
+
+
+_open_shared_backends: "weakref.WeakSet[SharedMemoryStateBackend]" = weakref.WeakSet()
+
+def _reopen_shared_backends_after_fork():
+    for backend in list(_open_shared_backends):
+        try:
+            backend._reopen_after_fork()
+        except OSError as e:
+            logging.error(f"Could not reopen shared state file {backend.path} after fork: {e}")
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reopen_shared_backends_after_fork)
+
+
+# --- Redis Implementation (Optional) ---
+
+class RedisStateBackend(StateBackend):
+    """
+    Backend speaking the Redis protocol via redis-py, for workers spread over
+    several hosts. Works against any Redis-compatible server, including a
+    local stand-in. redis-py is an optional dependency. Every call is a
+    network round trip, so it is `blocking`: async callers use `run`.
+    """
+
+    name = "redis"
+    blocking = True
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise StateBackendError("STATE_BACKEND=redis requires the 'redis' package (pip install redis).")
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self._client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def ttl(self, key: str) -> float:
+        remaining = self._client.pttl(key)
+        if remaining == -2:
+            return 0.0
+        return -1.0 if remaining == -1 else remaining / 1000
+
+    def delete(self, key: str) -> bool:
+        return bool(self._client.delete(key))
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        value = self._client.incrby(key, amount)
+        if ttl and value == amount: # Created by this call
+            self._client.pexpire(key, int(ttl * 1000))
+        return value
+
+    def get_int(self, key: str) -> int:
+        value = self._client.get(key)
+        return int(value) if value is not None else 0
+
+    def incr_vector(self, key: str, index: int, size: int, amount: int = 1, ttl: Optional[float] = None) -> Tuple[int, ...]:
+        pipe = self._client.pipeline(transaction=True)
+        pipe.hincrby(key, str(index), amount)
+        pipe.hmget(key, [str(i) for i in range(size)])
+        if ttl:
+            pipe.pexpire(key, int(ttl * 1000))
+        results = pipe.execute()
+        return tuple(int(v) if v is not None else 0 for v in results[1])
+
+    def get_vector(self, key: str, size: int) -> Tuple[int, ...]:
+        values = self._client.hmget(key, [str(i) for i in range(size)])
+        return tuple(int(v) if v is not None else 0 for v in values)
+
+    def clear(self) -> int:
+        count = self._client.dbsize()
+        self._client.flushdb()
+        return count
+
+    def close(self):
+        self._client.close()
+
+
+# --- Factory ---
+
+_state_backend: Optional[StateBackend] = None
+_state_backend_lock = threading.Lock()
+
+def get_state_backend_name() -> str:
+    """Returns the configured STATE_BACKEND ("local", "shm" or "redis")."""
+    return os.getenv("STATE_BACKEND", "local").lower()
+
+def create_state_backend(name: Optional[str] = None) -> StateBackend:
+    """
+    Builds a backend from the environment:
+      STATE_BACKEND   local (default), shm or redis
+      STATE_SHM_PATH  file mapped by the shm backend
+      STATE_SHM_SLOTS slot count of the shm backend
+      REDIS_URL       server used by the redis backend
+    """
+    name = name or get_state_backend_name()
+    if name == "shm":
+        path = os.getenv("STATE_SHM_PATH", os.path.join(tempfile.gettempdir(), "rocklizardspock-state.bin"))
+        try:
+            slots = int(os.getenv("STATE_SHM_SLOTS", "32768"))
+        except ValueError:
+            logging.warning("Invalid STATE_SHM_SLOTS environment variable. Using default 32768.")
+            slots = 32_768
+        return SharedMemoryStateBackend(path, slots=slots)
+    if name == "redis":
+        return RedisStateBackend(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    if name != "local":
+        logging.warning(f"Unknown STATE_BACKEND '{name}'. Falling back to 'local'.")
+    return LocalStateBackend()
+
+def get_state_backend() -> StateBackend:
+    """Returns the process-wide backend, creating it on first use."""
+    global _state_backend
+    if _state_backend is None:
+        with _state_backend_lock:
+            if _state_backend is None:
+                _state_backend = create_state_backend()
+                logging.info(f"Initialized {_state_backend.__class__.__name__} for shared state.")
+    return _state_backend
+
+
+# --- Library Adapters ---
+
+class StateCacheBackend(CacheBackend):
+    """fastapi-cache backend storing entries in the shared state backend."""
+
+    def __init__(self, backend: StateBackend, prefix: str = "cache:"):
+        self.backend = backend
+        self.prefix = prefix
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        value = await self.backend.run(self.backend.get, self.prefix + key)
+        if value is None:
+            return 0, None
+        return int(await self.backend.run(self.backend.ttl, self.prefix + key)), value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.backend.run(self.backend.get, self.prefix + key)
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        try:
+            await self.backend.run(self.backend.set, self.prefix + key, value, ttl=expire)
+        except StateBackendError as e:
+            logging.warning(f"Skipping cache write: {e.detail}")
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        if key:
+            return int(await self.backend.run(self.backend.delete, self.prefix + key))
+        # Keys are hashed in the shared backends, so namespaces cannot be enumerated.
+        return 0
@@ -0,0 +1,272 @@
+# src/structured_logging.py
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# --- Configuration ---
+# The correlation id of the request being handled, attached to every record
+# logged while serving it (including uvicorn's access log line).
+request_id_var: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("request_id", default=None)
+
+REQUEST_ID_HEADER = b"x-request-id"
+_REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._:-]{1,128}") # Accepted from clients as-is; anything else is replaced
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# LogRecord attributes; anything else on a record came from `extra=` and is emitted as a field
+# (except uvicorn's ANSI-colored copy of its message)
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id", "color_message",
+}
+
+# Arguments that can't change between the logging call and formatting on the listener thread
+_IMMUTABLE_TYPES = (str, int, float, bool, bytes, type(None))
+
+
+# --- Formatting ---
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, using the field names Cloud Logging maps to
+    its own (severity, message, time), plus the logger, process, request id,
+    any `extra=` fields and the formatted exception.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "severity": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "pid": record.process,
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """The runner's plain-text format, with the request id appended when there is one."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        request_id = getattr(record, "request_id", None)
+        return f"{line} [request_id={request_id}]" if request_id else line
+
+
+# --- Filtering ---
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one in every `every` INFO-and-below records per message template
+    (logger name and unformatted message), starting with the first, so
+    each distinct message still appears. Warnings and above always pass.
+    Templates only repeat for %-style calls; f-string messages are all distinct.
+    """
+
+    def __init__(self, every: int, max_templates: int = 10_000):
+        super().__init__()
+        self.every = max(every, 1)
+        self.max_templates = max_templates
+        self.sampled_out = 0
+        self._counts: Dict[Tuple[str, object], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg))
+        count = self._counts.get(key, 0)
+        if count == 0 and len(self._counts) >= self.max_templates:
+            self._counts.clear()
+        self._counts[key] = count + 1
+        if count % self.every:
+            self.sampled_out += 1
+            return False
+        return True
+
+
+# --- Handlers ---
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a QueueListener thread that formats and writes them,
+    so logging never blocks the event loop on I/O. Only what must be read in
+    the caller's context happens here: the request id, the traceback, and
+    formatting of messages whose arguments are mutable (and could change
+    before the listener gets to them). When the queue is full, records are
+    dropped and counted rather than waited for.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = request_id_var.get()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None # Tracebacks hold frames; don't keep them alive in the queue
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(arg, _IMMUTABLE_TYPES) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Pipeline:
+    __slots__ = ("pid", "handler", "output", "listener")
+
+    def __init__(self, handler: AsyncQueueHandler, output: logging.Handler):
+        self.pid = os.getpid()
+        self.handler = handler
+        self.output = output
+        self.listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=False)
+        self.listener.start()
+
+
+_pipeline: Optional[_Pipeline] = None
+_lock = threading.Lock()
+
+
+def _route_uvicorn_loggers():
+    # uvicorn installs its own stream handlers when it starts; send its records through ours instead
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+def _restart_after_fork():
+    """In a forked worker: the listener thread didn't survive, so start a new one on a fresh queue."""
+    global _pipeline
+    if _pipeline is None:
+        return
+    handler = _pipeline.handler
+    handler.queue = queue.Queue(maxsize=handler.queue.maxsize)
+    _pipeline = _Pipeline(handler, _pipeline.output)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def configure_logging() -> AsyncQueueHandler:
+    """
+    Installs the logging pipeline on the root logger, configured by
+    LOG_FORMAT (json or text), LOG_LEVEL, LOG_SAMPLE_RATE (share of repeated
+    INFO/DEBUG records kept, 1 = all) and LOG_QUEUE_SIZE. Calling it again
+    only re-routes uvicorn's loggers, which uvicorn resets on startup.
+    """
+    global _pipeline
+    with _lock:
+        if _pipeline is not None and _pipeline.pid == os.getpid():
+            _route_uvicorn_loggers()
+            return _pipeline.handler
+
+        log_format = os.getenv("LOG_FORMAT", "json").lower()
+        level = os.getenv("LOG_LEVEL", "INFO").upper()
+        try:
+            sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+            queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+        except ValueError:
+            logging.warning("Invalid LOG_SAMPLE_RATE/LOG_QUEUE_SIZE environment variables. Using defaults.")
+            sample_rate, queue_size = 1.0, 10000
+
+        output = logging.StreamHandler(sys.stderr)
+        output.setFormatter(TextFormatter(TEXT_FORMAT) if log_format == "text" else JsonFormatter())
+        handler = AsyncQueueHandler(queue.Queue(maxsize=max(queue_size, 1)))
+        if 0 < sample_rate < 1:
+            handler.addFilter(SamplingFilter(round(1 / sample_rate)))
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level if isinstance(logging.getLevelName(level), int) else logging.INFO)
+        _route_uvicorn_loggers()
+        logging.captureWarnings(True) # Library warnings become records too, instead of raw stderr text
+        _pipeline = _Pipeline(handler, output)
+        atexit.register(flush_logging)
+    logging.info(
+        "Configured %s logging (level %s, sample rate %s, queue size %s).",
+        log_format, logging.getLevelName(root.level), sample_rate, queue_size,
+    )
+    return handler
+
+
+def flush_logging(timeout: float = 2.0):
+    """Waits (up to `timeout`) until queued records are written, e.g. before exit or exec."""
+    pipeline = _pipeline
+    if pipeline is None or pipeline.pid != os.getpid():
+        return
+    deadline = time.monotonic() + timeout
+    while pipeline.handler.queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.005)
+    pipeline.output.flush()
+
+
+# --- ASGI Middleware ---
+
+class RequestIdMiddleware:
+    """
+    Pure ASGI middleware giving each HTTP request and WebSocket connection a
+    correlation id: the client's X-Request-ID if it is well-formed, else a
+    new random one. It is set in `request_id_var` for everything logged
+    while serving the request and returned in the X-Request-ID header.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID_PATTERN.fullmatch(candidate):
+                    request_id = candidate
+                break
+        if request_id is None:
+            request_id = os.urandom(8).hex()
+        header = (REQUEST_ID_HEADER, request_id.encode("latin-1"))
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), header]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_wrapper if scope["type"] == "http" else send)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,515 @@
+# src/supervisor.py
+
+import gc
+import logging
+import math
+import os
+import random
+import select
+import signal
+import socket
+import subprocess
+import sys
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import uvicorn
+from uvicorn.importer import import_from_string
+
+from .structured_logging import flush_logging
+
+# Set by a supervisor that re-executes itself on SIGHUP, for its new image
+LISTEN_FD_ENV = "SUPERVISOR_LISTEN_FD"
+WORKER_PIDS_ENV = "SUPERVISOR_WORKER_PIDS"
+
+# Worker -> supervisor messages on each worker's pipe
+_READY = b"R"
+_RECYCLE = b"M"
+
+
+# --- Sizing & Measurement ---
+
+def _cgroup_cpu_quota() -> Optional[float]:
+    """CPUs allowed by the container's CFS quota (cgroup v2, then v1), or None if unlimited."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+def available_cpus() -> int:
+    """CPUs this process may use: affinity mask, capped by a container CPU quota."""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError: # Not available on macOS
+        count = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    if quota:
+        count = min(count, math.ceil(quota))
+    return max(count, 1)
+
+def resolve_worker_count(value: str) -> int:
+    """Parses WORKERS: a positive number, or "auto" for one worker per available CPU."""
+    if value.strip().lower() == "auto":
+        return available_cpus()
+    return max(int(value), 1)
+
+def process_memory_mb(pid: int) -> Optional[float]:
+    """
+    Private (unshared) memory of a process in MB, i.e. what stopping it frees;
+    pages still shared copy-on-write with the supervisor are not counted.
+    Falls back to RSS where smaps_rollup is unavailable.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            private_kb = sum(
+                int(line.split()[1]) for line in f if line.startswith(("Private_Clean:", "Private_Dirty:"))
+            )
+        return private_kb / 1024
+    except OSError:
+        pass
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+# --- Worker Side ---
+
+class _WorkerServer(uvicorn.Server):
+    """uvicorn.Server that reports readiness and request-count recycling to the supervisor."""
+
+    def __init__(self, config: uvicorn.Config, notify_fd: int, max_requests: int):
+        super().__init__(config)
+        self.supervisor_pid = os.getppid()
+        self.notify_fd = notify_fd
+        self.max_requests = max_requests
+        self._recycle_requested = False
+
+    def _notify(self, message: bytes):
+        try:
+            os.write(self.notify_fd, message)
+        except OSError: # Supervisor re-executed or gone; nothing to tell
+            pass
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            self._notify(_READY)
+
+    async def on_tick(self, counter: int) -> bool:
+        if counter % 10 == 0 and os.getppid() != self.supervisor_pid:
+            logging.warning(f"Supervisor {self.supervisor_pid} is gone; worker {os.getpid()} is stopping.")
+            self.should_exit = True
+        # Keeps serving until the supervisor has a replacement ready and stops it.
+        if self.max_requests and not self._recycle_requested and self.server_state.total_requests >= self.max_requests:
+            self._recycle_requested = True
+            self._notify(_RECYCLE)
+        return await super().on_tick(counter)
+
+
+# --- Supervisor ---
+
+class _Worker:
+    __slots__ = ("pid", "ready_fd", "started_at", "ready", "retiring", "kill_at")
+
+    def __init__(self, pid: int, ready_fd: Optional[int], started_at: float, ready: bool = False):
+        self.pid = pid
+        self.ready_fd = ready_fd # Supervisor's end of the worker's pipe
+        self.started_at = started_at
+        self.ready = ready
+        self.retiring = False
+        self.kill_at = 0.0
+
+
+class Supervisor:
+    """
+    Pre-fork process manager for the app.
+
+    The app is imported once in the supervisor and workers are forked from
+    it, so they start in milliseconds and share the imported code and data
+    copy-on-write (gc.freeze() keeps the collector from un-sharing it). All
+    workers accept from one listening socket owned by the supervisor.
+
+    Workers are replaced one at a time, and only after the replacement is
+    serving: when a worker has served `max_requests` (plus jitter), when its
+    private memory exceeds `max_memory_mb`, and on SIGHUP. For SIGHUP the
+    supervisor first checks that the new code imports, then re-executes
+    itself (keeping its PID, socket and workers) to load it and rolls every
+    worker. SIGTTIN/SIGTTOU add/remove a worker; SIGTERM/SIGINT stop
+    gracefully within `graceful_timeout`.
+    """
+
+    def __init__(
+        self,
+        app_path: str,
+        host: str,
+        port: int,
+        workers: int,
+        max_requests: int = 0,
+        max_requests_jitter: int = 0,
+        max_memory_mb: float = 0.0,
+        memory_check_seconds: float = 10.0,
+        graceful_timeout: float = 30.0,
+        preload_modules: Tuple[str, ...] = (),
+        uvicorn_options: Optional[dict] = None,
+    ):
+        self.app_path = app_path
+        self.host = host
+        self.port = port
+        self.workers = max(workers, 1)
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.max_memory_mb = max_memory_mb
+        self.memory_check_seconds = memory_check_seconds
+        self.graceful_timeout = graceful_timeout
+        self.preload_modules = preload_modules
+        self.uvicorn_options = uvicorn_options or {}
+        self.app = None
+        self.socket: Optional[socket.socket] = None
+        self._workers: Dict[int, _Worker] = {}
+        self._replace_queue: Deque[int] = deque()
+        self._replacement: Optional[Tuple[int, int]] = None # (old pid, new pid)
+        self._signals: List[int] = []
+        self._wakeup_r = self._wakeup_w = -1
+        self._stopping = False
+        self._failures = 0
+        self._respawn_at = 0.0
+        self._memory_checked_at = 0.0
+
+    # --- Setup ---
+
+    def _listen(self):
+        inherited_fd = os.environ.pop(LISTEN_FD_ENV, None)
+        if inherited_fd is not None:
+            self.socket = socket.socket(fileno=int(inherited_fd))
+            os.set_inheritable(self.socket.fileno(), False)
+            logging.info(f"Supervisor reusing listening socket on {self.host}:{self.port}.")
+            return
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(False)
+        self.socket = sock
+        logging.info(f"Supervisor listening on {self.host}:{self.port}.")
+
+    def _preload(self):
+        start = time.perf_counter()
+        for module in self.preload_modules:
+            try:
+                __import__(module)
+            except Exception as e: # Optional warm-up; workers import it on demand otherwise
+                logging.warning(f"Could not preload {module}: {e}")
+        self.app = import_from_string(self.app_path)
+        # Everything imported so far is shared with the workers; keep the
+        # collector from touching (and so copying) those pages in each one.
+        gc.collect()
+        gc.freeze()
+        logging.info(f"Preloaded {self.app_path} in {time.perf_counter() - start:.2f}s.")
+
+    def _adopt_workers(self, now: float):
+        """After a re-exec, takes over the previous image's workers and queues them for replacement."""
+        for pid in filter(None, os.environ.pop(WORKER_PIDS_ENV, "").split(",")):
+            self._workers[int(pid)] = _Worker(int(pid), None, now, ready=True)
+            self._replace_queue.append(int(pid))
+        if self._replace_queue:
+            logging.info(f"Rolling {len(self._replace_queue)} workers onto the reloaded code.")
+
+    def _install_signals(self):
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        signal.set_wakeup_fd(self._wakeup_w)
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, self._on_signal)
+
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+
+    # --- Workers ---
+
+    def _spawn(self, now: float) -> _Worker:
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            self._run_worker(write_fd)
+        os.close(write_fd)
+        os.set_blocking(read_fd, False)
+        worker = self._workers[pid] = _Worker(pid, read_fd, now)
+        logging.info(f"Spawned worker {pid}.")
+        return worker
+
+    def _run_worker(self, notify_fd: int):
+        """Body of a forked worker; never returns."""
+        exit_code = 0
+        try:
+            signal.set_wakeup_fd(-1)
+            for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD, signal.SIGTTIN, signal.SIGTTOU):
+                signal.signal(sig, signal.SIG_DFL)
+            for fd in [self._wakeup_r, self._wakeup_w] + [w.ready_fd for w in self._workers.values() if w.ready_fd is not None]:
+                os.close(fd)
+            gc.unfreeze() # Objects created from here on are this worker's own
+            max_requests = self.max_requests
+            if max_requests and self.max_requests_jitter:
+                # Spread recycling so workers started together don't all restart together
+                max_requests += random.randint(0, self.max_requests_jitter)
+            config = uvicorn.Config(self.app, **self.uvicorn_options)
+            _WorkerServer(config, notify_fd, max_requests).run(sockets=[self.socket])
+        except BaseException as e:
+            logging.exception(f"Worker {os.getpid()} failed: {e!r}")
+            exit_code = 1
+        finally:
+            flush_logging()
+            os._exit(exit_code)
+
+    def _read_notifications(self, readable: List[int]):
+        for worker in list(self._workers.values()):
+            if worker.ready_fd is None or worker.ready_fd not in readable:
+                continue
+            try:
+                data = os.read(worker.ready_fd, 64)
+            except BlockingIOError:
+                continue
+            if not data: # Worker exited; reaped separately
+                os.close(worker.ready_fd)
+                worker.ready_fd = None
+                continue
+            if _READY in data and not worker.ready:
+                worker.ready = True
+                self._failures = 0
+                logging.info(f"Worker {worker.pid} is ready.")
+            if _RECYCLE in data and not worker.retiring:
+                logging.info(f"Worker {worker.pid} reached its request limit; replacing it.")
+                self._replace_queue.append(worker.pid)
+
+    def _reap(self, now: float):
+        from .metrics import mark_worker_exit # Imported late: it reads PROMETHEUS_MULTIPROC_DIR at import
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self._workers.pop(pid, None)
+            if worker is None:
+                continue
+            if worker.ready_fd is not None:
+                os.close(worker.ready_fd)
+            mark_worker_exit(pid)
+            exit_code = os.waitstatus_to_exitcode(status)
+            if worker.retiring or self._stopping:
+                logging.info(f"Worker {pid} stopped (exit code {exit_code}).")
+                continue
+            logging.warning(f"Worker {pid} exited unexpectedly (exit code {exit_code}).")
+            if not worker.ready:
+                # Crashing during startup: back off instead of fork-looping
+                self._failures += 1
+                self._respawn_at = now + min(2 ** self._failures, 30)
+
+    def _terminate(self, worker: _Worker, now: float):
+        """Asks a worker to finish its in-flight requests and exit."""
+        worker.retiring = True
+        worker.kill_at = now + self.graceful_timeout
+        try:
+            os.kill(worker.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _advance_replacements(self, now: float):
+        if self._replacement is not None:
+            old_pid, new_pid = self._replacement
+            old, new = self._workers.get(old_pid), self._workers.get(new_pid)
+            if new is None:
+                logging.warning(f"Replacement for worker {old_pid} failed to start; keeping it.")
+                self._replacement = None
+            elif old is None or old.retiring:
+                self._replacement = None
+            elif new.ready:
+                self._terminate(old, now)
+                self._replacement = None
+            else:
+                return
+        while self._replacement is None and self._replace_queue and now >= self._respawn_at:
+            old = self._workers.get(self._replace_queue.popleft())
+            if old is None or old.retiring:
+                continue
+            self._replacement = (old.pid, self._spawn(now).pid)
+
+    def _maintain_count(self, now: float):
+        active = [worker for worker in self._workers.values() if not worker.retiring]
+        wanted = self.workers + (1 if self._replacement is not None else 0)
+        if len(active) < wanted and now >= self._respawn_at:
+            for _ in range(wanted - len(active)):
+                self._spawn(now)
+        elif len(active) > wanted and self._replacement is None:
+            # Scale down, newest (least warmed-up) first
+            for worker in sorted(active, key=lambda w: w.started_at, reverse=True)[:len(active) - wanted]:
+                self._terminate(worker, now)
+
+    def _check_memory(self, now: float):
+        if not self.max_memory_mb or now - self._memory_checked_at < self.memory_check_seconds:
+            return
+        self._memory_checked_at = now
+        for worker in self._workers.values():
+            if not worker.ready or worker.retiring or worker.pid in self._replace_queue:
+                continue
+            if self._replacement is not None and worker.pid == self._replacement[0]:
+                continue
+            memory_mb = process_memory_mb(worker.pid)
+            if memory_mb is not None and memory_mb > self.max_memory_mb:
+                logging.info(f"Worker {worker.pid} uses {memory_mb:.0f} MB (limit {self.max_memory_mb:.0f} MB); replacing it.")
+                self._replace_queue.append(worker.pid)
+
+    def _kill_stragglers(self, now: float):
+        for worker in self._workers.values():
+            if worker.retiring and worker.kill_at and now >= worker.kill_at:
+                logging.warning(f"Worker {worker.pid} did not stop within {self.graceful_timeout}s; killing it.")
+                worker.kill_at = 0.0
+                try:
+                    os.kill(worker.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    # --- Reload & Shutdown ---
+
+    def _reload(self):
+        """Re-executes the supervisor with the current code, keeping the socket and workers."""
+        module = self.app_path.split(":")[0]
+        logging.info(f"Reload requested; checking that {module} imports...")
+        env = dict(os.environ)
+        env.pop("PROMETHEUS_MULTIPROC_DIR", None) # The check must not leave metric files behind
+        try:
+            check = subprocess.run(
+                [sys.executable, "-c", f"import {module}"], env=env, capture_output=True, timeout=300
+            )
+        except subprocess.TimeoutExpired:
+            logging.error(f"Reload aborted: importing {module} timed out.")
+            return
+        if check.returncode != 0:
+            logging.error(f"Reload aborted: {module} failed to import:\n{check.stderr.decode(errors='replace')[-2000:]}")
+            return
+
+        os.set_inheritable(self.socket.fileno(), True)
+        os.environ[LISTEN_FD_ENV] = str(self.socket.fileno())
+        os.environ[WORKER_PIDS_ENV] = ",".join(str(pid) for pid, worker in self._workers.items() if not worker.retiring)
+        logging.info("Re-executing the supervisor with the new code.")
+        flush_logging()
+        for handler in logging.getLogger().handlers:
+            handler.flush()
+        # Ignored (unlike handled) signals stay ignored across exec, so a second
+        # SIGHUP before the new image installs its handlers can't kill it.
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        os.execv(sys.executable, sys.orig_argv)
+
+    def _shutdown(self):
+        logging.info(f"Stopping {len(self._workers)} workers...")
+        now = time.monotonic()
+        for worker in self._workers.values():
+            if not worker.retiring:
+                self._terminate(worker, now)
+        deadline = now + self.graceful_timeout
+        while self._workers and time.monotonic() < deadline:
+            self._reap(time.monotonic())
+            time.sleep(0.1)
+        for worker in list(self._workers.values()):
+            logging.warning(f"Killing worker {worker.pid}.")
+            try:
+                os.kill(worker.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        while self._workers:
+            self._reap(time.monotonic())
+            time.sleep(0.05)
+        self.socket.close()
+        logging.info("Supervisor stopped.")
+
+    def _handle_signals(self):
+        signals, self._signals = self._signals, []
+        for signum in signals:
+            if signum in (signal.SIGTERM, signal.SIGINT):
+                self._stopping = True
+            elif signum == signal.SIGHUP:
+                self._reload() # Returns only if the new code failed its import check
+            elif signum == signal.SIGTTIN:
+                self.workers += 1
+                logging.info(f"Scaling up to {self.workers} workers.")
+            elif signum == signal.SIGTTOU and self.workers > 1:
+                self.workers -= 1
+                logging.info(f"Scaling down to {self.workers} workers.")
+
+    def run(self):
+        """Preloads the app and supervises workers until SIGTERM/SIGINT."""
+        self._install_signals()
+        self._listen()
+        self._preload()
+        self._adopt_workers(time.monotonic())
+        logging.info(
+            f"Supervisor {os.getpid()} managing {self.workers} workers "
+            f"(max requests {self.max_requests or 'off'}, max memory {self.max_memory_mb or 'off'} MB)."
+        )
+        while not self._stopping:
+            fds = [self._wakeup_r] + [w.ready_fd for w in self._workers.values() if w.ready_fd is not None]
+            readable, _, _ = select.select(fds, [], [], 1.0)
+            if self._wakeup_r in readable:
+                try:
+                    os.read(self._wakeup_r, 4096)
+                except BlockingIOError:
+                    pass
+            self._read_notifications(readable)
+            self._handle_signals()
+            if self._stopping:
+                break
+            now = time.monotonic()
+            self._reap(now)
+            self._advance_replacements(now)
+            self._maintain_count(now)
+            self._check_memory(now)
+            self._kill_stragglers(now)
+        self._shutdown()
+
+
+def create_supervisor(app_path: str, host: str, port: int, workers: int) -> Supervisor:
+    """
+    Builds the supervisor configured by MAX_REQUESTS, MAX_REQUESTS_JITTER,
+    WORKER_MAX_MEMORY_MB, GRACEFUL_TIMEOUT and PRELOAD_MODULES (comma-separated
+    modules imported before the app; the Gemini SDK by default).
+    """
+    try:
+        max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+        max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", str(max_requests // 10)))
+        max_memory_mb = float(os.getenv("WORKER_MAX_MEMORY_MB", "0"))
+        graceful_timeout = float(os.getenv("GRACEFUL_TIMEOUT", "30"))
+    except ValueError:
+        logging.warning("Invalid MAX_REQUESTS/MAX_REQUESTS_JITTER/WORKER_MAX_MEMORY_MB/GRACEFUL_TIMEOUT environment variables. Using defaults.")
+        max_requests, max_requests_jitter, max_memory_mb, graceful_timeout = 0, 0, 0.0, 30.0
+    preload_modules = tuple(
+        module.strip() for module in os.getenv("PRELOAD_MODULES", "google.generativeai").split(",") if module.strip()
+    )
+    return Supervisor(
+        app_path,
+        host,
+        port,
+        workers,
+        max_requests=max_requests,
+        max_requests_jitter=max_requests_jitter,
+        max_memory_mb=max_memory_mb,
+        graceful_timeout=graceful_timeout,
+        preload_modules=preload_modules,
+        # log_config=None: uvicorn's records go to the root logger's pipeline (see structured_logging.py)
+        uvicorn_options={"timeout_graceful_shutdown": graceful_timeout, "log_config": None},
+    )
@@ -1,24 +1,25 @@
 # src/utils.py
 
+import asyncio
 import os
 import logging
+import time
+from typing import Any, Optional
 import httpx
-import google.generativeai as genai
+# google.generativeai is imported lazily by ClientRegistry: it is by far the
+# slowest import in the app and only the AI features need it.
 # Removed: from dotenv import load_dotenv (No longer needed)
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 
 # --- Configuration Loading ---
 
 # Removed: load_dotenv() call (No longer needed for deployment)
 
-# Fetch the Google API key directly from environment variables set by the platform
+# Fetch the Google API key directly from environment variables set by the platform.
+# A missing key no longer stops the app: the game keeps working and Yoda's
+# AI features answer with their fallback replies.
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
-    logging.error("FATAL ERROR: GOOGLE_API_KEY environment variable not set in deployment environment.")
-    # For a real application, you might want a more graceful shutdown
-    # or a mechanism to prevent starting without the key.
-    raise ValueError("GOOGLE_API_KEY is missing. Please ensure it is set in your deployment environment variables.")
+    logging.warning("GOOGLE_API_KEY environment variable not set. Gemini features will be unavailable.")
 
 # Define the Gemini model name to use
 # Using gemini-2.0-flash-lite-001 based on user preference [2025-03-17]
@@ -26,37 +27,145 @@ GEMINI_MODEL_NAME = "gemini-2.0-flash-lite-001"
 
 # --- Client Initialization ---
 
-# Initialize the shared httpx client for making async HTTP requests
-# Used by services.py for fetching dad jokes
-# Set a default timeout (can be overridden per request if needed)
-http_client = httpx.AsyncClient(timeout=10.0)
-logging.info("Initialized shared httpx.AsyncClient.")
-
-# Configure and initialize the Google Generative AI model client
-# Used by services.py for Yoda commentary and chat
-try:
-    genai.configure(api_key=GOOGLE_API_KEY)
-    # Consider adding safety settings globally here if desired,
-    # matching or complementing any settings applied during calls
-    # safety_settings = [...]
-    gemini_model = genai.GenerativeModel(
-        GEMINI_MODEL_NAME#,
-        # safety_settings=safety_settings
-        )
-    logging.info(f"Initialized Google Generative AI client with model: {GEMINI_MODEL_NAME}")
-except Exception as e:
-    logging.error(f"FATAL ERROR: Failed to initialize Google Generative AI client: {e}")
-    # Again, handle fatal errors appropriately for your deployment strategy
-    raise
-
-# --- Rate Limiter Initialization ---
-
-# Initialize the rate limiter instance
-# It uses the client's remote address (IP address) as the default key
-# The state and exception handler are configured in routes.py
-limiter = Limiter(key_func=get_remote_address)
-logging.info("Initialized slowapi Limiter.")
+class ClientUnavailableError(Exception):
+    """Raised when an outbound client cannot be created (e.g. missing API key)."""
+    def __init__(self, detail: str):
+        self.detail = detail
+        super().__init__(detail)
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Builds the shared httpx client (used for fetching dad jokes) with a pool
+    sized by HTTP_MAX_CONNECTIONS / HTTP_MAX_KEEPALIVE and idle connections
+    kept alive for HTTP_KEEPALIVE_EXPIRY seconds.
+    """
+    try:
+        max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+        max_keepalive = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+        keepalive_expiry = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    except ValueError:
+        logging.warning("Invalid HTTP_MAX_CONNECTIONS/HTTP_MAX_KEEPALIVE/HTTP_KEEPALIVE_EXPIRY environment variables. Using defaults.")
+        max_connections, max_keepalive, keepalive_expiry = 100, 20, 30.0
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=keepalive_expiry,
+    )
+    # Fail fast on connect; the overall 10s budget matches the previous client.
+    timeout = httpx.Timeout(10.0, connect=3.0)
+    client = httpx.AsyncClient(timeout=timeout, limits=limits)
+    logging.info(f"Initialized shared httpx.AsyncClient (max_connections={max_connections}, keepalive={max_keepalive}).")
+    return client
+
+class ClientRegistry:
+    """
+    Creates the outbound clients on first use instead of at import time.
+
+    The Gemini model is loaded in a worker thread, started by warm_up() from
+    the app's startup hook, so the game routes are served while the SDK is
+    still importing. Callers that need the model await gemini_model(), which
+    joins the in-progress load. A failed load is retried on a later call,
+    after `retry_seconds` doubling up to `max_retry_seconds`; until then
+    callers get the failure without waiting. Only a missing API key, which
+    can't change while the process runs, is never retried.
+    """
+
+    def __init__(self, retry_seconds: float = 1.0, max_retry_seconds: float = 60.0):
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._gemini_model: Any = None
+        self._gemini_task: Optional[asyncio.Task] = None
+        self._gemini_error: Optional[ClientUnavailableError] = None
+        self._gemini_failures = 0
+        self._gemini_retry_at = 0.0
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = create_http_client()
+        return self._http_client
+
+    @property
+    def gemini_ready(self) -> bool:
+        return self._gemini_model is not None
+
+    @property
+    def gemini_unavailable(self) -> bool:
+        """True when Gemini can never load in this process: no model installed and no API key."""
+        return self._gemini_model is None and not GOOGLE_API_KEY
+
+    def set_gemini_model(self, model: Any):
+        """Installs a ready model (or a stand-in for benchmarks and local runs)."""
+        self._gemini_model = model
+        self._gemini_error = None
+        self._gemini_failures = 0
+
+    def _load_gemini_model(self) -> Any:
+        """Blocking SDK import and configuration; runs in a worker thread."""
+        if not GOOGLE_API_KEY:
+            raise ClientUnavailableError("GOOGLE_API_KEY is not set.")
+        import google.generativeai as genai
+        genai.configure(api_key=GOOGLE_API_KEY)
+        # Consider adding safety settings globally here if desired,
+        # matching or complementing any settings applied during calls
+        # safety_settings = [...]
+        return genai.GenerativeModel(
+            GEMINI_MODEL_NAME#,
+            # safety_settings=safety_settings
+            )
+
+    async def _initialize_gemini(self):
+        try:
+            model = await asyncio.to_thread(self._load_gemini_model)
+        except ClientUnavailableError as e:
+            self._gemini_error = e
+            self._gemini_retry_at = float("inf") # Configuration, not a transient failure
+            raise
+        except Exception as e:
+            self._gemini_failures += 1
+            delay = min(self.retry_seconds * 2 ** (self._gemini_failures - 1), self.max_retry_seconds)
+            logging.error(f"Failed to initialize Google Generative AI client: {e}. Retrying in {delay:.0f}s.")
+            self._gemini_error = ClientUnavailableError(f"Gemini client failed to initialize: {e}")
+            self._gemini_retry_at = time.monotonic() + delay
+            raise self._gemini_error
+        self._gemini_error = None
+        self._gemini_failures = 0
+        if self._gemini_model is None:
+            self._gemini_model = model
+            logging.info(f"Initialized Google Generative AI client with model: {GEMINI_MODEL_NAME}")
+
+    def _gemini_backing_off(self) -> bool:
+        return self._gemini_error is not None and time.monotonic() < self._gemini_retry_at
+
+    def warm_up(self) -> Optional[asyncio.Task]:
+        """Starts loading the Gemini model in the background (idempotent; waits out the retry backoff)."""
+        if self._gemini_model is not None or self._gemini_backing_off():
+            return None
+        if self._gemini_task is None or self._gemini_task.done():
+            self._gemini_task = asyncio.get_running_loop().create_task(self._initialize_gemini())
+            # Failures are recorded in _gemini_error; don't warn about an unretrieved exception.
+            self._gemini_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self._gemini_task
+
+    async def gemini_model(self) -> Any:
+        """Returns the Gemini model, waiting for it to load if necessary."""
+        if self._gemini_model is not None:
+            return self._gemini_model
+        if self._gemini_backing_off():
+            raise self._gemini_error
+        # Shielded so a cancelled request does not abort the shared load.
+        await asyncio.shield(self.warm_up())
+        return self._gemini_model
+
+    async def aclose(self):
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            logging.info("HTTPX client closed.")
+
+# Shared by services.py (for fetching jokes and Gemini calls) and routes.py (lifespan hooks)
+clients = ClientRegistry()
 
 # --- Other Utilities (Optional) ---
 # Add any other shared utility functions or constants below if needed
-# E.g., def format_timestamp(dt): ...
\ No newline at end of file
+# E.g., def format_timestamp(dt): ...
@@ -36,6 +36,10 @@ document.addEventListener('DOMContentLoaded', () => {
     // API Base URL (using the prefix we defined in routes.py)
     const API_BASE_URL = '/api/v1';
 
+    // Optimized image URLs rendered into the page by the server (image_pipeline.py)
+    const imageManifestEl = document.getElementById('image-manifest');
+    const IMAGE_MANIFEST = imageManifestEl ? JSON.parse(imageManifestEl.textContent) : {};
+
     // --- Helper Functions ---
 
     /** Capitalizes the first letter of a string */
@@ -44,6 +48,13 @@ document.addEventListener('DOMContentLoaded', () => {
         return string.charAt(0).toUpperCase() + string.slice(1);
     }
 
+    /** Returns the best available URL for a move image, falling back to the original */
+    function moveImageUrl(move) {
+        const name = capitalizeFirstLetter(move);
+        const image = IMAGE_MANIFEST[name];
+        return image ? image.preferred : `/images/${name}.jpg`;
+    }
+
     /** Scrolls chat history to the bottom */
     function scrollChatToBottom() {
         chatHistoryEl.scrollTop = chatHistoryEl.scrollHeight;
@@ -114,14 +125,11 @@ document.addEventListener('DOMContentLoaded', () => {
     function displayResults(playerMove, computerMove, result, commentary) {
         clearResultsDisplay(); // Clear previous results first
 
-        const playerImgFile = capitalizeFirstLetter(playerMove) + '.jpg';
-        const computerImgFile = capitalizeFirstLetter(computerMove) + '.jpg';
-
-        playerChoiceImgEl.src = `/images/${playerImgFile}`;
+        playerChoiceImgEl.src = moveImageUrl(playerMove);
         playerChoiceImgEl.alt = `Player chose ${playerMove}`;
         playerChoiceImgEl.style.display = 'block';
 
-        computerChoiceImgEl.src = `/images/${computerImgFile}`;
+        computerChoiceImgEl.src = moveImageUrl(computerMove);
         computerChoiceImgEl.alt = `Yoda chose ${computerMove}`;
         computerChoiceImgEl.style.display = 'block';
 
@@ -138,12 +146,68 @@ document.addEventListener('DOMContentLoaded', () => {
         commentaryTextEl.textContent = commentary || ''; // Display commentary or empty string
     }
 
+    // --- Game Channel (WebSocket) ---
+    // While the socket is open, rounds are played over it (protocol in
+    // src/game_channel.py) and Yoda's commentary arrives after the result.
+    // Otherwise each round is a POST to /play/{move}.
+    const RESULT_LABELS = ['Tie.', 'You win.', 'You lose.'];
+    let gameSocket = null;
+    let roundNumber = 0;
+    const pendingRounds = new Map(); // Round number -> player move
+
+    /** Opens the game WebSocket; rounds fall back to HTTP until it is open */
+    function connectGameSocket() {
+        if (!('WebSocket' in window) || gameSocket) return;
+        const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        const socket = new WebSocket(`${scheme}://${window.location.host}${API_BASE_URL}/play/ws`);
+        socket.addEventListener('message', (event) => handleGameMessage(JSON.parse(event.data)));
+        socket.addEventListener('close', () => {
+            if (gameSocket === socket) gameSocket = null;
+            if (pendingRounds.size) {
+                pendingRounds.clear();
+                hideLoading(gameLoadingEl);
+                displayError(gameErrorEl, 'Connection to the game server lost. Try again, you must.');
+            }
+        });
+        gameSocket = socket;
+    }
+
+    /** Handles a message from the game WebSocket */
+    function handleGameMessage(message) {
+        const isLatest = message.n === roundNumber;
+        if (message.t === 'r') {
+            const playerMove = pendingRounds.get(message.n);
+            pendingRounds.delete(message.n);
+            updateScoreboard(message.s[0], message.s[1], message.s[2]);
+            if (isLatest && playerMove) {
+                hideLoading(gameLoadingEl);
+                displayResults(playerMove, message.c, RESULT_LABELS[message.r], '');
+            }
+        } else if (message.t === 'c' && isLatest) {
+            commentaryTextEl.textContent = message.text;
+        } else if (message.t === 'e') {
+            pendingRounds.delete(message.n);
+            if (isLatest) {
+                hideLoading(gameLoadingEl);
+                displayError(gameErrorEl, message.error);
+            }
+        }
+    }
+
     /** Handles the API call when a player makes a move */
     async function playGame(move) {
         console.log(`Player chose: ${move}`);
         showLoading(gameLoadingEl, gameErrorEl);
         clearResultsDisplay(); // Clear previous results while loading
 
+        if (gameSocket && gameSocket.readyState === WebSocket.OPEN) {
+            roundNumber += 1;
+            pendingRounds.set(roundNumber, move);
+            gameSocket.send(JSON.stringify({ move: move, n: roundNumber }));
+            return;
+        }
+        connectGameSocket(); // Reconnect for later rounds; this one goes over HTTP
+
         try {
             const response = await fetch(`${API_BASE_URL}/play/${move}`, {
                 method: 'POST',
@@ -204,23 +268,39 @@ document.addEventListener('DOMContentLoaded', () => {
         scrollChatToBottom(); // Scroll down to show the new message
     }
 
-    /** Handles the API call to send a chat message */
+    /** Parses one Server-Sent Event block into { event, data } */
+    function parseSseEvent(block) {
+        let event = 'message';
+        const dataLines = [];
+        for (const line of block.split('\n')) {
+            if (line.startsWith('event:')) {
+                event = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                dataLines.push(line.slice(5).trimStart());
+            }
+        }
+        return { event, data: dataLines.join('\n') };
+    }
+
+    /** Handles the API call to send a chat message, rendering Yoda's reply as it streams in */
     async function sendChatMessage(message) {
         showLoading(chatLoadingEl, chatErrorEl);
         chatInputEl.disabled = true;
         chatSendButtonEl.disabled = true;
 
+        let yodaMessageEl = null; // Created when the first chunk arrives
+
         try {
-            const response = await fetch(`${API_BASE_URL}/chat`, {
+            const response = await fetch(`${API_BASE_URL}/chat/stream`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
-                    'Accept': 'application/json' // Indicate we expect JSON back
+                    'Accept': 'text/event-stream'
                 },
                 body: JSON.stringify({ user_message: message })
             });
 
-             if (!response.ok) {
+             if (!response.ok || !response.body) {
                 let errorMsg = `API Error: ${response.status}`;
                 try {
                     const errorData = await response.json();
@@ -229,8 +309,39 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(errorMsg);
             }
 
-            const data = await response.json(); // Should be ChatResponse model
-            addChatMessage(data.yoda_response, 'yoda');
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let done = false;
+
+            while (!done) {
+                const { value, done: streamDone } = await reader.read();
+                if (streamDone) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                // Events are separated by a blank line
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const { event, data } = parseSseEvent(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+                    if (event === 'done') {
+                        done = true;
+                        break;
+                    }
+                    const delta = JSON.parse(data).delta || '';
+                    if (!yodaMessageEl) {
+                        hideLoading(chatLoadingEl); // First token: stop "reflecting"
+                        addChatMessage('', 'yoda');
+                        yodaMessageEl = chatHistoryEl.lastElementChild;
+                    }
+                    yodaMessageEl.textContent += delta;
+                    scrollChatToBottom();
+                }
+            }
+
+            if (!yodaMessageEl) {
+                throw new Error('Yoda did not answer.');
+            }
 
         } catch (error) {
             console.error('Error sending chat message:', error);
@@ -309,7 +420,11 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // --- Initial Setup ---
-    fetchInitialScore(); // Load initial score when the page loads
+    // The server renders the score into the page; only fetch it if it didn't.
+    if (!document.getElementById('initial-score')) {
+        fetchInitialScore();
+    }
+    connectGameSocket();
     console.log("AIYoda Frontend Initialized!");
 
 }); // End DOMContentLoaded
\ No newline at end of file
@@ -0,0 +1,78 @@
+# tests/test_clients.py
+
+import asyncio
+
+import pytest
+
+from src import utils
+from src.utils import ClientRegistry, ClientUnavailableError
+
+
+def _registry(monkeypatch, outcomes, retry_seconds):
+    """A registry whose Gemini loads raise or return `outcomes` in turn."""
+    monkeypatch.setattr(utils, "GOOGLE_API_KEY", "test-key")
+    registry = ClientRegistry(retry_seconds=retry_seconds)
+    attempts = []
+
+    def load():
+        attempts.append(None)
+        outcome = outcomes[len(attempts) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    registry._load_gemini_model = load
+    return registry, attempts
+
+
+def test_transient_failure_is_retried_after_the_backoff(monkeypatch):
+    model = object()
+    registry, attempts = _registry(monkeypatch, [RuntimeError("DNS failure"), model], retry_seconds=0.05)
+
+    async def main():
+        with pytest.raises(ClientUnavailableError):
+            await registry.gemini_model()
+        with pytest.raises(ClientUnavailableError): # Backing off: fails fast, no new attempt
+            await registry.gemini_model()
+        assert len(attempts) == 1
+        await asyncio.sleep(0.06)
+        return await registry.gemini_model()
+
+    assert asyncio.run(main()) is model
+    assert len(attempts) == 2
+
+
+def test_missing_api_key_is_not_retried(monkeypatch):
+    registry, attempts = _registry(monkeypatch, [ClientUnavailableError("GOOGLE_API_KEY is not set.")] * 2, retry_seconds=0.0)
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(ClientUnavailableError):
+                await registry.gemini_model()
+
+    asyncio.run(main())
+    assert len(attempts) == 1
+
+
+def test_missing_api_key_makes_gemini_unavailable(monkeypatch):
+    monkeypatch.setattr(utils, "GOOGLE_API_KEY", None)
+    registry = ClientRegistry()
+    assert registry.gemini_unavailable
+    registry.set_gemini_model(object()) # A stand-in model needs no key
+    assert not registry.gemini_unavailable
+    monkeypatch.setattr(utils, "GOOGLE_API_KEY", "test-key")
+    assert not ClientRegistry().gemini_unavailable
+
+
+def test_commentary_without_api_key_does_not_log_errors(monkeypatch, caplog):
+    from src import services
+
+    monkeypatch.setattr(utils, "GOOGLE_API_KEY", None)
+    monkeypatch.setattr(services, "clients", ClientRegistry())
+
+    async def main():
+        return [await services._get_yoda_commentary("rock", "paper") for _ in range(3)]
+
+    with caplog.at_level("DEBUG"):
+        assert asyncio.run(main()) == [None] * 3
+    assert not [record for record in caplog.records if record.levelname == "ERROR"]
@@ -0,0 +1,37 @@
+# tests/test_game_channel.py
+
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+from src import services
+from src.game_channel import GameChannel
+from src.rate_limit import RateLimiter
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    limiter = RateLimiter([])
+
+    @app.websocket("/play/ws")
+    async def play(websocket: WebSocket):
+        await GameChannel(websocket, "ws-test-player", limiter, "/play/ws").run()
+
+    return TestClient(app)
+
+
+def test_loss_with_empty_pool_gets_the_fallback_without_calling_gemini(monkeypatch):
+    async def unexpected_gemini_call(*args):
+        raise AssertionError("The channel must not call Gemini per round.")
+
+    monkeypatch.setattr(services, "_get_yoda_commentary", unexpected_gemini_call)
+    monkeypatch.setattr(services, "pick_computer_move", lambda: "paper") # Paper covers rock
+    monkeypatch.setattr(services.commentary_pool, "take", lambda player_move, computer_move: None)
+
+    with _client().websocket_connect("/play/ws") as websocket:
+        assert websocket.receive_json()["t"] == "hello"
+        websocket.send_json({"n": 1, "move": "rock"})
+        result = websocket.receive_json()
+        commentary = websocket.receive_json()
+
+    assert (result["t"], result["c"], result["r"]) == ("r", "paper", 2)
+    assert commentary == {"t": "c", "n": 1, "text": services.COMMENTARY_FALLBACK}
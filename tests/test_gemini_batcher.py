@@ -0,0 +1,52 @@
+# tests/test_gemini_batcher.py
+
+import asyncio
+import json
+
+from src.gemini_batcher import GeminiBatcher
+from src.resilience import Upstream
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+        self.prompt_feedback = None
+
+
+def test_concurrent_prompts_share_one_request():
+    calls = []
+
+    async def generate(prompt, operation, prompts):
+        calls.append((operation, prompts))
+        if prompts == 1:
+            return _Response(f"answer to {prompt}")
+        return _Response(json.dumps([f"answer {number}" for number in range(1, prompts + 1)]))
+
+    async def main():
+        batcher = GeminiBatcher(generate, window_seconds=0.01, max_batch_size=8)
+        return await asyncio.gather(*(batcher.submit(f"prompt {n}", "commentary") for n in range(3)))
+
+    responses = asyncio.run(main())
+    assert calls == [("batch", 3)]
+    assert [response.text for response in responses] == ["answer 1", "answer 2", "answer 3"]
+
+
+def test_batch_timeout_scales_with_prompts_up_to_the_cap():
+    batcher = GeminiBatcher(None, max_timeout=30.0)
+    assert batcher.batch_timeout(4.0, 1) == 4.0
+    assert batcher.batch_timeout(4.0, 3) == 12.0
+    assert batcher.batch_timeout(4.0, 8) == 30.0
+
+
+def test_calls_with_their_own_timeout_are_not_tracked():
+    upstream = Upstream("test", initial_timeout=1.0)
+
+    async def answer():
+        return "ok"
+
+    async def main():
+        await upstream.call(answer, timeout=5.0, track_latency=False)
+        await upstream.call(answer)
+
+    asyncio.run(main())
+    assert upstream.latency._count == 1
@@ -0,0 +1,27 @@
+# tests/test_image_pipeline.py
+
+import os
+
+import pytest
+
+from src import image_pipeline
+
+
+def test_variant_replaces_a_partial_file_atomically(tmp_path):
+    data = b"\x89PNG" + bytes(4096)
+    url = image_pipeline._write_hashed(str(tmp_path), "Rock", 256, "png", data)
+    name = url.rsplit("/", 1)[-1]
+    (tmp_path / name).write_bytes(data[:10]) # Left behind by an interrupted writer
+    assert image_pipeline._write_hashed(str(tmp_path), "Rock", 256, "png", data) == url
+    assert (tmp_path / name).read_bytes() == data
+    assert os.listdir(tmp_path) == [name]
+
+
+def test_failed_write_leaves_no_variant(tmp_path, monkeypatch):
+    def failing_replace(source, destination):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(image_pipeline.os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        image_pipeline._write_hashed(str(tmp_path), "Rock", 256, "png", b"data")
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,76 @@
+# tests/test_intent_router.py
+
+import random
+
+import pytest
+
+from src.intent_router import CHAT, FAREWELL, GREETING, IDENTITY, JOKE, RULES, THANKS, IntentRouter
+
+
+@pytest.fixture(scope="module")
+def router() -> IntentRouter:
+    return IntentRouter(rng=random.Random(0))
+
+
+@pytest.mark.parametrize("message", [
+    "how old is luke",
+    "what are you doing",
+    "are you okay",
+    "later today I will fight",
+    "who rules the galaxy",
+    "the sith rules of two",
+    "why do you talk funny",
+    "is the dark side no joke",
+    "What is the Force?",
+    "Hello Yoda, what is the meaning of the force?",
+    "what are you afraid of",
+    "My exam is tomorrow and I am nervous",
+])
+def test_questions_reach_gemini(router, message):
+    assert router.classify(message).intent == CHAT
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("Can you tell me a joke?", JOKE),
+    ("joke please yoda", JOKE),
+    ("Joke time!", JOKE),
+    ("make me giggle", JOKE),
+    ("say something hilarious", JOKE),
+    ("I could use a good laugh", JOKE),
+    ("Hello!", GREETING),
+    ("Good morning master Yoda", GREETING),
+    ("thanks a bunch", THANKS),
+    ("Thank you so much!", THANKS),
+    ("see you soon", FAREWELL),
+    ("i gotta go now", FAREWELL),
+    ("Who are you?", IDENTITY),
+    ("are you a bot?", IDENTITY),
+    ("what are the rules?", RULES),
+    ("Rules please", RULES),
+    ("How do I play this?", RULES),
+    ("what beats lizard", RULES),
+])
+def test_intents_are_answered_locally(router, message, intent):
+    assert router.classify(message).intent == intent
+
+
+def test_model_confidence_is_not_saturated(router):
+    # Averaged per word, a long message of unfamiliar words is no longer near-certain
+    intent, confidence = router.predict("how old is luke skywalker really".split())
+    assert confidence < router.threshold
+
+
+def test_single_word_phrases_are_rejected():
+    with pytest.raises(ValueError):
+        IntentRouter(phrases={JOKE: ("joke",)})
+
+
+def test_empty_message_goes_to_gemini(router):
+    match = router.classify("?!")
+    assert (match.intent, match.source) == (CHAT, "default")
+
+
+def test_reply_only_for_canned_intents(router):
+    assert router.reply(GREETING)
+    assert router.reply(JOKE) is None
+    assert router.reply(CHAT) is None
@@ -0,0 +1,38 @@
+# tests/test_page_cache.py
+
+from fastapi import FastAPI, Request
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+from fastapi.testclient import TestClient
+
+from src.page_cache import PageCache
+
+
+def _client(tmp_path):
+    templates_dir = tmp_path / "templates"
+    templates_dir.mkdir()
+    (templates_dir / "index.html").write_text(
+        '<link href="{{ url_for(\'static\', path=\'/style.css\') }}"><b>{{ score.wins }}</b>'
+    )
+    static_dir = tmp_path / "static"
+    static_dir.mkdir()
+    cache = PageCache(Jinja2Templates(directory=str(templates_dir)), "index.html", directory=str(templates_dir))
+    app = FastAPI()
+    app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
+
+    @app.get("/")
+    async def index(request: Request):
+        return cache.response(request, (3, 1, 2))
+
+    return TestClient(app), cache
+
+
+def test_host_header_does_not_change_the_page_or_the_cache(tmp_path):
+    client, cache = _client(tmp_path)
+    bodies = {
+        client.get("/", headers={"Host": host, "Accept-Encoding": "identity"}).text
+        for host in ("example.com", "attacker.invalid", "a.attacker.invalid:8080")
+    }
+    assert bodies == {'<link href="/static/style.css"><b>3</b>'}
+    assert cache.renders == 1
+    assert len(cache._pages) == 1
@@ -0,0 +1,38 @@
+# tests/test_rate_limit.py
+
+from typing import Literal
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.rate_limit import RateLimiter, RateLimitMiddleware, RateLimitRule
+
+
+def _client(rate: str = "2/minute") -> TestClient:
+    app = FastAPI()
+
+    @app.post("/api/v1/play/{player_move}")
+    async def play(player_move: Literal["rock", "paper", "scissors", "lizard", "spock"]):
+        return {"player_move": player_move}
+
+    limiter = RateLimiter([RateLimitRule("POST", "/api/v1/play/", rate, prefix=True)])
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    return TestClient(app)
+
+
+def test_invalid_moves_do_not_use_play_tokens():
+    client = _client()
+    for _ in range(5):
+        assert client.post("/api/v1/play/banana").status_code == 422
+    assert client.post("/api/v1/play/rock").status_code == 200
+    assert client.post("/api/v1/play/spock").status_code == 200
+    response = client.post("/api/v1/play/paper")
+    assert response.status_code == 429
+    assert response.headers["retry-after"]
+
+
+def test_unknown_paths_under_the_prefix_are_not_charged():
+    client = _client("1/minute")
+    assert client.post("/api/v1/play/rock/again").status_code == 404
+    assert client.post("/api/v1/play/rock").status_code == 200
+    assert client.post("/api/v1/play/rock").status_code == 429
@@ -0,0 +1,139 @@
+# tests/test_state_backend.py
+
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+from src.score_store import SharedScoreStore
+from src.state_backend import LocalStateBackend, SharedMemoryStateBackend, StateBackendError
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork") or sys.platform == "win32", reason="Needs fork and fcntl")
+
+
+def _fork_workers(count: int, work) -> None:
+    """Runs `work()` in `count` forked children and asserts they all exit cleanly."""
+    pids = []
+    for _ in range(count):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                work()
+            except BaseException:
+                status = 1
+            finally:
+                os._exit(status)
+        pids.append(pid)
+    for pid in pids:
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_increments_from_forked_workers_are_not_lost(tmp_path):
+    # Opened before forking, like the supervisor's preloaded app
+    backend = SharedMemoryStateBackend(str(tmp_path / "state.bin"), slots=64)
+    workers, increments = 4, 5000
+
+    def work():
+        for _ in range(increments):
+            backend.incr("k")
+        for _ in range(increments):
+            backend.incr_vector("v", 1, 3)
+
+    _fork_workers(workers, work)
+    assert backend.get_int("k") == workers * increments
+    assert backend.get_vector("v", 3) == (0, workers * increments, 0)
+    backend.close()
+
+
+def test_forked_child_uses_its_own_descriptor(tmp_path):
+    backend = SharedMemoryStateBackend(str(tmp_path / "state.bin"), slots=64)
+    parent_fd = backend._fd
+    read_fd, write_fd = os.pipe()
+
+    def work():
+        os.write(write_fd, str(backend._fd).encode())
+        backend.set("from-child", b"ok")
+
+    _fork_workers(1, work)
+    os.close(write_fd)
+    child_fd = int(os.read(read_fd, 32))
+    os.close(read_fd)
+    assert child_fd != parent_fd
+    assert backend.get("from-child") == b"ok"
+    backend.close()
+
+
+def test_existing_file_with_other_geometry_is_not_reformatted(tmp_path):
+    path = str(tmp_path / "state.bin")
+    backend = SharedMemoryStateBackend(path, slots=64)
+    backend.incr("k", 5)
+    with pytest.raises(StateBackendError):
+        SharedMemoryStateBackend(path, slots=128)
+    assert backend.get_int("k") == 5 # Still mapped and intact
+    reopened = SharedMemoryStateBackend(path, slots=64)
+    assert reopened.get_int("k") == 5
+    reopened.close()
+    backend.close()
+
+
+def test_foreign_file_is_rejected(tmp_path):
+    path = tmp_path / "state.bin"
+    path.write_bytes(b"not a state file")
+    with pytest.raises(StateBackendError):
+        SharedMemoryStateBackend(str(path), slots=64)
+    assert path.read_bytes() == b"not a state file"
+
+
+def test_full_probe_sequence_never_evicts_keys_without_ttl(tmp_path):
+    # With the minimum slot count every key's probe sequence is the whole table
+    backend = SharedMemoryStateBackend(str(tmp_path / "state.bin"), slots=32)
+    for i in range(32):
+        backend.incr(f"k{i}", i + 1)
+    with pytest.raises(StateBackendError):
+        backend.set("new", b"x")
+    with pytest.raises(StateBackendError):
+        backend.incr("new")
+    assert [backend.get_int(f"k{i}") for i in range(32)] == list(range(1, 33))
+    backend.close()
+
+
+def test_full_probe_sequence_evicts_the_entry_closest_to_expiry(tmp_path):
+    backend = SharedMemoryStateBackend(str(tmp_path / "state.bin"), slots=32)
+    for i in range(30):
+        backend.incr(f"k{i}", i + 1)
+    backend.set("later", b"l", ttl=600)
+    backend.set("sooner", b"s", ttl=60)
+    backend.set("new", b"n")
+    assert backend.get("new") == b"n"
+    assert backend.get("sooner") is None
+    assert backend.get("later") == b"l"
+    assert [backend.get_int(f"k{i}") for i in range(30)] == list(range(1, 31))
+    backend.close()
+
+
+class _BlockingBackend(LocalStateBackend):
+    blocking = True
+
+
+def test_blocking_backend_calls_run_off_the_event_loop():
+    store = SharedScoreStore()
+    store.backend = _BlockingBackend()
+    threads = []
+    increment = store.increment
+
+    def recording_increment(player_id, field):
+        threads.append(threading.get_ident())
+        return increment(player_id, field)
+
+    store.increment = recording_increment
+
+    async def main():
+        return await store.aincrement("p", "wins"), threading.get_ident()
+
+    score, loop_thread = asyncio.run(main())
+    assert score == (1, 0, 0)
+    assert threads and threads[0] != loop_thread
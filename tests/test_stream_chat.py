@@ -0,0 +1,107 @@
+# tests/test_stream_chat.py
+
+import asyncio
+
+import pytest
+
+from src import services
+
+MESSAGE = "what do you think about the jedi council"
+
+
+class _Chunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeStream:
+    """Async iterator over `chunks`; raises `error` after them if given."""
+
+    def __init__(self, chunks, error=None):
+        self.chunks = list(chunks)
+        self.error = error
+        self.prompt_feedback = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.chunks:
+            return _Chunk(self.chunks.pop(0))
+        if self.error is not None:
+            raise self.error
+        raise StopAsyncIteration
+
+
+class _FakeModel:
+    def __init__(self, stream: _FakeStream):
+        self.stream = stream
+
+    async def generate_content_async(self, prompt, stream=False):
+        return self.stream
+
+
+@pytest.fixture
+def use_stream(monkeypatch):
+    services.chat_response_cache.clear()
+
+    def install(stream: _FakeStream):
+        async def gemini_model():
+            return _FakeModel(stream)
+        monkeypatch.setattr(services.clients, "gemini_model", gemini_model)
+
+    yield install
+    services.chat_response_cache.clear()
+
+
+def _collect(limit=None):
+    async def main():
+        chunks = []
+        generator = services.stream_chat(MESSAGE)
+        async for chunk in generator:
+            chunks.append(chunk)
+            if limit is not None and len(chunks) >= limit:
+                await generator.aclose() # Client went away
+                break
+        return chunks
+    return asyncio.run(main())
+
+
+def _cached():
+    return services.chat_response_cache.get(services.normalize_message(MESSAGE))
+
+
+def test_complete_stream_is_cached(use_stream):
+    use_stream(_FakeStream(["Wise, ", "the council is."]))
+    assert _collect() == ["Wise, ", "the council is."]
+    assert _cached() == "Wise, the council is."
+
+
+def test_stream_broken_mid_answer_is_not_cached(use_stream):
+    use_stream(_FakeStream(["Wise, "], error=RuntimeError("connection reset")))
+    assert _collect() == ["Wise, "]
+    assert _cached() is None
+
+
+def test_client_disconnect_is_not_cached(use_stream):
+    use_stream(_FakeStream(["Wise, ", "the council is."]))
+    assert _collect(limit=1) == ["Wise, "]
+    assert _cached() is None
+
+
+def test_streamed_lookups_are_counted_by_the_cache(use_stream, monkeypatch):
+    cache = services.chat_response_cache
+    monkeypatch.setattr(cache, "hits", 0)
+    monkeypatch.setattr(cache, "misses", 0)
+    use_stream(_FakeStream(["Wise, ", "the council is."]))
+    _collect() # Miss: streamed from Gemini, then cached
+    assert _collect() == ["Wise, the council is."] # Hit: one chunk from the cache
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_broken_stream_is_logged_with_the_exception_as_a_field(use_stream, caplog):
+    use_stream(_FakeStream(["Wise, "], error=RuntimeError("connection reset")))
+    _collect()
+    [record] = [record for record in caplog.records if record.levelname == "ERROR"]
+    assert "connection reset" not in record.msg
+    assert record.exc_info[0] is RuntimeError